@@ -1,9 +1,11 @@
 from apps.models import Order, OrderItem, Product
 from apps.models.customUser import CustomUser
-from shared.pdf_generator import save_invoice_to_file
+from shared.invoice_queue import invoice_queue
 from apps.classes.log import create_log
+from apps.classes.orderStats import order_snapshot, record_order_change, get_order_stats
 from django.utils import timezone
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Coalesce
 
 def list_orders():
     return Order.objects.select_related("user").all()
@@ -14,26 +16,32 @@ def get_order(order_id: int):
 def create_order(data: dict, user_id: int = None):
     user = CustomUser.objects.get(id=data["user_id"])
     create_log("Order created", user_id)
-    return Order.objects.create(
-        status=data["status"],
-        total_amount=data["total_amount"],
-        invoice_file=data.get("invoice_file"),
-        user=user,
-        created_at=data.get("created_at")
-    )
+    with transaction.atomic():
+        order = Order.objects.create(
+            status=data["status"],
+            total_amount=data["total_amount"],
+            invoice_file=data.get("invoice_file"),
+            user=user,
+            created_at=data.get("created_at")
+        )
+        record_order_change(order.id, None, order_snapshot(order))
+    return order
 
 def update_order(order_id: int, data: dict, user_id: int = None):
     order = Order.objects.filter(id=order_id).first()
     if not order:
         return None
 
+    before = order_snapshot(order)
     for field, value in data.items():
         if field == "user_id":
             order.user_id = value
         else:
             setattr(order, field, value)
 
-    order.save()
+    with transaction.atomic():
+        order.save()
+        record_order_change(order.id, before, order_snapshot(order))
     create_log("Order updated", user_id)
     return order
 
@@ -41,18 +49,24 @@ def delete_order(order_id: int, user_id: int = None):
     order = Order.objects.filter(id=order_id).first()
     if not order:
         return False
-    order.delete()
+    before = order_snapshot(order)
+    with transaction.atomic():
+        order.delete()
+        record_order_change(order_id, before, None)
     create_log("Order deleted", user_id)
     return True
 
 def get_or_create_cart(user_id: int):
     """Récupère ou crée le panier (commande CART) de l'utilisateur"""
     user = CustomUser.objects.get(id=user_id)
-    cart, created = Order.objects.get_or_create(
-        user=user,
-        status='CART',
-        defaults={'total_amount': 0}
-    )
+    with transaction.atomic():
+        cart, created = Order.objects.get_or_create(
+            user=user,
+            status='CART',
+            defaults={'total_amount': 0}
+        )
+        if created:
+            record_order_change(cart.id, None, order_snapshot(cart))
     return cart
 
 def add_product_to_cart(user_id: int, product_id: int, quantity: int):
@@ -175,8 +189,11 @@ def checkout_cart(order_id: int):
         raise ValueError("Le panier est vide. Impossible de passer commande")
     
     # Passer le panier en PENDING (en attente de confirmation des infos)
+    before = order_snapshot(cart)
     cart.status = 'PENDING'
-    cart.save()
+    with transaction.atomic():
+        cart.save()
+        record_order_change(cart.id, before, order_snapshot(cart))
     
     create_log(f"Order checkout - Order #{cart.id}", cart.user_id)
     
@@ -208,9 +225,12 @@ def confirm_order_details(order_id: int, shipping_info: dict):
     order.billing_country = shipping_info.get('billing_country') or shipping_info.get('shipping_country')
     
     # Passer au statut CONFIRMED en attente de paiement
+    before = order_snapshot(order)
     order.status = 'CONFIRMED'
     order.confirmed_at = timezone.now()
-    order.save()
+    with transaction.atomic():
+        order.save()
+        record_order_change(order.id, before, order_snapshot(order))
     
     create_log(f"Order details confirmed - Order #{order.id}", order.user_id)
     
@@ -219,53 +239,64 @@ def confirm_order_details(order_id: int, shipping_info: dict):
 def process_payment(order_id: int, payment_info: dict):
     """
     Traite le paiement d'une commande
-    Si approuvé: CONFIRMED -> PAID, génère PDF, crée nouveau panier
+    Si approuvé: CONFIRMED -> PAID, met la facture PDF en file de génération, crée nouveau panier
     Si refusé: reste CONFIRMED
     """
-    order = Order.objects.get(id=order_id)
-    
-    if order.status != 'CONFIRMED':
-        raise ValueError(f"Impossible de payer une commande en statut {order.status}")
-    
-    # Enregistrer les infos de paiement
-    order.payment_method = payment_info.get('payment_method', 'PAYPAL')
-    order.payment_status = 'APPROVED' if payment_info.get('approve', False) else 'REJECTED'
-    
-    if payment_info.get('approve', False):
+    with transaction.atomic():
+        order = Order.objects.select_for_update().get(id=order_id)
+        
+        if order.status != 'CONFIRMED':
+            raise ValueError(f"Impossible de payer une commande en statut {order.status}")
+        
+        # Enregistrer les infos de paiement
+        order.payment_method = payment_info.get('payment_method', 'PAYPAL')
+        order.payment_status = 'APPROVED' if payment_info.get('approve', False) else 'REJECTED'
+        
+        if not payment_info.get('approve', False):
+            # Paiement refusé
+            order.save()
+            create_log(f"Order payment rejected - Order #{order.id}", order.user_id)
+            
+            return {
+                'success': False,
+                'message': 'Paiement refusé. Veuillez réessayer',
+                'order_id': order.id,
+                'status': 'CONFIRMED'
+            }
+        
         # Paiement approuvé
+        before = order_snapshot(order)
         order.status = 'PAID'
         order.paid_at = timezone.now()
+        # PENDING dès le passage en PAID : si la mise en file se perd, le balayage de
+        # invoice_queue la reprend
+        order.invoice_status = 'PENDING'
+        order.invoice_requested_at = order.paid_at
+        order.invoice_attempts = 0
         order.save()
+        record_order_change(order.id, before, order_snapshot(order))
         
-        # Générer la facture PDF
-        save_invoice_to_file(order_id)
+        # Facture PDF générée en tâche de fond, une fois le passage en PAID validé
+        transaction.on_commit(lambda: invoice_queue.submit(order.id))
         
         create_log(f"Order paid - Order #{order.id}", order.user_id)
         
         # Créer un nouveau panier CART vide pour l'utilisateur
-        Order.objects.get_or_create(
+        cart, created = Order.objects.get_or_create(
             user=order.user,
             status='CART',
             defaults={'total_amount': 0}
         )
-        
-        return {
-            'success': True,
-            'message': 'Paiement approuvé et commande confirmée',
-            'order_id': order.id,
-            'status': 'PAID'
-        }
-    else:
-        # Paiement refusé
-        order.save()
-        create_log(f"Order payment rejected - Order #{order.id}", order.user_id)
-        
-        return {
-            'success': False,
-            'message': 'Paiement refusé. Veuillez réessayer',
-            'order_id': order.id,
-            'status': 'CONFIRMED'
-        }
+        if created:
+            record_order_change(cart.id, None, order_snapshot(cart))
+    
+    return {
+        'success': True,
+        'message': 'Paiement approuvé et commande confirmée',
+        'order_id': order.id,
+        'status': 'PAID',
+        'invoice_status': 'PENDING'
+    }
 
 DISCOUNT_CODES = {
     'WELCOME10': 10,     
@@ -358,54 +389,100 @@ def remove_discount(order_id: int):
         'total_amount': float(items_total)
     }
 
+def _order_totals_from_rollup(stats: dict):
+    """Revenus, commandes par statut et résumé lus dans les agrégats OrderStatusStat"""
+    def count(status):
+        return stats[status].order_count if status in stats else 0
+    
+    paid = stats.get('PAID')
+    paid_count = paid.order_count if paid else 0
+    total_revenue = paid.total_amount if paid else 0
+    
+    revenue = {
+        'total_revenue': float(total_revenue),
+        'total_discount_given': float(paid.discount_amount) if paid else 0.0,
+        'average_revenue_per_order': float(total_revenue / paid_count) if paid_count else 0.0,
+        'min_revenue': float(paid.min_amount or 0) if paid_count else 0.0,
+        'max_revenue': float(paid.max_amount or 0) if paid_count else 0.0
+    }
+    orders = {
+        'total_orders': sum(stat.order_count for stat in stats.values()),
+        'by_status': {
+            'cart': count('CART'),
+            'pending': count('PENDING'),
+            'confirmed': count('CONFIRMED'),
+            'paid': paid_count,
+            'shipped': count('SHIPPED')
+        }
+    }
+    summary = {
+        'total_customers_who_paid': paid.customer_count if paid else 0,
+        'average_items_per_paid_order': round(paid.item_count / paid_count, 2) if paid_count else 0
+    }
+    return revenue, orders, summary
+
+def _order_totals_live():
+    """
+    Revenus, commandes par statut et résumé calculés sur la table des commandes
+    Deux requêtes d'agrégat, quel que soit le nombre de commandes : aucune ligne
+    n'est chargée en Python
+    """
+    paid = models.Q(status='PAID')
+    zero = models.Value(0, output_field=models.DecimalField(max_digits=14, decimal_places=2))
+    
+    totals = Order.objects.aggregate(
+        total_orders=models.Count('id'),
+        cart=models.Count('id', filter=models.Q(status='CART')),
+        pending=models.Count('id', filter=models.Q(status='PENDING')),
+        confirmed=models.Count('id', filter=models.Q(status='CONFIRMED')),
+        paid=models.Count('id', filter=paid),
+        shipped=models.Count('id', filter=models.Q(status='SHIPPED')),
+        total_revenue=Coalesce(models.Sum('total_amount', filter=paid), zero),
+        total_discount=Coalesce(models.Sum('discount_amount', filter=paid), zero),
+        min_revenue=Coalesce(models.Min('total_amount', filter=paid), zero),
+        max_revenue=Coalesce(models.Max('total_amount', filter=paid), zero),
+        paying_customers=models.Count('user', filter=paid, distinct=True)
+    )
+    total_items_count = OrderItem.objects.filter(order__status='PAID').count()
+    paid_count = totals['paid']
+    
+    revenue = {
+        'total_revenue': float(totals['total_revenue']),
+        'total_discount_given': float(totals['total_discount']),
+        'average_revenue_per_order': float(totals['total_revenue'] / paid_count) if paid_count else 0.0,
+        'min_revenue': float(totals['min_revenue']),
+        'max_revenue': float(totals['max_revenue'])
+    }
+    orders = {
+        'total_orders': totals['total_orders'],
+        'by_status': {
+            'cart': totals['cart'],
+            'pending': totals['pending'],
+            'confirmed': totals['confirmed'],
+            'paid': paid_count,
+            'shipped': totals['shipped']
+        }
+    }
+    summary = {
+        'total_customers_who_paid': totals['paying_customers'],
+        'average_items_per_paid_order': round(total_items_count / paid_count, 2) if paid_count > 0 else 0
+    }
+    return revenue, orders, summary
+
 def get_admin_stats():
     """
     Récupère les statistiques globales pour le dashboard admin
     Calcule les revenus, nombre de commandes par statut, moyennes, etc.
-    """
-    from decimal import Decimal
-    
-    # Récupérer toutes les commandes
-    all_orders = Order.objects.all()
-    paid_orders = Order.objects.filter(status='PAID')
-    pending_orders = Order.objects.filter(status='PENDING')
-    confirmed_orders = Order.objects.filter(status='CONFIRMED')
-    cart_orders = Order.objects.filter(status='CART')
-    shipped_orders = Order.objects.filter(status='SHIPPED')
-    
-    # Calculs des revenus
-    total_revenue = sum(order.total_amount for order in paid_orders)
-    total_discount_given = sum(order.discount_amount for order in paid_orders)
-    
-    # Nombre de commandes par statut
-    stats_by_status = {
-        'CART': cart_orders.count(),
-        'PENDING': pending_orders.count(),
-        'CONFIRMED': confirmed_orders.count(),
-        'PAID': paid_orders.count(),
-        'SHIPPED': shipped_orders.count(),
-        'TOTAL': all_orders.count()
-    }
     
-    # Calculs des moyennes et min/max
-    if paid_orders.exists():
-        paid_amounts = [order.total_amount for order in paid_orders]
-        average_revenue = total_revenue / len(paid_amounts)
-        min_revenue = min(paid_amounts)
-        max_revenue = max(paid_amounts)
+    Les totaux sont lus dans les agrégats OrderStatusStat tenus à jour à chaque
+    transition de commande (lecture en temps constant). Tant qu'ils n'ont pas été
+    initialisés (python manage.py rebuild_order_stats), ils sont calculés à la volée.
+    """
+    stats = get_order_stats()
+    if stats:
+        revenue, orders, summary = _order_totals_from_rollup(stats)
     else:
-        average_revenue = Decimal('0')
-        min_revenue = Decimal('0')
-        max_revenue = Decimal('0')
-    
-    # Revenu moyen par article
-    total_items = sum(
-        OrderItem.objects.filter(order__status='PAID').aggregate(
-            total=models.Sum('quantity')
-        ).get('total') or 0
-        for _ in [1]
-    )
-    total_items_count = OrderItem.objects.filter(order__status='PAID').count()
+        revenue, orders, summary = _order_totals_live()
     
     # Top clients (par revenu dépensé)
     from django.db.models import Sum
@@ -425,8 +502,7 @@ def get_admin_stats():
         })
     
     # Top produits vendus
-    from django.db.models import F, FloatField
-    from django.db.models.functions import Cast
+    from django.db.models import F
     
     top_products = []
     product_stats = OrderItem.objects.filter(
@@ -447,27 +523,9 @@ def get_admin_stats():
     
     return {
         'success': True,
-        'revenue': {
-            'total_revenue': float(total_revenue),
-            'total_discount_given': float(total_discount_given),
-            'average_revenue_per_order': float(average_revenue),
-            'min_revenue': float(min_revenue),
-            'max_revenue': float(max_revenue)
-        },
-        'orders': {
-            'total_orders': stats_by_status['TOTAL'],
-            'by_status': {
-                'cart': stats_by_status['CART'],
-                'pending': stats_by_status['PENDING'],
-                'confirmed': stats_by_status['CONFIRMED'],
-                'paid': stats_by_status['PAID'],
-                'shipped': stats_by_status['SHIPPED']
-            }
-        },
+        'revenue': revenue,
+        'orders': orders,
         'top_clients': top_clients,
         'top_products': top_products,
-        'summary': {
-            'total_customers_who_paid': paid_orders.values('user').distinct().count(),
-            'average_items_per_paid_order': round(total_items_count / stats_by_status['PAID'], 2) if stats_by_status['PAID'] > 0 else 0
-        }
-    }
\ No newline at end of file
+        'summary': summary
+    }
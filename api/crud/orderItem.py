@@ -1,5 +1,7 @@
+from django.db import transaction
 from apps.models import OrderItem
 from apps.classes.log import create_log
+from apps.classes.orderStats import record_orders_change, snapshot_orders
 
 def list_order_items():
     return OrderItem.objects.select_related("order", "product").all()
@@ -9,22 +11,30 @@ def get_order_item(order_item_id: int):
 
 def create_order_item(data: dict, user_id: int = None):
     create_log("Order item created", user_id)
-    return OrderItem.objects.create(
-        order_id=data["order_id"],
-        product_id=data["product_id"],
-        quantity=data["quantity"],
-        unit_price_frozen=data["unit_price_frozen"]
-    )
+    # Article ajouté à une commande payée : item_count des agrégats suit
+    with transaction.atomic():
+        before = snapshot_orders([data["order_id"]])
+        item = OrderItem.objects.create(
+            order_id=data["order_id"],
+            product_id=data["product_id"],
+            quantity=data["quantity"],
+            unit_price_frozen=data["unit_price_frozen"]
+        )
+        record_orders_change(before)
+    return item
 
 def update_order_item(order_item_id: int, data: dict, user_id: int = None):
     item = OrderItem.objects.filter(id=order_item_id).first()
     if not item:
         return None
 
-    for field, value in data.items():
-        setattr(item, field, value)
+    with transaction.atomic():
+        before = snapshot_orders({item.order_id, data.get("order_id", item.order_id)})
+        for field, value in data.items():
+            setattr(item, field, value)
 
-    item.save()
+        item.save()
+        record_orders_change(before)
     create_log("Order item updated", user_id)
     return item
 
@@ -32,6 +42,9 @@ def delete_order_item(order_item_id: int, user_id: int = None):
     item = OrderItem.objects.filter(id=order_item_id).first()
     if not item:
         return False
-    item.delete()
+    with transaction.atomic():
+        before = snapshot_orders([item.order_id])
+        item.delete()
+        record_orders_change(before)
     create_log("Order item deleted", user_id)
     return True
\ No newline at end of file
@@ -1,43 +1,74 @@
 from apps.models import Product, Category
 from shared.price_fluctuation import PriceFluctuation
-from decimal import Decimal
 from apps.classes.log import create_log
+from apps.classes.voteStats import get_vote_aggregates
+from shared.view_counter import view_counter
+from shared.repricing import repricing_scheduler
+from shared.stock import decrement_stocks, InsufficientStockError
+from shared.price_history import get_price_candles
+from shared.pagination import keyset_paginate, encode_cursor, decode_cursor
+from shared.search_index import product_search_index
 from django.utils import timezone
 
 def list_products():
     return Product.objects.all()
 
+LISTING_FIELDS = (
+    'id', 'name', 'description', 'category_id', 'category__name', 'stock', 'base_price',
+    'current_price', 'popularity_score', 'purchase_count', 'view_count', 'image'
+)
+
 def list_products_advanced(search: str = None, category_id: int = None, min_price: float = None, 
-                          max_price: float = None, sort: str = 'id', order: str = 'asc', 
-                          page: int = 1, limit: int = 20):
+                          max_price: float = None, sort: str = None, order: str = 'asc', 
+                          page: int = 1, limit: int = 20, exact_total: bool = True,
+                          after: str = None):
     """
     Liste les produits avec filtres, recherche, tri et pagination
+    Une seule requête (projection values() avec jointure sur la catégorie),
+    plus un COUNT si exact_total
     
     Args:
-        search: Recherche par nom ou description
+        search: Recherche plein texte par nom ou description (index inversé,
+            sans accents, par préfixe, voir shared.search_index). Seuls les
+            Env.SEARCH_MAX_RESULTS produits les plus pertinents sont retenus
         category_id: Filtrer par catégorie (ID)
         min_price: Prix minimum
         max_price: Prix maximum
-        sort: Champ de tri (id, name, price, popularity, stock, purchase_count)
-        order: Ordre de tri (asc, desc)
+        sort: Champ de tri (relevance, id, name, price, popularity, stock, purchase_count)
+            default: relevance si search, id sinon
+        order: Ordre de tri (asc, desc), ignoré pour relevance (plus pertinent d'abord)
         page: Numéro de page (default: 1)
         limit: Nombre de résultats par page (default: 20, max: 100)
+        exact_total: Calcule total_count/total_pages (COUNT) ; sinon seul has_next
+            est fourni, déterminé en lisant limit+1 lignes
+        after: Curseur opaque (pagination.next_cursor de la page précédente).
+            Remplace page : pagination par clé (tri, id) au lieu d'un OFFSET
     """
     query = Product.objects.all()
+    filtered = bool(category_id) or min_price is not None or max_price is not None
     
     if category_id:
         query = query.filter(category_id=category_id)
     
-    if search:
-        from django.db.models import Q
-        query = query.filter(Q(name__icontains=search) | Q(description__icontains=search))
-    
     if min_price is not None:
         query = query.filter(current_price__gte=min_price)
     if max_price is not None:
         query = query.filter(current_price__lte=max_price)
     
+    # Une recherche sans mot utile (que des mots vides) ne trouve rien : elle ne
+    # doit pas retomber sur le catalogue entier
+    ranked_ids = None
+    if search and search.strip():
+        ranked_ids = [product_id for product_id, _ in product_search_index.search(search)]
+        query = query.filter(id__in=ranked_ids)
+    
+    if sort is None:
+        sort = 'relevance' if ranked_ids is not None else 'id'
+    if sort == 'relevance' and ranked_ids is not None:
+        return _list_products_by_relevance(query if filtered else None, ranked_ids, page, limit, after, exact_total)
+    
     sort_field = 'id'
+    descending = order.lower() == 'desc'
     if sort == 'name':
         sort_field = 'name'
     elif sort == 'price':
@@ -49,46 +80,91 @@ def list_products_advanced(search: str = None, category_id: int = None, min_pric
     elif sort == 'purchase_count':
         sort_field = 'purchase_count'
     
-    if order.lower() == 'desc':
-        sort_field = '-' + sort_field
-    
-    query = query.order_by(sort_field)
-    
     limit = min(int(limit), 100) 
     page = max(int(page), 1) 
-    offset = (page - 1) * limit
-    
-    total_count = query.count()
-    products = query[offset:offset + limit]
-    
-    products_list = []
-    for product in products:
-        products_list.append({
-            'id': product.id,
-            'name': product.name,
-            'description': product.description,
-            'category_id': product.category_id,
-            'category_name': product.category.name,
-            'stock': product.stock,
-            'base_price': float(product.base_price),
-            'current_price': float(product.current_price),
-            'popularity_score': product.popularity_score,
-            'purchase_count': product.purchase_count,
-            'view_count': product.view_count,
-            'image': product.image.url if product.image else None
-        })
+    offset = 0 if after else (page - 1) * limit
+    
+    page_query = keyset_paginate(query, sort_field, descending=descending, after=after)
+    rows = list(page_query.values(*LISTING_FIELDS)[offset:offset + limit + 1])
+    has_next = len(rows) > limit
+    rows = rows[:limit]
+    
+    image_storage = Product._meta.get_field('image').storage
+    products_list = [_listing_row(row, image_storage) for row in rows]
+    
+    pagination = {
+        'page': None if after else page,
+        'limit': limit,
+        'has_next': has_next,
+        'next_cursor': encode_cursor(sort_field, rows[-1][sort_field], rows[-1]['id'], descending) if has_next else None
+    }
+    if exact_total:
+        total_count = query.count()
+        pagination['total_count'] = total_count
+        pagination['total_pages'] = (total_count + limit - 1) // limit
     
     return {
         'success': True,
-        'pagination': {
-            'page': page,
-            'limit': limit,
-            'total_count': total_count,
-            'total_pages': (total_count + limit - 1) // limit
-        },
+        'pagination': pagination,
         'products': products_list
     }
 
+def _listing_row(row: dict, image_storage) -> dict:
+    return {
+        'id': row['id'],
+        'name': row['name'],
+        'description': row['description'],
+        'category_id': row['category_id'],
+        'category_name': row['category__name'],
+        'stock': row['stock'],
+        'base_price': float(row['base_price']),
+        'current_price': float(row['current_price']),
+        'popularity_score': row['popularity_score'],
+        'purchase_count': row['purchase_count'],
+        'view_count': row['view_count'],
+        'image': image_storage.url(row['image']) if row['image'] else None
+    }
+
+def _list_products_by_relevance(query, ranked_ids: list, page: int, limit: int, after: str = None,
+                                exact_total: bool = True):
+    """
+    Page de résultats triés par pertinence, du plus pertinent au moins pertinent
+    `query` porte les filtres SQL (None : aucun) ; ils sont appliqués aux IDs
+    classés, puis seule la page est chargée
+    """
+    if query is not None:
+        matching = set(query.values_list('id', flat=True))
+        ranked_ids = [product_id for product_id in ranked_ids if product_id in matching]
+    
+    limit = min(int(limit), 100)
+    page = max(int(page), 1)
+    if after:
+        position, _ = decode_cursor(after, 'relevance')
+        offset = int(position)
+    else:
+        offset = (page - 1) * limit
+    
+    page_ids = ranked_ids[offset:offset + limit]
+    has_next = offset + limit < len(ranked_ids)
+    rows = {row['id']: row for row in Product.objects.filter(id__in=page_ids).values(*LISTING_FIELDS)}
+    image_storage = Product._meta.get_field('image').storage
+    
+    pagination = {
+        'page': None if after else page,
+        'limit': limit,
+        'has_next': has_next,
+        'next_cursor': encode_cursor('relevance', offset + limit, page_ids[-1]) if has_next else None
+    }
+    if exact_total:
+        pagination['total_count'] = len(ranked_ids)
+        pagination['total_pages'] = (len(ranked_ids) + limit - 1) // limit
+    
+    return {
+        'success': True,
+        'pagination': pagination,
+        'products': [_listing_row(rows[product_id], image_storage) for product_id in page_ids if product_id in rows]
+    }
+
 def get_product(product_id: int):
     return Product.objects.filter(id=product_id).first()
 
@@ -111,7 +187,7 @@ def create_product(data: dict, user_id: int = None):
     
     create_log("Product created", user_id)
     
-    return Product.objects.create(
+    product = Product.objects.create(
         name=data["name"],
         description=data.get("description", ""),
         stock=stock,
@@ -127,6 +203,8 @@ def create_product(data: dict, user_id: int = None):
         previous_price=base_price,  # Prix précédent = prix de base au départ
         last_price_update=timezone.now()
     )
+    product_search_index.index_product(product.id, product.name, product.description)
+    return product
 
 def update_product(product_id: int, data: dict, user_id: int = None):
     product = Product.objects.filter(id=product_id).first()
@@ -138,6 +216,7 @@ def update_product(product_id: int, data: dict, user_id: int = None):
             setattr(product, field, value)
 
     product.save()
+    product_search_index.index_product(product.id, product.name, product.description)
     create_log("Product updated", user_id)
     return product
 
@@ -146,98 +225,84 @@ def delete_product(product_id: int, user_id: int = None):
     if not product:
         return False
     product.delete()
+    product_search_index.remove_product(product_id)
     create_log("Product deleted", user_id)
     return True
 
+PRICE_SNAPSHOT_FIELDS = (
+    'name', 'current_price', 'previous_price', 'price_change_percentage',
+    'stock', 'base_stock', 'view_count', 'purchase_count'
+)
+
+def _price_snapshot(product: dict, view_count: int) -> dict:
+    """Infos de prix d'un produit (dict de values()) sans recalcul ni écriture"""
+    demand = PriceFluctuation.calculate_demand(view_count, product['purchase_count'])
+    supply_ratio = PriceFluctuation.calculate_supply_ratio(
+        product['stock'],
+        product['base_stock'],
+        demand
+    )
+    return {
+        'old_price': float(product['previous_price']),
+        'new_price': float(product['current_price']),
+        'price_change_percent': product['price_change_percentage'],
+        'indicator': PriceFluctuation.get_trend_indicator(product['price_change_percentage']),
+        'supply_ratio': supply_ratio,
+        'demand': int(demand)
+    }
+
 def record_product_view(product_id: int):
     """
-    Enregistre une consultation d'un produit et recalcule le prix
-    Appeler ceci chaque fois qu'un client consulte un produit
+    Enregistre une consultation d'un produit
+    La consultation est cumulée en mémoire et écrite par lots (voir shared.view_counter),
+    le prix est recalculé au prochain tick du RepricingScheduler
     """
-    try:
-        product = Product.objects.get(id=product_id)
-        
-        product.view_count += 1
-        
-        result = PriceFluctuation.calculate_new_price(
-            base_price=float(product.base_price),
-            current_price=float(product.current_price),
-            current_stock=product.stock,
-            base_stock=product.base_stock,
-            view_count=product.view_count,
-            purchase_count=product.purchase_count
-        )
-        
-        product.previous_price = Decimal(str(result['old_price']))
-        product.current_price = Decimal(str(result['new_price']))
-        product.price_change_percentage = result['price_change_percent']
-        product.save()
-        
-        return {
-            'success': True,
-            'product_id': product_id,
-            'product_name': product.name,
-            'old_price': result['old_price'],
-            'new_price': result['new_price'],
-            'price_change_percent': result['price_change_percent'],
-            'indicator': result['indicator'],
-            'supply_ratio': result['supply_ratio'],
-            'demand': result['demand'],
-            'stock': result['stock'],
-            'view_count': product.view_count
-        }
-    
-    except Product.DoesNotExist:
+    product = Product.objects.filter(id=product_id).values(*PRICE_SNAPSHOT_FIELDS).first()
+
+    if not product:
         return {'success': False, 'error': 'Product not found'}
 
+    view_count = product['view_count'] + view_counter.record(product_id)
+
+    return {
+        'success': True,
+        'product_id': product_id,
+        'product_name': product['name'],
+        **_price_snapshot(product, view_count),
+        'stock': product['stock'],
+        'view_count': view_count
+    }
+
 def record_product_purchase(product_id: int, quantity: int = 1):
     """
-    Enregistre un achat et recalcule le prix
+    Enregistre un achat
     Réduit le stock et augmente la demande (achat pèse 3x plus)
+    La décrémentation est un UPDATE conditionnel (stock >= quantité) : pas de perte
+    de mise à jour entre acheteurs concurrents. Le prix est recalculé au prochain tick
+    du RepricingScheduler
     """
     try:
-        product = Product.objects.get(id=product_id)
-        
-        if product.stock < quantity:
-            return {
-                'success': False,
-                'error': f'Insufficient stock. Available: {product.stock}, Requested: {quantity}'
-            }
-        
-        product.purchase_count += quantity
-        product.stock -= quantity
-        
-        result = PriceFluctuation.calculate_new_price(
-            base_price=float(product.base_price),
-            current_price=float(product.current_price),
-            current_stock=product.stock,
-            base_stock=product.base_stock,
-            view_count=product.view_count,
-            purchase_count=product.purchase_count
-        )
-        
-        product.previous_price = Decimal(str(result['old_price']))
-        product.current_price = Decimal(str(result['new_price']))
-        product.price_change_percentage = result['price_change_percent']
-        product.save()
-        
-        return {
-            'success': True,
-            'product_id': product_id,
-            'product_name': product.name,
-            'quantity_purchased': quantity,
-            'old_price': result['old_price'],
-            'new_price': result['new_price'],
-            'price_change_percent': result['price_change_percent'],
-            'indicator': result['indicator'],
-            'supply_ratio': result['supply_ratio'],
-            'demand': result['demand'],
-            'stock_remaining': product.stock,
-            'purchase_count': product.purchase_count
-        }
-    
+        decrement_stocks({product_id: quantity})
     except Product.DoesNotExist:
         return {'success': False, 'error': 'Product not found'}
+    except InsufficientStockError as e:
+        return {
+            'success': False,
+            'error': f"Insufficient stock. Available: {e.shortages[0]['available']}, Requested: {quantity}"
+        }
+
+    repricing_scheduler.mark_dirty([product_id])
+    product = Product.objects.filter(id=product_id).values(*PRICE_SNAPSHOT_FIELDS).first()
+
+    return {
+        'success': True,
+        'product_id': product_id,
+        'product_name': product['name'],
+        'quantity_purchased': quantity,
+        **_price_snapshot(product, product['view_count'] + view_counter.pending(product_id)),
+        'stock_remaining': product['stock'],
+        'purchase_count': product['purchase_count']
+    }
 
 def get_product_price_info(product_id: int):
     """
@@ -278,73 +343,129 @@ def get_product_price_info(product_id: int):
         return {'success': False, 'error': 'Product not found'}
 
 
-def get_product_votes(product_id: int):
+def get_product_price_history(product_id: int, start=None, end=None, resolution: str = 'hour'):
     """
-    Récupère tous les votes/notes/commentaires d'un produit
-    Retourne les détails de chaque vote avec infos sur l'utilisateur
+    Récupère l'historique des prix d'un produit en bougies OHLC pré-agrégées
+    
+    Args:
+        start, end: bornes de la période (défaut: fenêtre récente selon la résolution)
+        resolution: minute, hour ou day
     """
-    try:
-        product = Product.objects.get(id=product_id)
-        from apps.models.vote import Vote
-        
-        votes = Vote.objects.filter(product=product).select_related('user').order_by('-created_at')
-        
-        votes_list = []
-        for vote in votes:
-            votes_list.append({
-                'vote_id': vote.id,
-                'user_id': vote.user.id,
-                'username': vote.user.username,
-                'user_avatar': vote.user.avatar_url,
-                'note': vote.note,
-                'comment': vote.comment,
-                'like': vote.like,
-                'created_at': vote.created_at.isoformat()
-            })
-        
-        total_votes = len(votes_list)
-        total_likes = sum(1 for v in votes_list if v['like'])
-        average_note = sum(v['note'] for v in votes_list) / total_votes if total_votes > 0 else 0
-        
-        return {
-            'success': True,
-            'product_id': product_id,
-            'product_name': product.name,
-            'total_votes': total_votes,
-            'total_likes': total_likes,
-            'average_note': round(average_note, 2),
-            'votes': votes_list
-        }
+    product = Product.objects.filter(id=product_id).values('name', 'current_price').first()
+    if not product:
+        return {'success': False, 'error': 'Product not found'}
     
-    except Product.DoesNotExist:
+    if start and timezone.is_naive(start):
+        start = timezone.make_aware(start)
+    if end and timezone.is_naive(end):
+        end = timezone.make_aware(end)
+    
+    candles = get_price_candles(product_id, resolution=resolution, start=start, end=end)
+    
+    return {
+        'success': True,
+        'product_id': product_id,
+        'product_name': product['name'],
+        'current_price': float(product['current_price']),
+        'resolution': resolution,
+        'candles': candles
+    }
+
+
+VOTE_FEED_FIELDS = (
+    'id', 'user_id', 'user__username', 'user__avatar_url', 'note', 'comment', 'like', 'created_at'
+)
+
+def _vote_feed_query(product_id: int, after: str = None):
+    """Votes d'un produit du plus récent au plus ancien, à partir du curseur `after`"""
+    from apps.models.vote import Vote
+    
+    query = Vote.objects.filter(product_id=product_id)
+    return keyset_paginate(query, 'created_at', descending=True, after=after).values(*VOTE_FEED_FIELDS)
+
+def _vote_row(row: dict):
+    return {
+        'vote_id': row['id'],
+        'user_id': row['user_id'],
+        'username': row['user__username'],
+        'user_avatar': row['user__avatar_url'],
+        'note': row['note'],
+        'comment': row['comment'],
+        'like': row['like'],
+        'created_at': row['created_at'].isoformat()
+    }
+
+def get_product_votes(product_id: int, limit: int = 20, after: str = None):
+    """
+    Récupère une page des votes/notes/commentaires d'un produit, du plus récent au plus ancien
+    Retourne les détails de chaque vote avec infos sur l'utilisateur
+    
+    Args:
+        limit: Nombre de votes par page
+        after: Curseur opaque (pagination.next_cursor de la page précédente)
+    
+    Les totaux viennent des agrégats dénormalisés du produit (voir /likes-count)
+    Lève ValueError si le curseur est invalide
+    """
+    aggregates = get_vote_aggregates(product_id)
+    if aggregates is None:
         return {'success': False, 'error': 'Product not found'}
+    
+    rows = list(_vote_feed_query(product_id, after)[:limit + 1])
+    has_next = len(rows) > limit
+    rows = rows[:limit]
+    
+    return {
+        'success': True,
+        'product_id': product_id,
+        'product_name': aggregates['name'],
+        'total_votes': aggregates['vote_count'],
+        'total_likes': aggregates['like_count'],
+        'average_note': aggregates['average_note'],
+        'pagination': {
+            'limit': limit,
+            'has_next': has_next,
+            'next_cursor': encode_cursor('created_at', rows[-1]['created_at'], rows[-1]['id'], descending=True) if has_next else None
+        },
+        'votes': [_vote_row(row) for row in rows]
+    }
+
+def iter_product_votes_ndjson(product_id: int, after: str = None, chunk_size: int = 500):
+    """
+    Flux NDJSON (un vote JSON par ligne) de tous les votes d'un produit à partir de `after`
+    Lu par pages de `chunk_size` : la mémoire ne dépend pas du nombre de votes
+    """
+    import json
+    
+    while True:
+        rows = list(_vote_feed_query(product_id, after)[:chunk_size])
+        for row in rows:
+            yield json.dumps(_vote_row(row), ensure_ascii=False) + '\n'
+        if len(rows) < chunk_size:
+            return
+        after = encode_cursor('created_at', rows[-1]['created_at'], rows[-1]['id'], descending=True)
 
 def get_product_likes_count(product_id: int):
     """
     Récupère le nombre de likes d'un produit
-    Retourne aussi les statistiques rapides
+    Retourne aussi les statistiques rapides (une seule ligne lue, sans parcourir les votes)
     """
-    try:
-        product = Product.objects.get(id=product_id)
-        from apps.models.vote import Vote
-        
-        total_votes = Vote.objects.filter(product=product).count()
-        total_likes = Vote.objects.filter(product=product, like=True).count()
-        
-        voted_users = Vote.objects.filter(product=product).values_list('user__username', flat=True)
-        
-        return {
-            'success': True,
-            'product_id': product_id,
-            'product_name': product.name,
-            'total_votes': total_votes,
-            'total_likes': total_likes,
-            'like_percentage': round((total_likes / total_votes * 100), 2) if total_votes > 0 else 0,
-            'users_who_voted': list(voted_users)
-        }
-    
-    except Product.DoesNotExist:
+    aggregates = get_vote_aggregates(product_id)
+    if aggregates is None:
         return {'success': False, 'error': 'Product not found'}
+    
+    total_votes = aggregates['vote_count']
+    total_likes = aggregates['like_count']
+    
+    return {
+        'success': True,
+        'product_id': product_id,
+        'product_name': aggregates['name'],
+        'total_votes': total_votes,
+        'total_likes': total_likes,
+        'like_percentage': round((total_likes / total_votes * 100), 2) if total_votes > 0 else 0,
+        'average_note': aggregates['average_note']
+    }
 
 def get_top_products_by_sales(limit: int = 5):
     """
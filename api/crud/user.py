@@ -1,11 +1,16 @@
+from django.db import transaction
 from apps.models import CustomUser
 import bcrypt
 from apps.classes.log import create_log
+from apps.classes.orderStats import forget_user_orders, user_order_totals
+from apps.classes.voteStats import forget_user_votes, user_vote_totals
+from shared.pagination import keyset_paginate, encode_cursor
 
 def list_users():
     return CustomUser.objects.all()
 
-def list_users_advanced(search: str = None, role: str = None, page: int = 1, limit: int = 20):
+def list_users_advanced(search: str = None, role: str = None, page: int = 1, limit: int = 20,
+                        after: str = None):
     """
     Liste les utilisateurs avec filtres, recherche et pagination
     
@@ -14,6 +19,8 @@ def list_users_advanced(search: str = None, role: str = None, page: int = 1, lim
         role: Filtrer par rôle (ADMIN, EDITOR, USER, INVITE)
         page: Numéro de page (default: 1)
         limit: Nombre de résultats par page (default: 20, max: 100)
+        after: Curseur opaque (pagination.next_cursor de la page précédente).
+            Remplace page : pagination par clé sur l'id au lieu d'un OFFSET
     """
     query = CustomUser.objects.all()
     
@@ -26,10 +33,12 @@ def list_users_advanced(search: str = None, role: str = None, page: int = 1, lim
     
     limit = min(int(limit), 100) 
     page = max(int(page), 1)
-    offset = (page - 1) * limit
+    offset = 0 if after else (page - 1) * limit
     
     total_count = query.count()
-    users = query[offset:offset + limit]
+    users = list(keyset_paginate(query, 'id', after=after)[offset:offset + limit + 1])
+    has_next = len(users) > limit
+    users = users[:limit]
     
     users_list = []
     for user in users:
@@ -45,10 +54,12 @@ def list_users_advanced(search: str = None, role: str = None, page: int = 1, lim
     return {
         'success': True,
         'pagination': {
-            'page': page,
+            'page': None if after else page,
             'limit': limit,
             'total_count': total_count,
-            'total_pages': (total_count + limit - 1) // limit
+            'total_pages': (total_count + limit - 1) // limit,
+            'has_next': has_next,
+            'next_cursor': encode_cursor('id', users[-1].id, users[-1].id) if has_next else None
         },
         'users': users_list
     }
@@ -84,6 +95,12 @@ def delete_user(user_id: int, current_user_id: int = None):
     user = CustomUser.objects.filter(id=user_id).first()
     if not user:
         return False
-    user.delete()
+    # Les commandes et les votes de l'utilisateur partent en cascade : on les retire des agrégats
+    with transaction.atomic():
+        totals = user_order_totals(user_id)
+        votes = user_vote_totals(user_id)
+        user.delete()
+        forget_user_orders(totals)
+        forget_user_votes(votes)
     create_log("User deleted", current_user_id)
     return True
\ No newline at end of file
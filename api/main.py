@@ -1,5 +1,7 @@
 import os
+import asyncio
 import django
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -19,8 +21,36 @@ from api.router.vote import router as vote_router
 from api.router.mail import router as mail_router
 from api.router.log import router as log_router
 from api.router.chat import router as chat_router
+from shared.view_counter import view_counter
+from shared.repricing import repricing_scheduler
+from shared.websocket import manager as websocket_manager
+from shared.price_ticker import price_ticker, publish_price_updates
+from shared.invoice_queue import invoice_queue
+from shared.mail_pool import shutdown_mail_pools
 
-app = FastAPI(title="Orders API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    view_counter.start()
+    repricing_scheduler.add_listener(publish_price_updates)
+    repricing_scheduler.start()
+    await websocket_manager.start()
+    await price_ticker.start()
+    # Répartiteur des factures, avec reprise périodique des factures en retard
+    invoice_queue.start()
+    yield
+    await price_ticker.stop()
+    await websocket_manager.stop()
+    # Flush final : aucune consultation perdue à l'arrêt, puis dernier recalcul
+    await asyncio.to_thread(view_counter.stop)
+    await repricing_scheduler.stop()
+    # Les factures déjà en file sont terminées avant l'arrêt
+    await asyncio.to_thread(invoice_queue.shutdown)
+    # Les emails déjà en file sont envoyés avant l'arrêt
+    await asyncio.to_thread(shutdown_mail_pools)
+
+
+app = FastAPI(title="Orders API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -1,5 +1,8 @@
-from fastapi import APIRouter, WebSocket, Query
+from datetime import datetime
+from fastapi import APIRouter, WebSocket, Query, Depends
 from shared.websocket import manager, chat_websocket_endpoint
+from shared.security import require_roles
+from shared.env import Env
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
@@ -7,26 +10,42 @@ router = APIRouter(prefix="/chat", tags=["chat"])
 @router.websocket("/ws")
 async def websocket_chat_endpoint(
     websocket: WebSocket,
-    client_id: int = Query(..., description="User ID"),
-    username: str = Query(..., description="Username to display in chat")
+    client_id: int = Query(None, description="User ID"),
+    username: str = Query(None, description="Username to display in chat"),
+    rooms: str = Query(None, description="Rooms to join, comma separated (default: general)"),
+    token: str = Query(None, description="JWT, required for staff and order:<id> rooms"),
+    history: int = Query(Env.CHAT_HISTORY_REPLAY, ge=0, description="Messages replayed per joined room"),
+    since: datetime = Query(None, description="Only replay messages after this timestamp (resume)")
 ):
     """
     WebSocket endpoint for real-time chat
     
-    Connect with: ws://yourapi.com/chat/ws?client_id=123&username=YourName
+    Connect with: ws://yourapi.com/chat/ws?client_id=123&username=YourName&rooms=general,product:3
+    or: ws://yourapi.com/chat/ws?token=<jwt>&rooms=order:12
+    
+    Rooms: general, product:<id> (open to all), order:<id> (order owner and staff),
+    staff (ADMIN, EDITOR)
     
     Message format received:
     {
-        "type": "message" | "user_joined" | "user_left",
+        "type": "message" | "user_joined" | "user_left" | "joined" | "left" | "error",
+        "room": "general",
         "user_id": 123,
         "username": "YourName",
         "message": "Hello everyone!",
         "timestamp": "2026-02-12T10:30:00"
     }
     
-    To send a message: just send plain text through the WebSocket
+    On join, the last `history` messages of each room are replayed:
+    {"type": "history", "room": "general", "messages": [...]}
+    After a disconnection, reconnect with since=<timestamp of the last message received>
+    
+    To send a message to general: just send plain text through the WebSocket
+    Otherwise send JSON:
+    {"action": "join" | "leave", "room": "product:3"}
+    {"action": "message", "room": "product:3", "message": "Hello"}
     """
-    await chat_websocket_endpoint(websocket, client_id, username)
+    await chat_websocket_endpoint(websocket, client_id, username, rooms, token, history, since)
 
 
 @router.get("/users")
@@ -40,3 +59,26 @@ async def get_online_users():
         "online_users": manager.get_connected_users(),
         "count": manager.get_connection_count()
     }
+
+
+@router.get("/rooms")
+async def get_rooms():
+    """
+    Get active rooms and their subscriber count on this worker
+
+    Returns: {"rooms": {"general": 12, "product:3": 2}}
+    """
+    return {"rooms": manager.get_rooms()}
+
+
+@router.get("/metrics", dependencies=[Depends(require_roles("ADMIN", "EDITOR"))])
+async def get_chat_metrics():
+    """
+    WebSocket delivery metrics for this worker
+
+    Returns: counters (published, enqueued, sent, dropped, evicted), overflow policy,
+    total and max queue depth, and per-client queue depth / sent / dropped
+
+        Roles allowed: ADMIN, EDITOR
+    """
+    return manager.get_metrics()
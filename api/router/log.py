@@ -1,21 +1,22 @@
 from fastapi import APIRouter, Depends, HTTPException
-from apps.classes.log import get_logs
+from apps.classes.log import get_logs_page
 from shared.security import require_roles
 
 router = APIRouter(prefix="/logs", tags=["Logs"])
 
 @router.get("", dependencies=[Depends(require_roles("ADMIN"))])
-def get_all_logs(limit: int = 50):
+def get_all_logs(limit: int = 50, after: str = None):
     """
-    Récupère tous les logs du système
+    Récupère tous les logs du système, du plus récent au plus ancien
     
     Query params:
     - limit: Nombre maximum de logs à retourner (default: 50)
+    - after: Curseur de la page suivante (next_cursor de la réponse précédente)
     
     Roles allowed: ADMIN
     """
     try:
-        logs = get_logs(limit=limit)
+        logs, next_cursor = get_logs_page(limit=limit, after=after)
         
         logs_list = []
         for log in logs:
@@ -33,14 +34,17 @@ def get_all_logs(limit: int = 50):
         return {
             'success': True,
             'total': len(logs_list),
+            'next_cursor': next_cursor,
             'logs': logs_list
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/user/{user_id}", dependencies=[Depends(require_roles("ADMIN"))])
-def get_user_logs(user_id: int, limit: int = 50):
+def get_user_logs(user_id: int, limit: int = 50, after: str = None):
     """
     Récupère tous les logs d'un utilisateur spécifique
     
@@ -49,6 +53,7 @@ def get_user_logs(user_id: int, limit: int = 50):
     
     Query params:
     - limit: Nombre maximum de logs à retourner (default: 50)
+    - after: Curseur de la page suivante (next_cursor de la réponse précédente)
     
     Roles allowed: ADMIN
     """
@@ -59,7 +64,7 @@ def get_user_logs(user_id: int, limit: int = 50):
         if not user:
             raise HTTPException(status_code=404, detail="Utilisateur non trouvé")
         
-        logs = get_logs(user=user, limit=limit)
+        logs, next_cursor = get_logs_page(user=user, limit=limit, after=after)
         
         logs_list = []
         for log in logs:
@@ -79,9 +84,12 @@ def get_user_logs(user_id: int, limit: int = 50):
             'user_id': user_id,
             'username': user.username,
             'total': len(logs_list),
+            'next_cursor': next_cursor,
             'logs': logs_list
         }
     except HTTPException as e:
         raise e
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
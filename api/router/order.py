@@ -1,5 +1,6 @@
-from fastapi import APIRouter, HTTPException, Depends
-from fastapi.responses import StreamingResponse
+from datetime import date
+from fastapi import APIRouter, HTTPException, Depends, Header, Response
+from fastapi.responses import FileResponse, StreamingResponse
 from api.schemas.order import (
     OrderCreate, 
     OrderOut, 
@@ -27,7 +28,10 @@ from api.crud.order import (
     remove_discount,
     get_admin_stats
 )
-from shared.pdf_generator import generate_invoice_pdf
+from shared.env import Env
+from shared.invoice_batch import invoice_archive_entries, invoice_orders, iter_invoice_zip
+from shared.invoice_storage import content_hash, invoice_storage
+from shared.pdf_generator import ensure_invoice
 from shared.paypal_simulator import simulate_paypal_payment
 from apps.models import OrderItem
 from shared.security import require_roles
@@ -249,7 +253,7 @@ def process_order_payment(order_id: int, request: PaymentRequest):
     
     Si approuvé:
     - CONFIRMED -> PAID
-    - Génère le PDF de la facture
+    - Met le PDF de la facture en file de génération (suivi : /orders/{id}/invoice/status)
     - Crée un nouveau panier CART vide
     
     Si refusé:
@@ -271,7 +275,8 @@ def process_order_payment(order_id: int, request: PaymentRequest):
                 "message": result['message'],
                 "order_id": result['order_id'],
                 "status": result['status'],
-                "next_step": "Facture disponible au téléchargement"
+                "invoice_status": result['invoice_status'],
+                "next_step": "Facture en cours de génération"
             }
         else:
             return {
@@ -286,20 +291,102 @@ def process_order_payment(order_id: int, request: PaymentRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/{order_id}/invoice/status", dependencies=[Depends(require_roles("ADMIN", "EDITOR", "USER"))])
+def get_invoice_status(order_id: int):
+    """
+    Suivi de la génération de la facture
+    invoice_status : PENDING (en file), READY (téléchargeable), FAILED (voir invoice_error), vide si aucune
+    """
+    order = get_order(order_id)
+    if not order:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return {
+        "order_id": order.id,
+        "invoice_status": order.invoice_status,
+        "invoice_error": order.invoice_error,
+        "invoice_generated_at": order.invoice_generated_at,
+        "invoice_file": order.invoice_file.name if order.invoice_file else None
+    }
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
 @router.get("/{order_id}/invoice", dependencies=[Depends(require_roles("ADMIN", "EDITOR", "USER"))])
-def download_invoice(order_id: int):
-    """Télécharge la facture PDF d'une commande (PAID uniquement)"""
+def download_invoice(order_id: int, if_none_match: str = Header(None)):
+    """
+    Télécharge la facture PDF d'une commande
+    
+    Le fichier déjà généré est servi tel quel ; il n'est régénéré que s'il manque
+    ou si la commande a été modifiée depuis
+    - ETag : empreinte SHA-256 du PDF ; If-None-Match identique -> 304 sans corps
+    - Range / If-Range : téléchargement partiel ou repris (206), stockage local uniquement
+    """
     try:
-        pdf_buffer = generate_invoice_pdf(order_id)
-        return StreamingResponse(
-            iter([pdf_buffer.getvalue()]),
-            media_type="application/pdf",
-            headers={"Content-Disposition": f"attachment; filename=facture-{order_id:05d}.pdf"}
-        )
+        key = ensure_invoice(order_id)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    
+    etag = f'"{content_hash(key)}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    
+    filename = f"facture-{order_id:05d}.pdf"
+    filepath = invoice_storage.local_path(key)
+    if filepath is None:
+        headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return StreamingResponse(invoice_storage.open(key), media_type="application/pdf", headers=headers)
+    
+    return FileResponse(filepath, media_type="application/pdf", filename=filename, headers=headers)
+
+@router.get("/invoices/archive")
+def download_invoice_archive(
+    user_id: int = None,
+    date_from: date = None,
+    date_to: date = None,
+    payload = Depends(require_roles("ADMIN", "EDITOR", "USER"))
+):
+    """
+    Archive ZIP des factures d'un client et/ou d'une période (date de création incluse)
+    
+    Un USER ne reçoit que ses propres factures ; ADMIN et EDITOR précisent un
+    client ou une période. L'archive est envoyée au fil de l'eau : les PDF déjà
+    stockés sont relus par blocs, seuls les manquants sont générés.
+    """
+    if payload["role"] == "USER":
+        if user_id is not None and user_id != payload["id"]:
+            raise HTTPException(status_code=403, detail="Forbidden")
+        user_id = payload["id"]
+    elif user_id is None and date_from is None and date_to is None:
+        raise HTTPException(status_code=400, detail="Préciser user_id ou une période (date_from, date_to)")
+    
+    if date_from and date_to and date_from > date_to:
+        raise HTTPException(status_code=400, detail="date_from doit précéder date_to")
+    
+    orders = invoice_orders(date_from, date_to, user_id=user_id)
+    count = orders.count()
+    if not count:
+        raise HTTPException(status_code=404, detail="Aucune facture pour ces critères")
+    # Les PDF manquants sont rendus dans la requête : le nombre de commandes est borné
+    if count > Env.INVOICE_ARCHIVE_MAX_ORDERS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"{count} factures pour ces critères, {Env.INVOICE_ARCHIVE_MAX_ORDERS} au plus : réduire la période"
+        )
+    
+    parts = ["factures"]
+    if user_id is not None:
+        parts.append(f"user{user_id}")
+    parts.extend(d.isoformat() for d in (date_from, date_to) if d)
+    
+    return StreamingResponse(
+        iter_invoice_zip(invoice_archive_entries(orders)),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{"-".join(parts)}.zip"'}
+    )
 
 @router.post("/{order_id}/apply-discount", dependencies=[Depends(require_roles("USER", "EDITOR", "ADMIN"))])
 def apply_discount(order_id: int, discount_code: str):
@@ -1,5 +1,5 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query, WebSocket
+from fastapi.responses import FileResponse, StreamingResponse
 from api import router
 from api.schemas.product import ProductCreate, ProductOut
 from api.crud.product import (
@@ -12,14 +12,19 @@ from api.crud.product import (
     record_product_view,
     record_product_purchase,
     get_product_price_info,
+    get_product_price_history,
     get_product_votes,
+    iter_product_votes_ndjson,
     get_product_likes_count,
     get_top_products_by_sales
 )
 from shared.security import require_roles
+from shared.pagination import decode_cursor
+from shared.price_ticker import price_ticker_endpoint
 
 import os
 import shutil
+from datetime import datetime
 
 router = APIRouter(prefix="/products", tags=["Products"])
 
@@ -61,33 +66,43 @@ def get_products():
 
 @router.get("/search", response_model=dict, dependencies=[Depends(require_roles("USER", "EDITOR" ,"ADMIN"))])
 def search_products(search: str = None, category_id: int = None, min_price: float = None, 
-                   max_price: float = None, sort: str = 'id', order: str = 'asc',
-                   page: int = 1, limit: int = 20):
+                   max_price: float = None, sort: str = None, order: str = 'asc',
+                   page: int = 1, limit: int = 20, exact_total: bool = True,
+                   after: str = None):
     """
     Recherche et filtre les produits avec pagination et tri
     
     Query params:
-    - search: Recherche par nom ou description
+    - search: Recherche plein texte par nom ou description (sans accents, par préfixe)
     - category_id: Filtrer par catégorie (ID)
     - min_price: Prix minimum
     - max_price: Prix maximum
-    - sort: Champ de tri (id, name, price, popularity, stock, purchase_count)
+    - sort: Champ de tri (relevance, id, name, price, popularity, stock, purchase_count)
+      default: relevance si search, id sinon
     - order: Ordre (asc, desc)
     - page: Numéro de page (default: 1)
     - limit: Résultats par page (default: 20, max: 100)
+    - exact_total: Calculer le nombre total de résultats (default: true).
+      À false, pas de COUNT : seul pagination.has_next est renvoyé
+    - after: Curseur de la page suivante (pagination.next_cursor), remplace page
     
     Roles allowed: USER, EDITOR, ADMIN
     """
-    result = list_products_advanced(
-        search=search,
-        category_id=category_id,
-        min_price=min_price,
-        max_price=max_price,
-        sort=sort,
-        order=order,
-        page=page,
-        limit=limit
-    )
+    try:
+        result = list_products_advanced(
+            search=search,
+            category_id=category_id,
+            min_price=min_price,
+            max_price=max_price,
+            sort=sort,
+            order=order,
+            page=page,
+            limit=limit,
+            exact_total=exact_total,
+            after=after
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if not result.get('success'):
         raise HTTPException(status_code=500, detail=result.get('error', 'Error fetching products'))
     return result
@@ -132,11 +147,50 @@ def get_price_info(product_id: int):
         raise HTTPException(status_code=404, detail=result.get('error', 'Product not found'))
     return result
 
+@router.websocket("/ws/prices")
+async def websocket_price_ticker(
+    websocket: WebSocket,
+    ids: str = Query(None, description="Product IDs to watch, comma separated (default: all)"),
+    token: str = Query(None, description="JWT")
+):
+    """
+    Prix en direct, poussés à chaque tick de recalcul (remplace le polling de /price-info)
+    
+    Connect with: ws://yourapi.com/products/ws/prices?ids=1,2,3&token=<jwt>
+    Sans token valide (rôle USER, EDITOR ou ADMIN), la connexion est refusée (code 1008)
+    
+    Messages reçus :
+    - {"type": "snapshot", "prices": [...]} à la connexion (avec ids)
+    - {"type": "price", "product_id": 1, "price": 12.5, "previous_price": 12.1,
+       "price_change_percent": 3.31, "trend": "UP", "stock": 40, "timestamp": "..."}
+    - {"type": "prices", "updates": [...]} sans ids : tous les produits modifiés du tick
+    """
+    await price_ticker_endpoint(websocket, ids, token)
+
+@router.get("/{product_id}/price-history", dependencies=[Depends(require_roles("USER", "EDITOR" ,"ADMIN"))])
+def get_price_history(product_id: int, from_: datetime = Query(None, alias="from"),
+                      to: datetime = None, resolution: str = 'hour'):
+    """
+    Récupère l'historique des prix d'un produit (bougies OHLC)
+    
+    Query params:
+    - from: début de la période (ISO 8601, défaut: 6h / 7j / 1an selon la résolution)
+    - to: fin de la période (ISO 8601, défaut: maintenant)
+    - resolution: minute, hour ou day (default: hour)
+    """
+    try:
+        result = get_product_price_history(product_id, start=from_, end=to, resolution=resolution)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not result.get('success'):
+        raise HTTPException(status_code=404, detail=result.get('error', 'Product not found'))
+    return result
+
 @router.post("/{product_id}/view", dependencies=[Depends(require_roles("USER", "EDITOR" ,"ADMIN"))])
 def register_product_view(product_id: int):
     """
     Enregistre une consultation d'un produit
-    Augmente la demande et recalcule le prix
+    Augmente la demande, le prix est recalculé au prochain tick de recalcul
     Appeler cet endpoint chaque fois qu'un client consulte un produit
     """
     result = record_product_view(product_id)
@@ -148,7 +202,8 @@ def register_product_view(product_id: int):
 def register_product_purchase(product_id: int, quantity: int = 1):
     """
     Enregistre un achat d'un produit
-    Réduit le stock et recalcule le prix (achat pèse 3x plus dans la demande)
+    Réduit le stock et augmente la demande (achat pèse 3x plus dans la demande)
+    Le prix est recalculé au prochain tick de recalcul
     
     Query params:
     - quantity: nombre d'unités à acheter (default: 1)
@@ -165,16 +220,37 @@ def register_product_purchase(product_id: int, quantity: int = 1):
     return result
 
 @router.get("/{product_id}/votes", dependencies=[Depends(require_roles("USER", "EDITOR" ,"ADMIN"))])
-def get_product_reviews(product_id: int):
+def get_product_reviews(product_id: int,
+                        limit: int = Query(20, ge=1, le=100),
+                        after: str = None,
+                        stream: bool = False):
     """
-    Récupère tous les votes, notes et commentaires d'un produit
+    Récupère les votes, notes et commentaires d'un produit, du plus récent au plus ancien
     Affiche les détails de chaque vote avec infos utilisateur
     
+    Query params:
+    - limit: Nombre de votes par page (default: 20, max: 100)
+    - after: Curseur de la page suivante (pagination.next_cursor)
+    - stream: true pour recevoir tous les votes (depuis `after`) en NDJSON, un vote par ligne
+    
     Retourne:
-    - Tous les votes avec notes, commentaires et likes
-    - Contexte statistique (nombre total, moyenne des notes)
+    - Une page de votes avec notes, commentaires et likes
+    - Contexte statistique (nombre total, moyenne des notes) lu dans les agrégats du produit
     """
-    result = get_product_votes(product_id)
+    if stream:
+        if not get_product(product_id):
+            raise HTTPException(status_code=404, detail='Product not found')
+        if after:
+            try:
+                decode_cursor(after, 'created_at', descending=True)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        return StreamingResponse(iter_product_votes_ndjson(product_id, after), media_type="application/x-ndjson")
+    
+    try:
+        result = get_product_votes(product_id, limit=limit, after=after)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if not result.get('success'):
         raise HTTPException(status_code=404, detail=result.get('error', 'Product not found'))
     return result
@@ -188,7 +264,7 @@ def get_likes_summary(product_id: int):
     - Nombre total de likes
     - Nombre total de votes
     - Pourcentage de likes
-    - Liste des utilisateurs qui ont voté
+    - Note moyenne
     """
     result = get_product_likes_count(product_id)
     if not result.get('success'):
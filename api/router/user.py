@@ -23,7 +23,8 @@ def get_users():
     return list_users()
 
 @router.get("/search", response_model=dict, dependencies=[Depends(require_roles("ADMIN", "EDITOR"))])
-def search_users(search: str = None, role: str = None, page: int = 1, limit: int = 20):
+def search_users(search: str = None, role: str = None, page: int = 1, limit: int = 20,
+                 after: str = None):
     """
     Recherche et filtre les utilisateurs avec pagination
     
@@ -32,10 +33,14 @@ def search_users(search: str = None, role: str = None, page: int = 1, limit: int
     - role: Filtrer par rôle (ADMIN, EDITOR, USER, INVITE)
     - page: Numéro de page (default: 1)
     - limit: Résultats par page (default: 20, max: 100)
+    - after: Curseur de la page suivante (pagination.next_cursor), remplace page
     
     Roles allowed: ADMIN, EDITOR
     """
-    result = list_users_advanced(search=search, role=role, page=page, limit=limit)
+    try:
+        result = list_users_advanced(search=search, role=role, page=page, limit=limit, after=after)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if not result.get('success'):
         raise HTTPException(status_code=500, detail=result.get('error', 'Error fetching users'))
     return result
@@ -1,10 +1,13 @@
 
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
 from pydantic import BaseModel, Field
 from typing import List
-from decimal import Decimal
 from django.apps import apps
+from django.db import transaction
+from django.db.models import F
 from shared.security import require_roles
+from shared.repricing import repricing_scheduler
+from apps.classes.voteStats import vote_snapshot, record_vote_change
 
 
 try:
@@ -29,6 +32,7 @@ class LikePayload(BaseModel):
 
 class ProductRankingSchema(BaseModel):
     rank: int
+    product_id: int
     product_name: str
     price: float
     total_likes: int
@@ -55,30 +59,37 @@ def vote_product(product_id: int, payload: VotePayload):
             raise HTTPException(status_code=404, detail="Produit inconnu.")
 
         
-        vote, created = Vote.objects.update_or_create(
-            user_id=payload.user_id,
-            product_id=product_id,
-            defaults={
-                'note': payload.note,
-                'comment': payload.comment,
-                'like': payload.like  
-            }
-        )
+        with transaction.atomic():
+            existing = Vote.objects.select_for_update().filter(
+                user_id=payload.user_id,
+                product_id=product_id
+            ).first()
+            before = vote_snapshot(existing) if existing else None
+
+            vote, created = Vote.objects.update_or_create(
+                user_id=payload.user_id,
+                product_id=product_id,
+                defaults={
+                    'note': payload.note,
+                    'comment': payload.comment,
+                    'like': payload.like  
+                }
+            )
+            record_vote_change(product_id, before, vote_snapshot(vote))
 
-        product = Product.objects.get(id=product_id)
         if created:
-          
-            product.previous_price = product.current_price
-            product.popularity_score += 1.0
-            product.current_price = product.current_price * Decimal('1.01')
-            product.save()
+            # La majoration de prix d'un nouveau vote est appliquée au prochain tick de recalcul
+            Product.objects.filter(id=product_id).update(popularity_score=F('popularity_score') + 1.0)
+            repricing_scheduler.record_vote(product_id)
+
+        current_price = Product.objects.filter(id=product_id).values_list('current_price', flat=True).first()
 
         return {
             "status": "success", 
             "message": "Avis enregistré !",
             "note": vote.note,
             "liked": vote.like,
-            "new_price": product.current_price
+            "new_price": current_price
         }
 
     except Exception as e:
@@ -91,18 +102,21 @@ def toggle_like(product_id: int, payload: LikePayload):
         raise HTTPException(status_code=500, detail="Erreur interne : Modèle Vote non trouvé.")
         
     try:
-        vote, created = Vote.objects.get_or_create(
-            user_id=payload.user_id, 
-            product_id=product_id,
-            defaults={'note': 0, 'comment': None, 'like': False}
-        )
-
-        vote.like = not vote.like
-        vote.save()
+        with transaction.atomic():
+            vote, created = Vote.objects.select_for_update().get_or_create(
+                user_id=payload.user_id, 
+                product_id=product_id,
+                defaults={'note': 0, 'comment': None, 'like': False}
+            )
+            before = None if created else vote_snapshot(vote)
+
+            vote.like = not vote.like
+            vote.save()
+            record_vote_change(product_id, before, vote_snapshot(vote))
 
         status_message = "LIKED" if vote.like else "UNLIKED"
         
-        total_likes = Vote.objects.filter(product_id=product_id, like=True).count()
+        total_likes = Product.objects.filter(id=product_id).values_list('like_count', flat=True).first()
 
         return {
             "status": "success",
@@ -116,51 +130,35 @@ def toggle_like(product_id: int, payload: LikePayload):
 
 
 @router.get("/ranking", response_model=List[ProductRankingSchema], dependencies=[Depends(require_roles("USER", "EDITOR", "ADMIN"))])
-def get_products_ranking():
+def get_products_ranking(
+    limit: int = Query(20, ge=1, le=100, description="Nombre de produits par page (top N)"),
+    page: int = Query(1, ge=1)
+):
+    """
+    Classement des produits par nombre de likes (égalité : le plus ancien d'abord)
+    Une seule requête triée sur le compteur dénormalisé Product.like_count
+    """
     if Product is None or Vote is None:
         raise HTTPException(status_code=500, detail="Impossible de charger les données.")
 
     try:
-
-        
-        all_products = Product.objects.all()
-        ranking_list = []
-
-        for p in all_products:
-            
-            likes = Vote.objects.filter(product_id=p.id, like=True).count()
-            
-            ranking_list.append({
-                "product_name": p.name,
-                "price": float(p.current_price),
+        offset = (page - 1) * limit
+        rows = Product.objects.order_by('-like_count', 'id').values_list(
+            'id', 'name', 'current_price', 'like_count'
+        )[offset:offset + limit]
+
+        return [
+            {
+                "rank": offset + index + 1,
+                "product_id": product_id,
+                "product_name": name,
+                "price": float(price),
                 "total_likes": likes
-            })
-
-        
-        ranking_list.sort(key=lambda x: x['total_likes'], reverse=True)
-
-        
-        final_results = []
-        for index, item in enumerate(ranking_list):
-            final_results.append({
-                "rank": index + 1,
-                "product_name": item['product_name'],
-                "price": item['price'],
-                "total_likes": item['total_likes']
-            })
-
-        return final_results
+            }
+            for index, (product_id, name, price, likes) in enumerate(rows)
+        ]
 
     except Exception as e:
        
         print(f"ERREUR RANKING: {e}")
         raise HTTPException(status_code=500, detail=f"Erreur de classement: {str(e)}")
-
-
-
-
-
-
-
-
-
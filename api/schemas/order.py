@@ -38,6 +38,7 @@ class OrderOut(OrderBase):
     discount_code: str | None = None
     discount_amount: Decimal = 0
     invoice_file: str | None = None
+    invoice_status: str = ''
     confirmed_at: datetime | None = None
     paid_at: datetime | None = None
 
@@ -1,5 +1,6 @@
 from apps.models.log import Log
 from apps.models.customUser import CustomUser
+from shared.pagination import keyset_paginate, encode_cursor
 
 def create_log(message: str, user=None) -> Log:
     """Crée une entrée de log
@@ -24,11 +25,27 @@ def create_log(message: str, user=None) -> Log:
     return log
 
 
-def get_logs(user=None, limit: int = 50):
-    """Récupère les logs"""
+def get_logs(user=None, limit: int = 50, after: str = None):
+    """Récupère les logs
+    
+    Args:
+        user: Filtrer sur un utilisateur
+        limit: Nombre maximum de logs
+        after: Curseur opaque (voir get_logs_page), logs plus anciens que ce curseur
+    """
+    query = Log.objects.select_related('user')
     if user:
-        return Log.objects.filter(user=user).order_by('-created_at')[:limit]
-    return Log.objects.all().order_by('-created_at')[:limit]
+        query = query.filter(user=user)
+    return keyset_paginate(query, 'created_at', descending=True, after=after)[:limit]
+
+
+def get_logs_page(user=None, limit: int = 50, after: str = None):
+    """Récupère une page de logs et le curseur de la page suivante (None si dernière page)"""
+    logs = list(get_logs(user=user, limit=limit + 1, after=after))
+    if len(logs) <= limit:
+        return logs, None
+    logs = logs[:limit]
+    return logs, encode_cursor('created_at', logs[-1].created_at, logs[-1].id, descending=True)
 
 
 def log_action(request, action: str):
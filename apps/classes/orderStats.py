@@ -0,0 +1,221 @@
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Max, Min, Q, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, Least
+from django.utils import timezone
+from apps.models.order import Order
+from apps.models.orderItem import OrderItem
+from apps.models.orderStatusStat import OrderStatusStat
+
+# Statuts dont le montant ne bouge plus : seuls ceux-là alimentent les totaux
+AMOUNT_STATUSES = ('PAID', 'SHIPPED', 'DELIVERED')
+
+# Champs comparés par check_order_stats
+STAT_FIELDS = (
+    'order_count', 'customer_count', 'item_count',
+    'total_amount', 'discount_amount', 'min_amount', 'max_amount'
+)
+
+
+def order_snapshot(order) -> dict:
+    """Photo d'une commande telle que comptée dans les agrégats"""
+    tracked = order.status in AMOUNT_STATUSES
+    return {
+        'status': order.status,
+        'user_id': order.user_id,
+        'total_amount': Decimal(order.total_amount) if tracked else Decimal('0'),
+        'discount_amount': Decimal(order.discount_amount) if tracked else Decimal('0'),
+        'item_count': OrderItem.objects.filter(order_id=order.id).count() if tracked else 0
+    }
+
+
+def _apply(order_id: int, snapshot: dict, sign: int):
+    status = snapshot['status']
+    updates = {
+        'order_count': F('order_count') + sign,
+        'updated_at': timezone.now()
+    }
+
+    if status in AMOUNT_STATUSES:
+        amount = snapshot['total_amount']
+        updates['total_amount'] = F('total_amount') + sign * amount
+        updates['discount_amount'] = F('discount_amount') + sign * snapshot['discount_amount']
+        updates['item_count'] = F('item_count') + sign * snapshot['item_count']
+        if sign > 0:
+            value = Value(amount, output_field=DecimalField(max_digits=10, decimal_places=2))
+            updates['min_amount'] = Least(Coalesce(F('min_amount'), value), value)
+            updates['max_amount'] = Greatest(Coalesce(F('max_amount'), value), value)
+
+    has_other_order = Order.objects.filter(
+        user_id=snapshot['user_id'],
+        status=status
+    ).exclude(id=order_id).exists()
+    if not has_other_order:
+        updates['customer_count'] = F('customer_count') + sign
+
+    OrderStatusStat.objects.filter(status=status).update(**updates)
+
+    if sign < 0 and status in AMOUNT_STATUSES:
+        # Le montant retiré était le min ou le max : on relit les bornes
+        at_bound = OrderStatusStat.objects.filter(status=status).filter(
+            Q(min_amount=snapshot['total_amount']) | Q(max_amount=snapshot['total_amount'])
+        )
+        if at_bound.exists():
+            _refresh_bounds(status)
+
+
+def _refresh_bounds(status: str):
+    bounds = Order.objects.filter(status=status).aggregate(minimum=Min('total_amount'), maximum=Max('total_amount'))
+    OrderStatusStat.objects.filter(status=status).update(min_amount=bounds['minimum'], max_amount=bounds['maximum'])
+
+
+def record_order_change(order_id: int, before: dict = None, after: dict = None):
+    """
+    Répercute un changement de commande sur les agrégats par statut
+    À appeler après l'enregistrement, dans la même transaction (sinon customer_count
+    peut dériver), avec les photos (order_snapshot) d'avant et d'après :
+    - création : before=None
+    - suppression : after=None
+
+    Sans effet tant que rebuild_order_stats n'a pas initialisé la table
+    """
+    if before == after:
+        return
+    with transaction.atomic():
+        # Lignes de statut verrouillées avant les tests d'existence de _apply (ordre fixe,
+        # pas d'interblocage) : deux transitions concurrentes d'un même client passent
+        # l'une après l'autre, et la seconde voit la commande validée par la première
+        statuses = sorted({snapshot['status'] for snapshot in (before, after) if snapshot})
+        list(OrderStatusStat.objects.select_for_update().filter(status__in=statuses).order_by('status').values_list('id', flat=True))
+        if before:
+            _apply(order_id, before, -1)
+        if after:
+            _apply(order_id, after, 1)
+
+
+def snapshot_orders(order_ids) -> dict:
+    """Photos {order_id: order_snapshot} des commandes, avant une écriture qui les touche"""
+    return {order.id: order_snapshot(order) for order in Order.objects.filter(id__in=list(order_ids))}
+
+
+def record_orders_change(before: dict):
+    """
+    Répercute sur les agrégats les changements depuis snapshot_orders
+    (articles ajoutés, modifiés ou retirés d'une commande payée...)
+    """
+    after = snapshot_orders(before)
+    for order_id, snapshot in before.items():
+        record_order_change(order_id, snapshot, after.get(order_id))
+
+
+def user_order_totals(user_id: int) -> list:
+    """Contribution des commandes d'un client aux agrégats, par statut, à prendre avant sa suppression"""
+    orders = Order.objects.filter(user_id=user_id).order_by()
+    items = dict(
+        OrderItem.objects.filter(order__user_id=user_id, order__status__in=AMOUNT_STATUSES)
+        .order_by().values_list('order__status').annotate(count=Count('id'))
+    )
+    totals = []
+    for row in orders.values('status').annotate(
+        order_count=Count('id'),
+        total=Sum('total_amount'),
+        discount=Sum('discount_amount')
+    ):
+        row['item_count'] = items.get(row['status'], 0)
+        totals.append(row)
+    return totals
+
+
+def forget_user_orders(totals: list):
+    """
+    Retire des agrégats les commandes d'un client supprimé (suppression en cascade)
+    `totals` vient de user_order_totals, appelé avant la suppression
+    """
+    with transaction.atomic():
+        for row in totals:
+            updates = {
+                'order_count': F('order_count') - row['order_count'],
+                'customer_count': F('customer_count') - 1,
+                'updated_at': timezone.now()
+            }
+            if row['status'] in AMOUNT_STATUSES:
+                updates['total_amount'] = F('total_amount') - (row['total'] or 0)
+                updates['discount_amount'] = F('discount_amount') - (row['discount'] or 0)
+                updates['item_count'] = F('item_count') - row['item_count']
+            OrderStatusStat.objects.filter(status=row['status']).update(**updates)
+            if row['status'] in AMOUNT_STATUSES:
+                _refresh_bounds(row['status'])
+
+
+def _expected_order_stats() -> dict:
+    """Agrégats {status: OrderStatusStat} recalculés depuis l'historique des commandes"""
+    rows = {
+        status: OrderStatusStat(status=status)
+        for status, _ in Order.STATUS_CHOICES
+    }
+
+    for row in Order.objects.values('status').annotate(
+        order_count=Count('id'),
+        customer_count=Count('user', distinct=True),
+        total=Sum('total_amount'),
+        discount=Sum('discount_amount'),
+        minimum=Min('total_amount'),
+        maximum=Max('total_amount')
+    ):
+        stat = rows.setdefault(row['status'], OrderStatusStat(status=row['status']))
+        stat.order_count = row['order_count']
+        stat.customer_count = row['customer_count']
+        if row['status'] in AMOUNT_STATUSES:
+            stat.total_amount = row['total'] or 0
+            stat.discount_amount = row['discount'] or 0
+            stat.min_amount = row['minimum']
+            stat.max_amount = row['maximum']
+
+    for row in OrderItem.objects.filter(order__status__in=AMOUNT_STATUSES).values('order__status').annotate(
+        item_count=Count('id')
+    ):
+        rows[row['order__status']].item_count = row['item_count']
+
+    return rows
+
+
+def rebuild_order_stats() -> int:
+    """Recalcule tous les agrégats depuis l'historique des commandes"""
+    rows = _expected_order_stats()
+
+    with transaction.atomic():
+        OrderStatusStat.objects.all().delete()
+        OrderStatusStat.objects.bulk_create(rows.values())
+
+    return len(rows)
+
+
+def check_order_stats() -> list:
+    """
+    Compare les agrégats stockés à l'historique des commandes
+    (dérive possible après une écriture hors API, une suppression en base...)
+
+    Retourne la liste des statuts en écart : {status, field: (stocké, attendu)}
+    Liste vide si les agrégats n'ont jamais été initialisés
+    """
+    stored = get_order_stats()
+    if stored is None:
+        return []
+
+    drifted = []
+    for status, expected in sorted(_expected_order_stats().items()):
+        stat = stored.get(status)
+        report = {'status': status}
+        for field in STAT_FIELDS:
+            value = getattr(stat, field) if stat else None
+            if value != getattr(expected, field):
+                report[field] = (value, getattr(expected, field))
+        if len(report) > 1:
+            drifted.append(report)
+    return drifted
+
+
+def get_order_stats():
+    """Agrégats par statut {status: OrderStatusStat}, ou None si jamais initialisés"""
+    stats = {stat.status: stat for stat in OrderStatusStat.objects.all()}
+    return stats or None
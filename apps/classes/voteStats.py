@@ -0,0 +1,111 @@
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from apps.models.product import Product
+from apps.models.vote import Vote
+
+AGGREGATE_FIELDS = ('vote_count', 'like_count', 'note_sum')
+
+
+def vote_snapshot(vote) -> dict:
+    """Photo d'un vote telle que comptée dans les agrégats du produit"""
+    return {'like': bool(vote.like), 'note': vote.note}
+
+
+def record_vote_change(product_id: int, before: dict = None, after: dict = None):
+    """
+    Répercute un changement de vote sur les agrégats dénormalisés du produit
+    (vote_count, like_count, note_sum) en un seul UPDATE avec F()
+    À appeler dans la même transaction que l'enregistrement du vote, avec les photos
+    (vote_snapshot) d'avant et d'après : création -> before=None, suppression -> after=None
+    """
+    deltas = {
+        'vote_count': int(after is not None) - int(before is not None),
+        'like_count': int(bool(after and after['like'])) - int(bool(before and before['like'])),
+        'note_sum': (after['note'] if after else 0) - (before['note'] if before else 0)
+    }
+    updates = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if updates:
+        Product.objects.filter(id=product_id).update(**updates)
+
+
+def user_vote_totals(user_id: int) -> list:
+    """Contribution des votes d'un utilisateur aux agrégats, par produit, à prendre avant sa suppression"""
+    return list(
+        Vote.objects.filter(user_id=user_id).order_by().values('product_id').annotate(
+            vote_count=Count('id'),
+            like_count=Count('id', filter=Q(like=True)),
+            note_sum=Coalesce(Sum('note'), 0)
+        )
+    )
+
+
+def forget_user_votes(totals: list):
+    """
+    Retire des agrégats les votes d'un utilisateur supprimé (suppression en cascade)
+    `totals` vient de user_vote_totals, appelé avant la suppression ; un UPDATE avec F() par produit
+    """
+    with transaction.atomic():
+        for row in totals:
+            updates = {field: F(field) - row[field] for field in AGGREGATE_FIELDS if row[field]}
+            if updates:
+                Product.objects.filter(id=row['product_id']).update(**updates)
+
+
+def get_vote_aggregates(product_id: int):
+    """Agrégats des votes d'un produit (lecture d'une ligne), None si produit inconnu"""
+    row = Product.objects.filter(id=product_id).values('name', *AGGREGATE_FIELDS).first()
+    if row is None:
+        return None
+    row['average_note'] = round(row['note_sum'] / row['vote_count'], 2) if row['vote_count'] else 0
+    return row
+
+
+def _expected_aggregates():
+    """Produits annotés avec les agrégats recalculés depuis la table Vote"""
+    votes = Vote.objects.filter(product=OuterRef('pk')).values('product')
+
+    def subquery(aggregate):
+        return Coalesce(
+            Subquery(votes.annotate(total=aggregate).values('total'), output_field=IntegerField()),
+            0
+        )
+
+    return Product.objects.annotate(
+        expected_vote_count=subquery(Count('id')),
+        expected_like_count=subquery(Count('id', filter=Q(like=True))),
+        expected_note_sum=subquery(Sum('note'))
+    )
+
+
+def reconcile_vote_stats(fix: bool = False) -> list:
+    """
+    Compare les agrégats dénormalisés au contenu de la table Vote
+    (dérive possible après une écriture hors API, une suppression en base...)
+
+    Retourne la liste des produits en écart : {product_id, name, field: (stocké, attendu)}
+    Avec fix=True, les valeurs attendues remplacent les valeurs stockées
+    """
+    drift_filter = Q()
+    for field in AGGREGATE_FIELDS:
+        drift_filter |= ~Q(**{field: F(f'expected_{field}')})
+
+    drifted = []
+    with transaction.atomic():
+        query = _expected_aggregates().filter(drift_filter).order_by('id')
+        if fix:
+            query = query.select_for_update()
+
+        for row in query.values('id', 'name', *AGGREGATE_FIELDS, *(f'expected_{f}' for f in AGGREGATE_FIELDS)):
+            report = {'product_id': row['id'], 'name': row['name']}
+            for field in AGGREGATE_FIELDS:
+                if row[field] != row[f'expected_{field}']:
+                    report[field] = (row[field], row[f'expected_{field}'])
+            drifted.append(report)
+
+            if fix:
+                Product.objects.filter(id=row['id']).update(**{
+                    field: row[f'expected_{field}'] for field in AGGREGATE_FIELDS
+                })
+
+    return drifted
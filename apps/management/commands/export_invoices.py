@@ -0,0 +1,81 @@
+import sys
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from shared.env import Env
+from shared.invoice_batch import (
+    INVOICED_STATUSES,
+    archive_format,
+    export_invoices,
+    invoice_orders,
+    regenerate_invoices
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Régénère en masse les factures des commandes créées sur une période, "
+        "ou les exporte dans une archive ZIP/TAR"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--from',
+            dest='date_from',
+            type=date.fromisoformat,
+            required=True,
+            help="Première date de création incluse (AAAA-MM-JJ)"
+        )
+        parser.add_argument(
+            '--to',
+            dest='date_to',
+            type=date.fromisoformat,
+            default=date.today(),
+            help="Dernière date de création incluse (AAAA-MM-JJ, aujourd'hui par défaut)"
+        )
+        parser.add_argument(
+            '--status',
+            nargs='+',
+            default=list(INVOICED_STATUSES),
+            help=f"Statuts de commande concernés (défaut : {' '.join(INVOICED_STATUSES)})"
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=Env.INVOICE_WORKERS,
+            help="Nombre de processus de rendu (0 : dans le processus courant)"
+        )
+        parser.add_argument(
+            '--archive',
+            help="Écrire une archive (.zip, .tar, .tar.gz ; '-' pour un ZIP sur la sortie standard) "
+                 "au lieu de régénérer les factures stockées"
+        )
+
+    def _progress(self, done: int, total: int, failed: int):
+        # Sur la sortie d'erreur : la sortie standard peut porter l'archive
+        if done == total or done % 100 == 0:
+            end = "\n" if done == total else "\r"
+            sys.stderr.write(f"{done}/{total} facture(s), {failed} en échec{end}")
+            sys.stderr.flush()
+
+    def handle(self, *args, **options):
+        if options['date_from'] > options['date_to']:
+            raise CommandError("--from doit précéder --to")
+
+        orders = invoice_orders(options['date_from'], options['date_to'], options['status'])
+        archive = options['archive']
+
+        if archive is None:
+            result = regenerate_invoices(orders, options['workers'], self._progress)
+        elif archive == '-':
+            result = export_invoices(orders, sys.stdout.buffer, 'zip', options['workers'], self._progress)
+        else:
+            with open(archive, 'wb') as f:
+                result = export_invoices(orders, f, archive_format(archive), options['workers'], self._progress)
+
+        message = (
+            f"{result['rendered']}/{result['total']} facture(s) générée(s) "
+            f"en {result['elapsed']:.1f} s"
+        )
+        if result['failed']:
+            raise CommandError(f"{message}, {result['failed']} en échec (voir invoice_error)")
+        sys.stderr.write(self.style.SUCCESS(message) + "\n")
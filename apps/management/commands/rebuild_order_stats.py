@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from apps.classes.orderStats import STAT_FIELDS, check_order_stats, rebuild_order_stats, get_order_stats
+
+
+class Command(BaseCommand):
+    help = "Recalcule les agrégats de commandes par statut (OrderStatusStat) depuis l'historique"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help="Vérifier seulement les agrégats stockés, sans les reconstruire"
+        )
+
+    def handle(self, *args, **options):
+        if options['check']:
+            if get_order_stats() is None:
+                raise CommandError("Agrégats de commandes jamais initialisés (lancer sans --check)")
+
+            drifted = check_order_stats()
+            for report in drifted:
+                details = ', '.join(
+                    f"{field} {report[field][0]} -> {report[field][1]}"
+                    for field in STAT_FIELDS if field in report
+                )
+                self.stdout.write(f"{report['status']} : {details}")
+
+            if drifted:
+                raise CommandError(f"{len(drifted)} statut(s) en écart (relancer sans --check pour reconstruire)")
+            self.stdout.write(self.style.SUCCESS("Agrégats de commandes cohérents"))
+            return
+
+        rebuild_order_stats()
+
+        for status, stat in sorted(get_order_stats().items()):
+            self.stdout.write(
+                f"{status:<10} {stat.order_count:>8} commande(s)  {stat.total_amount:>12} €"
+            )
+        self.stdout.write(self.style.SUCCESS("Agrégats de commandes reconstruits"))
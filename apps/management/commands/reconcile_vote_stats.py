@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from apps.classes.voteStats import AGGREGATE_FIELDS, reconcile_vote_stats
+
+
+class Command(BaseCommand):
+    help = "Vérifie les agrégats de votes des produits (votes, likes, somme des notes) contre la table Vote"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help="Corriger les produits en écart"
+        )
+
+    def handle(self, *args, **options):
+        drifted = reconcile_vote_stats(fix=options['fix'])
+
+        for report in drifted:
+            details = ', '.join(
+                f"{field} {report[field][0]} -> {report[field][1]}"
+                for field in AGGREGATE_FIELDS if field in report
+            )
+            self.stdout.write(f"#{report['product_id']} {report['name']} : {details}")
+
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS("Agrégats de votes cohérents"))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS(f"{len(drifted)} produit(s) corrigé(s)"))
+        else:
+            raise CommandError(f"{len(drifted)} produit(s) en écart (relancer avec --fix pour corriger)")
@@ -0,0 +1,29 @@
+import time
+from django.core.management.base import BaseCommand
+from shared.repricing import reprice_products
+
+
+class Command(BaseCommand):
+    help = "Recalcule le prix de tout le catalogue en une passe vectorisée et un seul bulk update"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ids',
+            nargs='+',
+            type=int,
+            help="Limiter le recalcul à ces IDs de produits"
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        results = reprice_products(options['ids'])
+        elapsed = (time.perf_counter() - start) * 1000
+
+        trends = {'UP': 0, 'DOWN': 0, 'STABLE': 0}
+        for result in results.values():
+            trends[result['indicator']['trend']] += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(results)} produit(s) recalculé(s) en {elapsed:.1f} ms "
+            f"(↑ {trends['UP']}, ↓ {trends['DOWN']}, → {trends['STABLE']})"
+        ))
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0012_alter_shiftnote_date'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceCandle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('minute', 'Minute'), ('hour', 'Hour'), ('day', 'Day')], max_length=10)),
+                ('bucket_start', models.DateTimeField()),
+                ('open', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('high', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('low', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('close', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('samples', models.PositiveIntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_candles', to='apps.product')),
+            ],
+            options={
+                'unique_together': {('product', 'resolution', 'bucket_start')},
+            },
+        ),
+        migrations.CreateModel(
+            name='PricePoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('recorded_at', models.DateTimeField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_points', to='apps.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'recorded_at'], name='apps_pricep_product_b0d7f1_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0013_pricecandle_pricepoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderStatusStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(max_length=20, unique=True)),
+                ('order_count', models.IntegerField(default=0)),
+                ('customer_count', models.IntegerField(default=0)),
+                ('item_count', models.IntegerField(default=0)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('discount_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('min_amount', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('max_amount', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
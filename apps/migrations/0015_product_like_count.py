@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:23
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_like_count(apps, schema_editor):
+    Product = apps.get_model('apps', 'Product')
+    Vote = apps.get_model('apps', 'Vote')
+    likes = Vote.objects.filter(product=OuterRef('pk')).values('product').annotate(
+        total=Count('id', filter=Q(like=True))
+    ).values('total')
+    Product.objects.update(like_count=Coalesce(Subquery(likes, output_field=IntegerField()), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0014_orderstatusstat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='like_count',
+            field=models.IntegerField(db_index=True, default=0),
+        ),
+        migrations.RunPython(backfill_like_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:23
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_vote_aggregates(apps, schema_editor):
+    Product = apps.get_model('apps', 'Product')
+    Vote = apps.get_model('apps', 'Vote')
+    votes = Vote.objects.filter(product=OuterRef('pk')).values('product')
+    Product.objects.update(
+        vote_count=Coalesce(Subquery(votes.annotate(total=Count('id')).values('total'), output_field=IntegerField()), 0),
+        note_sum=Coalesce(Subquery(votes.annotate(total=Sum('note')).values('total'), output_field=IntegerField()), 0)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0015_product_like_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='note_sum',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='vote_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_vote_aggregates, migrations.RunPython.noop),
+    ]
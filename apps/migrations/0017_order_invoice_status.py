@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0016_product_vote_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='invoice_error',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='invoice_generated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='invoice_status',
+            field=models.CharField(blank=True, choices=[('PENDING', 'Invoice Queued'), ('READY', 'Invoice Ready'), ('FAILED', 'Invoice Failed')], default='', max_length=10),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0017_order_invoice_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='invoice_attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='invoice_requested_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0018_order_invoice_retry'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='log',
+            index=models.Index(fields=['created_at', 'id'], name='apps_log_created_03ec45_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['name', 'id'], name='apps_produc_name_f80eb8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['current_price', 'id'], name='apps_produc_current_48d042_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['popularity_score', 'id'], name='apps_produc_popular_38e797_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['stock', 'id'], name='apps_produc_stock_c9a965_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['purchase_count', 'id'], name='apps_produc_purchas_382cd0_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apps', '0019_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='vote',
+            index=models.Index(fields=['product', 'created_at', 'id'], name='apps_vote_product_e242c5_idx'),
+        ),
+    ]
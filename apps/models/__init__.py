@@ -4,6 +4,9 @@ from .category import Category
 from .log import Log
 from .order import Order
 from .orderItem import OrderItem
+from .orderStatusStat import OrderStatusStat
+from .priceCandle import PriceCandle
+from .pricePoint import PricePoint
 from .product import Product
 from .shiftNote import ShiftNote
 from .twoFactorCode import TwoFactorCode
@@ -16,6 +19,9 @@ __all__ = [
     'Log',
     'Order',
     'OrderItem',
+    'OrderStatusStat',
+    'PriceCandle',
+    'PricePoint',
     'Product',
     'ShiftNote',
     'TwoFactorCode',
@@ -7,4 +7,7 @@ class Log(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+        ]
 
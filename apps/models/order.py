@@ -11,6 +11,13 @@ class Order(models.Model):
         ('CANCELLED', 'Cancelled'),
     ]
     
+    # Génération de la facture en tâche de fond (shared/invoice_queue.py)
+    INVOICE_STATUS_CHOICES = [
+        ('PENDING', 'Invoice Queued'),
+        ('READY', 'Invoice Ready'),
+        ('FAILED', 'Invoice Failed'),
+    ]
+    
     user = models.ForeignKey('CustomUser', on_delete=models.CASCADE)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='CART')
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
@@ -40,4 +47,10 @@ class Order(models.Model):
     
     # Fichier
     invoice_file = models.FileField(upload_to='orders/invoices/', blank=True, null=True)
+    invoice_status = models.CharField(max_length=10, choices=INVOICE_STATUS_CHOICES, blank=True, default='')
+    invoice_error = models.TextField(blank=True, null=True)
+    invoice_generated_at = models.DateTimeField(blank=True, null=True)
+    # Dernière mise en file et nombre d'essais, pour la reprise des factures en retard
+    invoice_requested_at = models.DateTimeField(blank=True, null=True)
+    invoice_attempts = models.PositiveSmallIntegerField(default=0)
     
\ No newline at end of file
@@ -0,0 +1,20 @@
+from django.db import models
+
+class OrderStatusStat(models.Model):
+    """
+    Agrégats des commandes par statut, tenus à jour à chaque transition
+    (voir apps/classes/orderStats.py). Les montants ne sont suivis que pour les
+    statuts où le montant est figé (PAID et suivants)
+    """
+    status = models.CharField(max_length=20, unique=True)
+    order_count = models.IntegerField(default=0)
+    customer_count = models.IntegerField(default=0)
+    item_count = models.IntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    discount_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    min_amount = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    max_amount = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.status}: {self.order_count}"
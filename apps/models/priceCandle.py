@@ -0,0 +1,24 @@
+from django.db import models
+
+class PriceCandle(models.Model):
+    """Agrégat OHLC des prix par produit et par intervalle, mis à jour à chaque recalcul"""
+    RESOLUTION_CHOICES = [
+        ('minute', 'Minute'),
+        ('hour', 'Hour'),
+        ('day', 'Day'),
+    ]
+
+    product = models.ForeignKey('Product', related_name='price_candles', on_delete=models.CASCADE)
+    resolution = models.CharField(max_length=10, choices=RESOLUTION_CHOICES)
+    bucket_start = models.DateTimeField()
+    open = models.DecimalField(max_digits=10, decimal_places=2)
+    high = models.DecimalField(max_digits=10, decimal_places=2)
+    low = models.DecimalField(max_digits=10, decimal_places=2)
+    close = models.DecimalField(max_digits=10, decimal_places=2)
+    samples = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('product', 'resolution', 'bucket_start')
+
+    def __str__(self):
+        return f"{self.product_id} {self.resolution} {self.bucket_start}"
@@ -0,0 +1,15 @@
+from django.db import models
+
+class PricePoint(models.Model):
+    """Historique brut des prix, en ajout seul (une ligne par recalcul)"""
+    product = models.ForeignKey('Product', related_name='price_points', on_delete=models.CASCADE)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    recorded_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', 'recorded_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} @ {self.recorded_at}: {self.price}"
@@ -17,6 +17,22 @@ class Product(models.Model):
     price_change_percentage = models.FloatField(default=0.0)
     last_price_update = models.DateTimeField(default=timezone.now)
     previous_price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    # Agrégats des votes, tenus à jour par apps/classes/voteStats.py
+    like_count = models.IntegerField(default=0, db_index=True)
+    vote_count = models.IntegerField(default=0)
+    note_sum = models.IntegerField(default=0)
+    # Dernier save() : les autres workers y relisent les produits modifiés (shared/search_index.py)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        # Un index (tri, id) par tri du catalogue : pagination par clé sans tri en mémoire
+        indexes = [
+            models.Index(fields=['name', 'id']),
+            models.Index(fields=['current_price', 'id']),
+            models.Index(fields=['popularity_score', 'id']),
+            models.Index(fields=['stock', 'id']),
+            models.Index(fields=['purchase_count', 'id']),
+        ]
 
     def __str__(self):
         return self.name
@@ -10,6 +10,10 @@ class Vote(models.Model):
 
     class Meta:
         unique_together = ('user', 'product')
+        # Fil des votes d'un produit, paginé par clé sur (created_at, id)
+        indexes = [
+            models.Index(fields=['product', 'created_at', 'id']),
+        ]
 
     def __str__(self):
         return f"Vote sur {self.product_id} par utilisateur {self.user_id}"
\ No newline at end of file
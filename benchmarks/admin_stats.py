@@ -0,0 +1,140 @@
+"""
+Benchmark des statistiques admin (/orders/admin/stats)
+
+Remplit une base SQLite jetable avec N commandes puis mesure, pour chaque taille,
+le nombre de requêtes SQL et la latence de :
+- legacy : l'ancien calcul (commandes chargées en Python)
+- live   : le calcul par agrégats SQL (_order_totals_live)
+- rollup : la lecture des agrégats OrderStatusStat (_order_totals_from_rollup)
+
+Usage :
+    python benchmarks/admin_stats.py
+    python benchmarks/admin_stats.py --sizes 10000,100000 --repeat 3 --skip-legacy
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+
+import core.settings
+
+DB_PATH = os.path.join(tempfile.mkdtemp(prefix="bench_stats_"), "bench.sqlite3")
+core.settings.DATABASES = {'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': DB_PATH}}
+
+import django
+django.setup()
+
+from django.core.management import call_command
+from django.db import connection
+from apps.models import Category, Order, OrderItem, Product
+from apps.models.customUser import CustomUser
+from apps.classes.orderStats import get_order_stats, rebuild_order_stats
+from api.crud.order import _order_totals_from_rollup, _order_totals_live
+
+STATUSES = ['CART', 'PENDING', 'CONFIRMED', 'PAID', 'PAID', 'PAID', 'SHIPPED', 'DELIVERED']
+BATCH_SIZE = 10000
+
+
+def legacy_totals():
+    """Ancien calcul : une requête par statut et les commandes payées itérées en Python"""
+    paid_orders = Order.objects.filter(status='PAID')
+    total_revenue = sum(order.total_amount for order in paid_orders)
+    sum(order.discount_amount for order in paid_orders)
+    counts = [Order.objects.filter(status=s).count() for s in ('CART', 'PENDING', 'CONFIRMED', 'PAID', 'SHIPPED')]
+    Order.objects.all().count()
+    if paid_orders.exists():
+        amounts = [order.total_amount for order in paid_orders]
+        total_revenue / len(amounts), min(amounts), max(amounts)
+    OrderItem.objects.filter(order__status='PAID').count()
+    paid_orders.values('user').distinct().count()
+    return counts
+
+
+def seed(users, product, start: int, end: int):
+    """Ajoute les commandes start..end-1 (un article par commande non panier)"""
+    rng = random.Random(start)
+    for offset in range(start, end, BATCH_SIZE):
+        size = min(BATCH_SIZE, end - offset)
+        orders = Order.objects.bulk_create([
+            Order(
+                user=rng.choice(users),
+                status=rng.choice(STATUSES),
+                total_amount=Decimal(rng.randint(500, 50000)) / 100,
+                discount_amount=Decimal(rng.choice((0, 0, 0, 500))) / 100
+            )
+            for _ in range(size)
+        ], batch_size=BATCH_SIZE)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, quantity=1, unit_price_frozen=order.total_amount)
+            for order in orders if order.status != 'CART'
+        ], batch_size=BATCH_SIZE)
+
+
+def measure(func, repeat: int):
+    executed = []
+
+    def count_query(execute, sql, params, many, context):
+        executed.append(sql)
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count_query):
+        func()
+    queries = len(executed)
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return queries, statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='10000,100000,1000000', help="Nombres de commandes, séparés par des virgules")
+    parser.add_argument('--repeat', type=int, default=5, help="Mesures par calcul (médiane)")
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--skip-legacy', action='store_true', help="Ne pas mesurer l'ancien calcul")
+    args = parser.parse_args()
+
+    call_command('migrate', verbosity=0)
+    users = CustomUser.objects.bulk_create([
+        CustomUser(username=f"bench{i}", email=f"bench{i}@example.com", role='USER')
+        for i in range(args.users)
+    ])
+    category = Category.objects.create(name="Bench")
+    product = Product.objects.create(
+        name="Bench", description="", category=category,
+        base_price=10, current_price=10, stock=10, base_stock=10, popularity_score=0
+    )
+
+    engines = {
+        'live': _order_totals_live,
+        'rollup': lambda: _order_totals_from_rollup(get_order_stats())
+    }
+    if not args.skip_legacy:
+        engines = {'legacy': legacy_totals, **engines}
+
+    print(f"{'commandes':>10} {'calcul':<8} {'requêtes':>9} {'latence (ms)':>13}")
+    seeded = 0
+    for size in sorted(int(s) for s in args.sizes.split(',')):
+        seed(users, product, seeded, size)
+        seeded = size
+        rebuild_order_stats()
+
+        for name, func in engines.items():
+            queries, latency = measure(func, args.repeat)
+            print(f"{size:>10} {name:<8} {queries:>9} {latency:>13.1f}")
+
+    os.remove(DB_PATH)
+
+
+if __name__ == '__main__':
+    main()
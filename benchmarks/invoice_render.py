@@ -0,0 +1,174 @@
+"""
+Benchmark du rendu des factures PDF (shared/pdf_generator.py)
+
+Met en page la même facture en boucle et mesure, par facture :
+- legacy   : l'ancien rendu (feuille de styles, ParagraphStyle et TableStyle recréés à chaque appel)
+- template : le rendu par InvoiceTemplate, construit une fois par processus
+
+Temps : médiane sur --repeat rendus, les deux méthodes alternées à chaque tour pour
+qu'une variation de charge de la machine les touche également. Allocations
+(tracemalloc, rendus séparés) :
+pic de mémoire allouée pendant le rendu d'une facture, et mémoire conservée après.
+Aucun accès à la base : les données de facture sont construites en mémoire.
+
+Usage :
+    python benchmarks/invoice_render.py
+    python benchmarks/invoice_render.py --items 50 --repeat 500
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+
+import core.settings
+
+core.settings.DATABASES = {'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}}
+
+import django
+django.setup()
+
+from reportlab import rl_config
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import cm
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from shared.pdf_generator import get_invoice_template, render_invoice_pdf
+
+
+def legacy_render(data: dict) -> bytes:
+    """Ancien rendu : tous les styles sont reconstruits à chaque facture"""
+    pdf_buffer = BytesIO()
+    doc = SimpleDocTemplate(pdf_buffer, pagesize=A4, topMargin=2*cm, bottomMargin=2*cm)
+    story = []
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'CustomTitle', parent=styles['Heading1'], fontSize=24,
+        textColor=colors.HexColor('#333333'), spaceAfter=30, alignment=1
+    )
+    story.append(Paragraph("FACTURE", title_style))
+    story.append(Spacer(1, 0.5*cm))
+    info_table = Table([
+        ["N° Facture:", f"CMD-{data['order_id']:05d}", "Date:", data['date']],
+        ["Client:", data['username'], "Email:", data['email']],
+        ["Statut:", data['status'], "", ""]
+    ], colWidths=[3*cm, 4*cm, 3*cm, 4*cm])
+    info_table.setStyle(TableStyle([
+        ('FONT', (0, 0), (-1, -1), 'Helvetica', 9),
+        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+        ('ROWBACKGROUND', (0, 0), (-1, -1), colors.white),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ]))
+    story.append(info_table)
+    story.append(Spacer(1, 1*cm))
+    items_data = [["Produit", "Quantité", "Prix Unitaire", "Montant"]]
+    for item in data['items']:
+        items_data.append([
+            item['name'], str(item['quantity']),
+            f"{item['unit_price']:.2f} €", f"{item['amount']:.2f} €"
+        ])
+    items_data.append(["", "", "TOTAL:", f"{data['total_amount']:.2f} €"])
+    items_table = Table(items_data, colWidths=[6*cm, 2*cm, 3*cm, 3*cm])
+    items_table.setStyle(TableStyle([
+        ('FONT', (0, 0), (-1, -1), 'Helvetica', 9),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#333333')),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('ROWBACKGROUND', (0, 1), (-1, -2), colors.white),
+        ('ROWBACKGROUND', (-1, -1), (-1, -1), colors.HexColor('#E8E8E8')),
+        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+        ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
+        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+    ]))
+    story.append(items_table)
+    story.append(Spacer(1, 1*cm))
+    footer_style = ParagraphStyle(
+        'Footer', parent=styles['Normal'], fontSize=8, textColor=colors.grey, alignment=1
+    )
+    story.append(Paragraph("Merci de votre confiance!", footer_style))
+    doc.build(story)
+    return pdf_buffer.getvalue()
+
+
+def invoice_data(items: int) -> dict:
+    return {
+        'order_id': 42,
+        'user_id': 7,
+        'username': "bench",
+        'email': "bench@example.com",
+        'status': 'PAID',
+        'total_amount': 12.5 * items,
+        'date': "01/01/2026",
+        'items': [
+            {'name': f"Pompe à vapeur {i}", 'quantity': 1, 'unit_price': 12.5, 'amount': 12.5}
+            for i in range(items)
+        ]
+    }
+
+
+def measure_times(renders: dict, data: dict, repeat: int) -> dict:
+    """Médiane du temps de rendu (ms) de chaque méthode, mesurées en alternance"""
+    timings = {name: [] for name in renders}
+    for _ in range(repeat):
+        for name, render in renders.items():
+            started = time.perf_counter()
+            render(data)
+            timings[name].append((time.perf_counter() - started) * 1000)
+    return {name: statistics.median(values) for name, values in timings.items()}
+
+
+def measure_allocations(render, data: dict, repeat: int) -> tuple:
+    """Mémoire allouée pendant un rendu (pic au-dessus de l'état initial) et conservée après, en Kio"""
+    tracemalloc.start()
+    peaks, retained = [], []
+    for _ in range(repeat):
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        render(data)
+        after, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - before)
+        retained.append(after - before)
+    tracemalloc.stop()
+    return statistics.median(peaks) / 1024, statistics.median(retained) / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--items', type=int, default=5, help="Articles par facture")
+    parser.add_argument('--repeat', type=int, default=200, help="Rendus mesurés par méthode (médiane)")
+    parser.add_argument('--alloc-repeat', type=int, default=20, help="Rendus pour la mesure des allocations")
+    args = parser.parse_args()
+
+    data = invoice_data(args.items)
+    renders = {'legacy': legacy_render, 'template': render_invoice_pdf}
+
+    # Les deux rendus doivent produire le même PDF (dates et identifiants figés)
+    rl_config.invariant = 1
+    if legacy_render(data) != render_invoice_pdf(data):
+        sys.exit("Les PDF legacy et template diffèrent")
+    rl_config.invariant = 0
+
+    # Modèle construit avant les mesures, comme dans un processus déjà chaud
+    get_invoice_template()
+    for render in renders.values():
+        render(data)
+
+    latencies = measure_times(renders, data, args.repeat)
+
+    print(f"{args.items} article(s) par facture")
+    print(f"{'rendu':<9} {'temps (ms)':>11} {'pic alloué (Kio)':>17} {'conservé (Kio)':>15}")
+    for name, render in renders.items():
+        peak, retained = measure_allocations(render, data, args.alloc_repeat)
+        print(f"{name:<9} {latencies[name]:>11.2f} {peak:>17.1f} {retained:>15.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+import asyncio
+import json
+import os
+import re
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Dict, List
+from shared.env import Env
+
+try:
+    import fcntl
+except ImportError:
+    # Windows : pas de verrou entre processus, seulement entre threads du worker
+    fcntl = None
+
+
+def _naive_local(moment: datetime) -> datetime:
+    """Les horodatages du chat sont en heure locale sans fuseau (datetime.now())"""
+    if moment.tzinfo is not None:
+        return moment.astimezone().replace(tzinfo=None)
+    return moment
+
+
+class ChatHistory:
+    """
+    Derniers messages de chaque salon, en mémoire (aucune requête SQL)
+
+    Un deque de `size` messages par salon : mémoire fixe, les plus anciens sortent.
+    Avec `directory`, chaque message est aussi ajouté à <directory>/<salon>.jsonl
+    (une ligne JSON par message) ; le fichier est relu au premier accès au salon
+    après un redémarrage, et réécrit avec ses `size` dernières lignes dès qu'il
+    dépasse le double.
+
+    Les accès disque se font hors de la boucle asyncio (load et persist, via
+    asyncio.to_thread). Ajouts et compaction prennent un verrou exclusif (flock sur
+    <salon>.jsonl.lock) : la réécriture d'un worker ne perd pas les lignes qu'un
+    autre ajoute au même moment.
+    """
+
+    def __init__(self, size: int = Env.CHAT_HISTORY_SIZE, directory: str = Env.CHAT_HISTORY_DIR):
+        self.size = size
+        self.directory = directory or None
+        self._rooms: Dict[str, deque] = {}
+        self._loading: Dict[str, list] = {}
+        self._file_lines: Dict[str, int] = {}
+        self._write_lock = threading.Lock()
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, room: str) -> str:
+        return os.path.join(self.directory, re.sub(r"[^a-z0-9_-]", "_", room) + ".jsonl")
+
+    def _read(self, room: str) -> tuple:
+        """Dernières lignes du fichier du salon : (deque de messages, nombre de lignes)"""
+        buffer = deque(maxlen=self.size)
+        lines = 0
+        if self.directory and os.path.exists(self._path(room)):
+            with open(self._path(room), encoding="utf-8") as f:
+                for line in f:
+                    lines += 1
+                    try:
+                        buffer.append(json.loads(line))
+                    except ValueError:
+                        continue
+        return buffer, lines
+
+    def _buffer(self, room: str) -> deque:
+        buffer = self._rooms.get(room)
+        if buffer is None:
+            buffer, self._file_lines[room] = self._read(room)
+            self._rooms[room] = buffer
+        return buffer
+
+    async def load(self, room: str):
+        """Charge le salon depuis son fichier, dans un thread, avant son premier accès"""
+        if room in self._rooms or not self.directory:
+            return
+        pending = self._loading.setdefault(room, [])
+        buffer, lines = await asyncio.to_thread(self._read, room)
+        if room in self._rooms:
+            return
+        # Messages reçus pendant la lecture : ceux déjà écrits dans le fichier sont ignorés
+        for message in self._loading.pop(room, pending):
+            if message not in buffer:
+                buffer.append(message)
+        self._rooms[room] = buffer
+        self._file_lines[room] = lines
+
+    def append(self, room: str, message: dict):
+        """Ajoute un message au tampon mémoire du salon, sans accès disque"""
+        pending = self._loading.get(room)
+        if pending is not None:
+            pending.append(message)
+        elif room in self._rooms or not self.directory:
+            self._buffer(room).append(message)
+        # Sinon le salon n'a pas encore été chargé par ce worker : le message est déjà
+        # dans son fichier (persist précède la diffusion) et sera lu par load()
+
+    async def persist(self, room: str, message: dict):
+        """Ajoute un message au fichier du salon (sans effet si la persistance est désactivée)"""
+        if not self.directory:
+            return
+        await asyncio.to_thread(self._persist, room, message)
+
+    def _persist(self, room: str, message: dict):
+        path = self._path(room)
+        with self._write_lock, open(path + ".lock", "a") as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(message, ensure_ascii=False) + "\n")
+            self._file_lines[room] = self._file_lines.get(room, 0) + 1
+            if self._file_lines[room] > 2 * self.size:
+                self._compact(room)
+
+    def _compact(self, room: str):
+        """Réécrit le fichier avec ses `size` dernières lignes (verrou pris par _persist)"""
+        path = self._path(room)
+        with open(path, encoding="utf-8") as f:
+            tail = deque(f, maxlen=self.size)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.writelines(tail)
+        os.replace(path + ".tmp", path)
+        self._file_lines[room] = len(tail)
+
+    def recent(self, room: str, limit: int = None, since: datetime = None) -> List[dict]:
+        """
+        Messages du salon, du plus ancien au plus récent
+        `since` : seulement ceux postérieurs à cet instant ; `limit` : les N derniers
+        """
+        messages = list(self._buffer(room))
+        if since is not None:
+            since = _naive_local(since)
+            messages = [m for m in messages if datetime.fromisoformat(m["timestamp"]) > since]
+        if limit is not None:
+            messages = messages[-limit:] if limit > 0 else []
+        return messages
+
+
+chat_history = ChatHistory()
@@ -8,4 +8,59 @@ class Env:
     SMTP_SERVER = os.getenv("SMTP_SERVER", "sandbox.smtp.mailtrap.io")
     SMTP_PORT = int(os.getenv("SMTP_PORT", 2525))
     SMTP_USER_ID = os.getenv("VOTRE_USER_ID")
-    SMTP_PASSWORD = os.getenv("VOTRE_PASSWORD")
\ No newline at end of file
+    SMTP_PASSWORD = os.getenv("VOTRE_PASSWORD")
+
+    # Intervalle (secondes) entre deux flush du compteur de consultations
+    VIEW_COUNTER_FLUSH_INTERVAL = float(os.getenv("VIEW_COUNTER_FLUSH_INTERVAL", 5))
+
+    # Intervalle (secondes) entre deux recalculs des prix
+    REPRICING_INTERVAL = float(os.getenv("REPRICING_INTERVAL", 10))
+
+    # Durée (secondes) avant reconstruction complète de l'index de recherche produits
+    SEARCH_INDEX_REFRESH = float(os.getenv("SEARCH_INDEX_REFRESH", 300))
+
+    # Produits retenus au plus par une recherche, les plus pertinents (borne la liste IN (...) SQL)
+    SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", 500))
+
+    # Diffusion WebSocket : 'local' (un seul worker) ou 'unix' (plusieurs workers, même machine)
+    CHAT_BROKER = os.getenv("CHAT_BROKER", "local")
+    CHAT_BROKER_SOCKET = os.getenv("CHAT_BROKER_SOCKET", "/tmp/cendres_vapeur_chat.sock")
+
+    # Messages en attente par client WebSocket avant éviction, et délai max d'un envoi (secondes)
+    WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", 256))
+    WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", 10))
+
+    # File d'un client WebSocket pleine : disconnect, drop_oldest ou drop_newest
+    WS_OVERFLOW_POLICY = os.getenv("WS_OVERFLOW_POLICY", "disconnect")
+
+    # Historique du chat : messages gardés par salon, rejoués à la connexion,
+    # et dossier de persistance (vide = mémoire seulement)
+    CHAT_HISTORY_SIZE = int(os.getenv("CHAT_HISTORY_SIZE", 200))
+    CHAT_HISTORY_REPLAY = int(os.getenv("CHAT_HISTORY_REPLAY", 50))
+    CHAT_HISTORY_DIR = os.getenv("CHAT_HISTORY_DIR", "")
+
+    # Processus dédiés au rendu des factures PDF
+    INVOICE_WORKERS = int(os.getenv("INVOICE_WORKERS", 2))
+    # Reprise des factures restées PENDING ou FAILED : délai avant reprise, essais max,
+    # intervalle du balayage (secondes)
+    INVOICE_RETRY_AFTER = float(os.getenv("INVOICE_RETRY_AFTER", 300))
+    INVOICE_MAX_ATTEMPTS = int(os.getenv("INVOICE_MAX_ATTEMPTS", 3))
+    INVOICE_SWEEP_INTERVAL = float(os.getenv("INVOICE_SWEEP_INTERVAL", 60))
+
+    # Stockage des factures : 'local' (disque), dans INVOICE_STORAGE_DIR (vide = <projet>/invoices)
+    INVOICE_STORAGE = os.getenv("INVOICE_STORAGE", "local")
+    INVOICE_STORAGE_DIR = os.getenv("INVOICE_STORAGE_DIR", "")
+
+    # Commandes max d'une archive de factures téléchargée (GET /orders/invoices/archive)
+    INVOICE_ARCHIVE_MAX_ORDERS = int(os.getenv("INVOICE_ARCHIVE_MAX_ORDERS", 500))
+
+    # Envoi des emails : connexions SMTP gardées ouvertes, emails en attente max,
+    # reprises (délai initial doublé à chaque essai), fermeture après inactivité (secondes)
+    MAIL_CONNECTIONS = int(os.getenv("MAIL_CONNECTIONS", 2))
+    MAIL_QUEUE_SIZE = int(os.getenv("MAIL_QUEUE_SIZE", 1000))
+    MAIL_MAX_RETRIES = int(os.getenv("MAIL_MAX_RETRIES", 3))
+    MAIL_RETRY_BACKOFF = float(os.getenv("MAIL_RETRY_BACKOFF", 1))
+    MAIL_IDLE_TIMEOUT = float(os.getenv("MAIL_IDLE_TIMEOUT", 60))
+    MAIL_TIMEOUT = float(os.getenv("MAIL_TIMEOUT", 10))
+    # STARTTLS obligatoire avant le login ; false uniquement pour un serveur local (shared/smtp_sink.py)
+    MAIL_STARTTLS = os.getenv("MAIL_STARTTLS", "true").lower() not in ("0", "false", "no")
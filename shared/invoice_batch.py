@@ -0,0 +1,313 @@
+import io
+import multiprocessing
+import sys
+import tarfile
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+from apps.classes.log import create_log
+from apps.models import Order, OrderItem
+from shared.env import Env
+from shared.invoice_queue import _init_worker
+from shared.invoice_storage import invoice_storage
+from shared.pdf_generator import (
+    FRESHNESS_FIELDS,
+    _invoice_data,
+    fresh_invoice_key,
+    release_invoice_files,
+    render_invoice_pdf,
+    save_invoice_to_file
+)
+
+# Commandes facturées par défaut : celles dont le paiement a été reçu
+INVOICED_STATUSES = ('PAID', 'SHIPPED', 'DELIVERED')
+
+ARCHIVE_FORMATS = ('zip', 'tar', 'tar.gz')
+
+# Rendus en cours par processus : assez pour ne jamais affamer le pool, sans charger tout le lot en mémoire
+IN_FLIGHT_PER_WORKER = 4
+
+BULK_UPDATE_SIZE = 500
+
+# Taille des blocs lus depuis invoice_storage et envoyés au client par iter_invoice_zip
+ZIP_CHUNK_SIZE = 64 * 1024
+
+# Commandes lues par requête par invoice_archive_entries
+ARCHIVE_ENTRIES_CHUNK = 500
+
+
+def _start_of(day: date) -> datetime:
+    """Minuit du jour donné dans le fuseau du projet (TIME_ZONE), en datetime aware"""
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+
+def invoice_orders(date_from: date = None, date_to: date = None, statuses=INVOICED_STATUSES, user_id: int = None):
+    """
+    Commandes créées entre date_from et date_to inclus, dans l'un des statuts donnés
+    Bornes facultatives ; `user_id` limite aux commandes d'un client
+    Filtre sur des bornes datetime (et non created_at__date) : pas de CONVERT_TZ côté
+    MySQL, l'index sur created_at reste utilisable
+    """
+    orders = Order.objects.filter(status__in=statuses)
+    if date_from is not None:
+        orders = orders.filter(created_at__gte=_start_of(date_from))
+    if date_to is not None:
+        orders = orders.filter(created_at__lt=_start_of(date_to + timedelta(days=1)))
+    if user_id is not None:
+        orders = orders.filter(user_id=user_id)
+    return orders.order_by('id')
+
+
+def iter_invoice_data(orders, chunk_size: int = 500):
+    """
+    Dicts de facture des commandes, par paquets de `chunk_size`
+    Deux requêtes par paquet (commandes + clients, articles + produits) au lieu de
+    deux par commande
+    """
+    orders = orders.select_related('user').prefetch_related(
+        Prefetch('orderitem_set', queryset=OrderItem.objects.select_related('product').order_by('id'))
+    )
+    for order in orders.iterator(chunk_size=chunk_size):
+        yield _invoice_data(order, order.orderitem_set.all())
+
+
+def _collect(data: dict, future) -> tuple:
+    try:
+        return data, future.result(), None
+    except Exception as e:
+        return data, None, e
+
+
+def render_invoices(datas, workers: int = Env.INVOICE_WORKERS):
+    """
+    Rend les factures sur un pool de `workers` processus, dans l'ordre d'entrée
+    Génère des triplets (data, pdf_bytes, None) ou (data, None, exception)
+    Au plus workers × IN_FLIGHT_PER_WORKER factures sont en mémoire à la fois.
+    Avec workers=0, le rendu se fait dans le processus courant.
+    """
+    if workers < 1:
+        for data in datas:
+            try:
+                yield data, render_invoice_pdf(data), None
+            except Exception as e:
+                yield data, None, e
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker
+    ) as executor:
+        pending = deque()
+        for data in datas:
+            pending.append((data, executor.submit(render_invoice_pdf, data)))
+            if len(pending) >= workers * IN_FLIGHT_PER_WORKER:
+                yield _collect(*pending.popleft())
+        while pending:
+            yield _collect(*pending.popleft())
+
+
+def _run(orders, handle, workers: int, progress, on_error=None) -> dict:
+    """
+    Rend les factures de `orders` et passe chaque PDF à handle(data, pdf_bytes)
+    on_error(data, exception) est appelé pour chaque rendu en échec
+    """
+    total = orders.count()
+    done = failed = 0
+    start = time.perf_counter()
+
+    for data, pdf_bytes, error in render_invoices(iter_invoice_data(orders), workers):
+        if error is None:
+            handle(data, pdf_bytes)
+        else:
+            failed += 1
+            # Sortie d'erreur : la sortie standard peut porter l'archive (export_invoices --archive -)
+            print(f"⚠️ Erreur génération facture #{data['order_id']}: {str(error)}", file=sys.stderr)
+            if on_error:
+                on_error(data, error)
+        done += 1
+        if progress:
+            progress(done, total, failed)
+
+    return {
+        'total': total,
+        'rendered': done - failed,
+        'failed': failed,
+        'elapsed': time.perf_counter() - start
+    }
+
+
+def regenerate_invoices(orders, workers: int = Env.INVOICE_WORKERS, progress=None) -> dict:
+    """
+    Régénère les factures de `orders` dans invoice_storage (statut READY)
+    Les commandes sont mises à jour par bulk_update de BULK_UPDATE_SIZE lignes,
+    les PDF qu'elles ne référencent plus sont supprimés
+    progress(done, total, failed) est appelé après chaque facture
+    """
+    batch = []
+
+    def flush():
+        # Lignes verrouillées entre la lecture des anciennes clés et leur remplacement :
+        # un store_invoice concurrent attend, puis voit la nouvelle clé
+        with transaction.atomic():
+            previous = dict(
+                Order.objects.select_for_update()
+                .filter(id__in=[order.id for order in batch])
+                .values_list('id', 'invoice_file')
+            )
+            Order.objects.bulk_update(
+                batch, ['invoice_file', 'invoice_status', 'invoice_error', 'invoice_generated_at']
+            )
+        release_invoice_files(
+            previous[order.id] for order in batch
+            if previous.get(order.id) and previous[order.id] != order.invoice_file.name
+        )
+        batch.clear()
+
+    def store(data: dict, pdf_bytes: bytes):
+        batch.append(Order(
+            id=data['order_id'],
+            invoice_file=invoice_storage.save(pdf_bytes),
+            invoice_status='READY',
+            invoice_error=None,
+            invoice_generated_at=timezone.now()
+        ))
+        if len(batch) >= BULK_UPDATE_SIZE:
+            flush()
+
+    def fail(data: dict, error: Exception):
+        Order.objects.filter(id=data['order_id']).update(invoice_status='FAILED', invoice_error=str(error))
+
+    result = _run(orders, store, workers, progress, fail)
+    if batch:
+        flush()
+    return result
+
+
+def archive_format(path: str) -> str:
+    """Format d'archive déduit de l'extension du fichier (zip par défaut)"""
+    if path.endswith(('.tar.gz', '.tgz')):
+        return 'tar.gz'
+    if path.endswith('.tar'):
+        return 'tar'
+    return 'zip'
+
+
+def export_invoices(orders, fileobj, fmt: str = 'zip', workers: int = Env.INVOICE_WORKERS, progress=None) -> dict:
+    """
+    Écrit les factures de `orders` dans une archive ZIP ou TAR, au fil du rendu
+    `fileobj` peut être un flux non positionnable (sortie standard) ; ni les commandes
+    ni invoice_storage ne sont modifiés
+    """
+    if fmt not in ARCHIVE_FORMATS:
+        raise ValueError(f"Format d'archive inconnu : {fmt} ({', '.join(ARCHIVE_FORMATS)})")
+
+    if fmt == 'zip':
+        with zipfile.ZipFile(fileobj, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            def add(data: dict, pdf_bytes: bytes):
+                archive.writestr(f"facture-{data['order_id']:05d}.pdf", pdf_bytes)
+
+            return _run(orders, add, workers, progress)
+
+    with tarfile.open(fileobj=fileobj, mode='w|gz' if fmt == 'tar.gz' else 'w|') as archive:
+        def add(data: dict, pdf_bytes: bytes):
+            info = tarfile.TarInfo(f"facture-{data['order_id']:05d}.pdf")
+            info.size = len(pdf_bytes)
+            info.mtime = int(time.time())
+            archive.addfile(info, io.BytesIO(pdf_bytes))
+
+        return _run(orders, add, workers, progress)
+
+
+class _ZipSink:
+    """
+    Flux non positionnable dans lequel écrit zipfile (sans seek(), ZipFile passe
+    en mode descripteur de données) ; pop() rend et vide ce qui a été écrit
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def pop(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def invoice_archive_entries(orders, chunk_size: int = ARCHIVE_ENTRIES_CHUNK):
+    """
+    Champs de fraîcheur (FRESHNESS_FIELDS) des commandes, par paquets de `chunk_size`
+    Pagination par id plutôt que .iterator() : le pilote MySQL charge sinon tout le
+    résultat en mémoire
+    """
+    last_id = 0
+    while True:
+        chunk = list(orders.filter(id__gt=last_id).order_by('id').values(*FRESHNESS_FIELDS)[:chunk_size])
+        yield from chunk
+        if len(chunk) < chunk_size:
+            return
+        last_id = chunk[-1]['id']
+
+
+def _open_invoice(order: dict):
+    """PDF à jour d'une commande, ouvert en lecture ; rendu et stocké s'il manque"""
+    key = fresh_invoice_key(order) or save_invoice_to_file(order['id'])
+    try:
+        return invoice_storage.open(key)
+    except FileNotFoundError:
+        # Clé libérée par une régénération concurrente depuis la lecture de la commande
+        return invoice_storage.open(save_invoice_to_file(order['id']))
+
+
+def iter_invoice_zip(entries, chunk_size: int = ZIP_CHUNK_SIZE):
+    """
+    Archive ZIP des factures, produite au fil de l'eau (pour un StreamingResponse)
+
+    Les PDF à jour sont relus depuis invoice_storage par blocs de `chunk_size`,
+    seuls les manquants ou périmés sont rendus puis stockés. La mémoire ne dépend
+    pas de la taille des PDF : un bloc en cours, plus environ 0,5 Kio par facture
+    pour le répertoire central que le format ZIP écrit en fin d'archive. Une facture
+    impossible à générer est sautée et listée dans erreurs.txt en fin d'archive.
+    """
+    sink = _ZipSink()
+    failed = []
+
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for order in entries:
+            try:
+                source = _open_invoice(order)
+            except Exception as e:
+                create_log(f"Invoice archive: invoice #{order['id']} skipped ({str(e)})")
+                failed.append(f"CMD-{order['id']:05d} : {str(e)}")
+                continue
+
+            with source, archive.open(f"facture-{order['id']:05d}.pdf", 'w') as target:
+                while block := source.read(chunk_size):
+                    target.write(block)
+                    if data := sink.pop():
+                        yield data
+            if data := sink.pop():
+                yield data
+
+        if failed:
+            archive.writestr("erreurs.txt", "\n".join(failed) + "\n")
+
+    if data := sink.pop():
+        yield data
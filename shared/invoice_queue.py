@@ -0,0 +1,201 @@
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from shared.env import Env
+
+_STOP = object()
+
+
+def _init_worker():
+    """Initialisation d'un processus de rendu : Django est chargé, aucune connexion SQL n'est ouverte"""
+    import django
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+    django.setup()
+
+
+class InvoiceQueue:
+    """
+    Génération des factures PDF hors du chemin des requêtes
+
+    submit() ne fait que déposer l'id de la commande dans une file et rend la main :
+    aucune requête SQL, aucun démarrage de processus, aucune exception. Un thread
+    répartiteur lit les données de la facture (deux requêtes), passe la commande en
+    invoice_status=PENDING et confie la mise en page ReportLab, coûteuse en CPU, à un
+    pool de `workers` processus. À la fin du rendu, le même thread écrit le fichier et
+    passe la commande en READY (ou FAILED avec invoice_error).
+
+    Les processus ne font aucune requête SQL : ils reçoivent un dict et renvoient
+    des octets (shared.pdf_generator.render_invoice_pdf).
+
+    Une facture perdue (processus arrêté, échec) n'est pas oubliée : toutes les
+    `sweep_interval` secondes, les commandes restées PENDING ou FAILED depuis plus de
+    `retry_after` secondes sont remises en file, au plus `max_attempts` fois.
+    """
+
+    def __init__(
+        self,
+        workers: int = Env.INVOICE_WORKERS,
+        retry_after: float = Env.INVOICE_RETRY_AFTER,
+        max_attempts: int = Env.INVOICE_MAX_ATTEMPTS,
+        sweep_interval: float = Env.INVOICE_SWEEP_INTERVAL
+    ):
+        self.workers = workers
+        self.retry_after = retry_after
+        self.max_attempts = max_attempts
+        self.sweep_interval = sweep_interval
+        self._executor = None
+        self._jobs = queue.Queue()
+        self._thread = None
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn : pas de connexion SQL ni de thread hérités du processus parent
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker
+            )
+        return self._executor
+
+    def start(self):
+        """Démarre le thread répartiteur (et le balayage périodique des factures en retard)"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="invoice-queue", daemon=True)
+            self._thread.start()
+
+    def submit(self, order_id: int):
+        """Met en file la (re)génération de la facture d'une commande ; ne lève jamais"""
+        try:
+            self.start()
+            self._jobs.put_nowait(('render', order_id))
+        except Exception as e:
+            # La commande reste PENDING : le balayage la remettra en file
+            print(f"⚠️ Facture #{order_id} non mise en file: {str(e)}")
+
+    def _run(self):
+        from django.db import close_old_connections
+
+        stopping = False
+        next_sweep = time.monotonic()
+        while not stopping or self._in_flight:
+            if not stopping and time.monotonic() >= next_sweep:
+                next_sweep = time.monotonic() + self.sweep_interval
+                job = ('sweep', None)
+            else:
+                try:
+                    job = self._jobs.get(timeout=None if stopping else max(next_sweep - time.monotonic(), 0))
+                except queue.Empty:
+                    continue
+            try:
+                if job is _STOP:
+                    stopping = True
+                elif job[0] == 'render' and not stopping:
+                    self._dispatch(job[1])
+                elif job[0] == 'done':
+                    self._in_flight -= 1
+                    self._finish(*job[1])
+                elif job[0] == 'sweep' and not stopping:
+                    self.requeue_stale()
+            except Exception as e:
+                print(f"⚠️ Erreur file des factures: {str(e)}")
+            finally:
+                close_old_connections()
+
+        executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=True)
+
+    def _dispatch(self, order_id: int):
+        """Thread répartiteur : lecture des données et envoi au pool de rendu"""
+        from django.db.models import F
+        from django.utils import timezone
+        from apps.models import Order
+        from shared.pdf_generator import get_invoice_data, render_invoice_pdf
+
+        Order.objects.filter(id=order_id).update(
+            invoice_status='PENDING',
+            invoice_error=None,
+            invoice_requested_at=timezone.now(),
+            invoice_attempts=F('invoice_attempts') + 1
+        )
+        try:
+            data = get_invoice_data(order_id)
+        except Exception as e:
+            self._fail(order_id, e)
+            return
+
+        try:
+            future = self._get_executor().submit(render_invoice_pdf, data)
+        except BrokenProcessPool:
+            # Un processus du pool est mort : on repart d'un pool neuf
+            self._executor = None
+            future = self._get_executor().submit(render_invoice_pdf, data)
+
+        self._in_flight += 1
+        # Le callback tourne dans le thread de gestion du pool : il ne fait que remettre
+        # le résultat au répartiteur, qui fait les écritures
+        future.add_done_callback(lambda f: self._jobs.put(('done', (data, f))))
+
+    def _finish(self, data: dict, future):
+        """Thread répartiteur : stockage du PDF rendu"""
+        from shared.pdf_generator import store_invoice
+
+        try:
+            store_invoice(data['order_id'], future.result())
+        except Exception as e:
+            self._fail(data['order_id'], e)
+
+    @staticmethod
+    def _fail(order_id: int, error: Exception):
+        from apps.models import Order
+
+        print(f"⚠️ Erreur génération facture #{order_id}: {str(error)}")
+        Order.objects.filter(id=order_id).update(invoice_status='FAILED', invoice_error=str(error))
+
+    def requeue_stale(self) -> int:
+        """
+        Remet en file les factures PENDING ou FAILED depuis plus de `retry_after` secondes
+        (moins de `max_attempts` essais) ; retourne le nombre de commandes remises en file
+        Chaque commande est réservée par un UPDATE conditionnel sur invoice_requested_at :
+        avec plusieurs processus API, une seule la remet en file.
+        """
+        from django.db.models import Q
+        from django.utils import timezone
+        from apps.models import Order
+
+        now = timezone.now()
+        stale = Order.objects.filter(
+            invoice_status__in=('PENDING', 'FAILED'),
+            invoice_attempts__lt=self.max_attempts
+        ).filter(
+            Q(invoice_requested_at__lt=now - timedelta(seconds=self.retry_after)) | Q(invoice_requested_at__isnull=True)
+        )
+
+        requeued = 0
+        for order_id, requested_at in stale.values_list('id', 'invoice_requested_at')[:500]:
+            claimed = Order.objects.filter(id=order_id, invoice_requested_at=requested_at).update(invoice_requested_at=now)
+            if claimed:
+                self._jobs.put(('render', order_id))
+                requeued += 1
+        return requeued
+
+    def shutdown(self, wait: bool = True):
+        """Arrêt du répartiteur ; avec wait=True, les factures en cours sont terminées"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread:
+            self._jobs.put(_STOP)
+            if wait:
+                thread.join()
+
+
+invoice_queue = InvoiceQueue()
@@ -0,0 +1,126 @@
+import hashlib
+import os
+import re
+import tempfile
+from django.conf import settings
+from shared.env import Env
+
+INVOICES_DIR = Env.INVOICE_STORAGE_DIR or os.path.join(settings.BASE_DIR, 'invoices')
+
+# Clé d'un fichier adressé par son contenu : <aa>/<bb>/<sha256>.pdf
+CONTENT_KEY_RE = re.compile(r"^[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})\.pdf$")
+
+# Droits d'un PDF stocké : ceux d'un open() classique selon l'umask du processus
+# (mkstemp crée en 0600). Lu une fois à l'import, os.umask() n'étant pas sûr entre threads.
+_umask = os.umask(0)
+os.umask(_umask)
+FILE_MODE = 0o666 & ~_umask
+
+
+def content_key(content: bytes) -> str:
+    """Clé d'un PDF : son SHA-256, réparti sur deux niveaux de sous-dossiers"""
+    digest = hashlib.sha256(content).hexdigest()
+    return f"{digest[:2]}/{digest[2:4]}/{digest}.pdf"
+
+
+def content_hash(key: str):
+    """SHA-256 d'une clé adressée par contenu, None pour un ancien nom de fichier"""
+    match = CONTENT_KEY_RE.match(key or "")
+    return match.group(1) if match else None
+
+
+class InvoiceStorage:
+    """
+    Interface de stockage des factures PDF
+
+    Les fichiers sont adressés par leur contenu (content_key) : la clé, stockée dans
+    Order.invoice_file, change dès que le PDF change, et deux PDF identiques ne sont
+    stockés qu'une fois. Un backend implémente save, exists, open, delete et, s'il
+    écrit sur le disque local, local_path (sinon la facture est relue par open()).
+    """
+
+    def save(self, content: bytes) -> str:
+        """Stocke le PDF s'il n'existe pas déjà et retourne sa clé"""
+        raise NotImplementedError
+
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def open(self, key: str):
+        """Fichier binaire en lecture"""
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def local_path(self, key: str):
+        """Chemin sur le disque local, ou None si le backend n'en a pas"""
+        return None
+
+
+class LocalInvoiceStorage(InvoiceStorage):
+    """
+    Factures sur le disque local, dans <root>/<aa>/<bb>/<sha256>.pdf
+
+    256 × 256 sous-dossiers : aucun dossier ne grossit au point d'être lent à
+    lister ou à sauvegarder. Écriture dans un fichier temporaire du même dossier
+    puis os.replace : un lecteur ne voit jamais de PDF à moitié écrit.
+    Les anciens fichiers à plat (invoice_user{u}_order{o}.pdf) restent lisibles.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        path = os.path.normpath(os.path.join(self.root, key))
+        if not path.startswith(os.path.normpath(self.root) + os.sep):
+            raise ValueError(f"Clé de facture invalide : {key}")
+        return path
+
+    def save(self, content: bytes) -> str:
+        key = content_key(content)
+        path = self._path(key)
+        if os.path.exists(path):
+            return key
+
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".pdf")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(tmp_path, FILE_MODE)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return key
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def open(self, key: str):
+        return open(self._path(key), 'rb')
+
+    def delete(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def local_path(self, key: str) -> str:
+        return self._path(key)
+
+
+def create_invoice_storage(kind: str, root: str = INVOICES_DIR) -> InvoiceStorage:
+    """Stockage selon Env.INVOICE_STORAGE : 'local' (disque, dans `root`)"""
+    if kind == 'local':
+        return LocalInvoiceStorage(root)
+    raise ValueError(f"Stockage de factures inconnu : {kind} (local)")
+
+
+invoice_storage = create_invoice_storage(Env.INVOICE_STORAGE)
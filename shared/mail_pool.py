@@ -0,0 +1,202 @@
+import queue
+import smtplib
+import ssl
+import threading
+import time
+from shared.env import Env
+
+_STOP = object()
+
+
+def _recipient(message) -> str:
+    """Destinataire pour les logs, sans lever d'exception sur un message invalide"""
+    try:
+        return message['To']
+    except Exception:
+        return "?"
+
+
+class MailPool:
+    """
+    Envoi des emails hors du chemin des requêtes, sur des connexions SMTP réutilisées
+
+    submit() dépose le message dans une file bornée et rend la main aussitôt ; si la
+    file est pleine, le message est refusé (False) plutôt que de bloquer l'appelant.
+    `connections` threads d'envoi vident la file, chacun avec sa propre connexion
+    SMTP ouverte au premier message (EHLO, STARTTLS, login) puis gardée
+    ouverte : les messages suivants ne paient plus que l'envoi. Une connexion inutilisée
+    pendant `idle_timeout` secondes est fermée.
+
+    Erreur temporaire (connexion perdue, code 4xx) : la connexion est rouverte et
+    l'envoi retenté jusqu'à `max_retries` fois, après `retry_backoff` secondes puis
+    le double à chaque essai. Refus définitif (code 5xx, destinataire refusé) : le
+    message est abandonné sans nouvel essai.
+
+    STARTTLS est exigé : un serveur qui ne le propose pas est refusé, jamais de login
+    en clair. `starttls=False` (MAIL_STARTTLS=false) est réservé à un serveur local.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        user: str = None,
+        password: str = None,
+        connections: int = Env.MAIL_CONNECTIONS,
+        queue_size: int = Env.MAIL_QUEUE_SIZE,
+        max_retries: int = Env.MAIL_MAX_RETRIES,
+        retry_backoff: float = Env.MAIL_RETRY_BACKOFF,
+        idle_timeout: float = Env.MAIL_IDLE_TIMEOUT,
+        timeout: float = Env.MAIL_TIMEOUT,
+        starttls: bool = Env.MAIL_STARTTLS
+    ):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.connections = connections
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.starttls = starttls
+        self._queue = queue.Queue(queue_size)
+        self._threads = []
+        self._lock = threading.Lock()
+        self.counters = {'sent': 0, 'retried': 0, 'failed': 0, 'rejected': 0}
+
+    def submit(self, message) -> bool:
+        """Met un email (email.message.Message) en file d'envoi ; False si la file est pleine"""
+        self._start()
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            self._count('rejected')
+            print(f"⚠️ File d'envoi des emails pleine, message pour {_recipient(message)} abandonné")
+            return False
+        return True
+
+    def _start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.connections):
+                thread = threading.Thread(target=self._run, name=f"mail-pool-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            server.ehlo()
+            if self.starttls:
+                # SMTPNotSupportedError si STARTTLS n'est pas proposé (ou retiré en route)
+                server.starttls(context=ssl.create_default_context())
+                server.ehlo()
+            if self.user:
+                server.login(self.user, self.password)
+        except BaseException:
+            server.close()
+            raise
+        return server
+
+    @staticmethod
+    def _close(server):
+        if server is not None:
+            try:
+                server.quit()
+            except (smtplib.SMTPException, OSError):
+                server.close()
+        return None
+
+    def _deliver(self, server, message):
+        """Envoie un message avec reprises ; retourne la connexion à réutiliser (ou None)"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                if server is None:
+                    server = self._connect()
+                server.send_message(message)
+                self._count('sent')
+                return server
+            except (smtplib.SMTPRecipientsRefused, smtplib.SMTPNotSupportedError) as e:
+                error, permanent = e, True
+                if isinstance(e, smtplib.SMTPNotSupportedError):
+                    server = self._close(server)
+            except smtplib.SMTPResponseException as e:
+                error, permanent = e, e.smtp_code >= 500
+                if not permanent:
+                    server = self._close(server)
+            except (smtplib.SMTPException, OSError) as e:
+                error, permanent = e, False
+                server = self._close(server)
+
+            if permanent or attempt == self.max_retries:
+                break
+            self._count('retried')
+            time.sleep(self.retry_backoff * 2 ** attempt)
+
+        self._count('failed')
+        print(f"⚠️ Email pour {_recipient(message)} non envoyé: {str(error)}")
+        return server
+
+    def _run(self):
+        server = None
+        while True:
+            try:
+                message = self._queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                server = self._close(server)
+                continue
+            try:
+                if message is _STOP:
+                    self._close(server)
+                    return
+                server = self._deliver(server, message)
+            except Exception as e:
+                # Message invalide, identifiants non encodables... : le thread ne doit pas mourir
+                self._count('failed')
+                print(f"⚠️ Email pour {_recipient(message)} non envoyé: {type(e).__name__}: {str(e)}")
+                if server is not None:
+                    server.close()
+                    server = None
+            finally:
+                self._queue.task_done()
+
+    def join(self):
+        """Attend que tous les messages en file aient été traités"""
+        self._queue.join()
+
+    def shutdown(self, wait: bool = True):
+        """Arrêt des threads ; les messages déjà en file sont envoyés avant"""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(_STOP)
+        if wait:
+            for thread in threads:
+                thread.join()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_mail_pool(host: str, port: int, user: str = None, password: str = None) -> MailPool:
+    """Pool d'envoi d'un compte SMTP, partagé par tout le processus"""
+    with _pools_lock:
+        pool = _pools.get((host, port, user))
+        if pool is None:
+            pool = _pools[(host, port, user)] = MailPool(host, port, user, password)
+        return pool
+
+
+def shutdown_mail_pools(wait: bool = True):
+    """Arrêt de tous les pools créés par get_mail_pool"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.shutdown(wait)
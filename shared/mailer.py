@@ -1,4 +1,3 @@
-import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from django.conf import settings
@@ -6,6 +5,16 @@ from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel, EmailStr
 from email.mime.text import MIMEText
 from shared.env import Env
+from shared.mail_pool import get_mail_pool
+
+def _settings_mail_pool():
+    """Pool d'envoi du compte SMTP de settings (EMAIL_HOST, EMAIL_PORT, EMAIL_HOST_USER, EMAIL_HOST_PASSWORD)"""
+    return get_mail_pool(
+        getattr(settings, 'EMAIL_HOST', None),
+        getattr(settings, 'EMAIL_PORT', 587),
+        getattr(settings, 'EMAIL_HOST_USER', None),
+        getattr(settings, 'EMAIL_HOST_PASSWORD', None)
+    )
 
 def send_2fa_code_email(email, code, username):
     """
@@ -13,12 +22,11 @@ def send_2fa_code_email(email, code, username):
     
     Pour développement: Affiche le code en console
     Pour production: Configurer EMAIL_HOST, EMAIL_PORT dans settings.py
+    L'email est mis en file (shared/mail_pool.py) : la requête n'attend pas le serveur SMTP
     """
     
     sender_email = getattr(settings, 'EMAIL_HOST_USER', None)
-    sender_password = getattr(settings, 'EMAIL_HOST_PASSWORD', None)
     smtp_server = getattr(settings, 'EMAIL_HOST', None)
-    smtp_port = getattr(settings, 'EMAIL_PORT', 587)
     
     if not sender_email or not smtp_server:
         print(f"\n{'='*60}")
@@ -56,12 +64,11 @@ def send_2fa_code_email(email, code, username):
         part = MIMEText(html_content, "html")
         message.attach(part)
         
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.starttls()
-            server.login(sender_email, sender_password)
-            server.sendmail(sender_email, email, message.as_string())
+        if not _settings_mail_pool().submit(message):
+            print(f"Code de secours: {code}")
+            return False
         
-        print(f"✅ Email 2FA envoyé à {email}")
+        print(f"✅ Email 2FA mis en file pour {email}")
         return True
     
     except Exception as e:
@@ -103,7 +110,7 @@ def send_welcome_email(email, username):
         return False
 
 def send_payment_confirmation_email(email, username, order_id, total_amount, transaction_id):
-    """Envoie un simple email de confirmation de paiement"""
+    """Envoie un simple email de confirmation de paiement (mis en file, voir shared/mail_pool.py)"""
     sender_email = getattr(settings, 'EMAIL_HOST_USER', None)
     
     if not sender_email:
@@ -141,16 +148,10 @@ def send_payment_confirmation_email(email, username, order_id, total_amount, tra
         message["To"] = email
         message.attach(MIMEText(html_content, "html"))
         
-        sender_password = getattr(settings, 'EMAIL_HOST_PASSWORD', None)
-        smtp_server = getattr(settings, 'EMAIL_HOST', None)
-        smtp_port = getattr(settings, 'EMAIL_PORT', 587)
-        
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.starttls()
-            server.login(sender_email, sender_password)
-            server.sendmail(sender_email, email, message.as_string())
+        if not _settings_mail_pool().submit(message):
+            return False
         
-        print(f"✅ Email de paiement envoyé à {email}")
+        print(f"✅ Email de paiement mis en file pour {email}")
         return True
     except Exception as e:
         print(f"⚠️ Erreur email: {str(e)}")
@@ -167,6 +168,10 @@ SMTP_USER = Env.SMTP_USER_ID
 SMTP_PASSWORD = Env.SMTP_PASSWORD
 
 async def envoyer_missive(missive: Missive):
+    """
+    Met la missive en file d'envoi (shared/mail_pool.py) sans bloquer la boucle asyncio
+    503 si la file d'envoi est pleine
+    """
     try:
         corps_mail = f"""
         --- MESSAGE REÇU DU SECTEUR EXTERNE ---
@@ -184,12 +189,12 @@ async def envoyer_missive(missive: Missive):
         msg['Subject'] = f"[URGENT] {missive.sujet}"
         msg.attach(MIMEText(corps_mail, 'plain'))
 
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-            server.starttls()
-            server.login(SMTP_USER, SMTP_PASSWORD)
-            server.send_message(msg)
+        if not get_mail_pool(SMTP_SERVER, SMTP_PORT, SMTP_USER, SMTP_PASSWORD).submit(msg):
+            raise HTTPException(status_code=503, detail="File d'envoi saturée, réessayez plus tard")
 
         return {"status": "success", "message": "La missive a été transmise au Grand Conseil."}
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Échec de la transmission : {str(e)}")
\ No newline at end of file
@@ -0,0 +1,65 @@
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from django.db.models import Q
+
+
+def _json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def encode_cursor(sort_field: str, value, row_id: int, descending: bool = False) -> str:
+    """
+    Encode la position d'une ligne (valeur du tri + id) en curseur opaque
+    Le champ et le sens du tri sont inclus pour refuser un curseur utilisé avec un autre tri
+    """
+    payload = json.dumps(
+        {'s': sort_field, 'd': int(descending), 'v': _json_value(value), 'id': row_id},
+        separators=(',', ':')
+    )
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, sort_field: str, descending: bool = False):
+    """Retourne (valeur, id) ou lève ValueError si le curseur est invalide"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        value, row_id = payload['v'], int(payload['id'])
+        field, direction = payload['s'], bool(payload['d'])
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Curseur de pagination invalide")
+
+    if field != sort_field or direction != descending:
+        raise ValueError("Curseur de pagination invalide pour ce tri")
+    return value, row_id
+
+
+def keyset_paginate(query, sort_field: str, descending: bool = False, after: str = None):
+    """
+    Trie `query` sur (sort_field, id) et, si `after` est fourni, ne garde que les lignes
+    situées après le curseur : WHERE (tri, id) > (v, id) — le coût d'une page ne dépend
+    pas de sa profondeur, à condition d'un index composite (tri, id) sur la table
+    (Meta.indexes de Product, Log et Vote)
+    """
+    if descending:
+        query = query.order_by(f'-{sort_field}', '-id')
+    else:
+        query = query.order_by(sort_field, 'id')
+
+    if after:
+        value, row_id = decode_cursor(after, sort_field, descending)
+        op = 'lt' if descending else 'gt'
+        if sort_field == 'id':
+            query = query.filter(**{f'id__{op}': row_id})
+        else:
+            query = query.filter(
+                Q(**{f'{sort_field}__{op}': value}) | Q(**{sort_field: value, f'id__{op}': row_id})
+            )
+
+    return query
@@ -1,4 +1,5 @@
 from apps.models import Order, OrderItem, Product
+from shared.stock import decrement_stocks
 from django.utils import timezone
 import uuid
 
@@ -9,7 +10,7 @@ def verify_stock_availability(order_id: int):
     Retourne True si tout est OK, sinon lève une exception
     """
     order = Order.objects.get(id=order_id)
-    order_items = OrderItem.objects.filter(order=order)
+    order_items = OrderItem.objects.filter(order=order).select_related('product')
     
     for item in order_items:
         if item.product.stock < item.quantity:
@@ -23,15 +24,15 @@ def verify_stock_availability(order_id: int):
 def update_product_stocks(order_id: int):
     """
     Met à jour les stocks des produits après un paiement approuvé
-    Décrémente le stock de chaque produit selon la quantité commandée
+    Décrémente le stock de chaque produit selon la quantité commandée,
+    en un seul UPDATE conditionnel pour tous les articles de la commande
+    Lève InsufficientStockError si un produit n'a plus assez de stock
     """
-    order = Order.objects.get(id=order_id)
-    order_items = OrderItem.objects.filter(order=order)
+    quantities = {}
+    for product_id, quantity in OrderItem.objects.filter(order_id=order_id).values_list('product_id', 'quantity'):
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
     
-    for item in order_items:
-        product = item.product
-        product.stock -= item.quantity
-        product.save()
+    decrement_stocks(quantities, count_purchase=False)
 
 def simulate_paypal_payment(order_id: int, paypal_email: str, approve: bool = True):
     """
@@ -39,13 +40,15 @@ def simulate_paypal_payment(order_id: int, paypal_email: str, approve: bool = Tr
     Si approve=True : 
       - Approuve le paiement
       - Change le statut en PAID
-      - Génère la facture
+      - Met la facture en file de génération
       - Envoie un email de confirmation
       - Crée un nouveau panier PENDING
     Si approve=False : refuse le paiement (statut reste PENDING)
     """
-    from shared.pdf_generator import save_invoice_to_file
+    from django.db import transaction
+    from shared.invoice_queue import invoice_queue
     from shared.mailer import send_payment_confirmation_email
+    from apps.classes.orderStats import order_snapshot, record_order_change
     
     order = Order.objects.get(id=order_id)
     
@@ -56,17 +59,26 @@ def simulate_paypal_payment(order_id: int, paypal_email: str, approve: bool = Tr
         raise ValueError("Le panier est vide")
     
     if approve:
-        verify_stock_availability(order_id)
-        update_product_stocks(order_id)
-        save_invoice_to_file(order_id)
-        order.status = 'PAID'
-        order.save()
-        
-        new_cart = Order.objects.create(
-            user=order.user,
-            status='PENDING',
-            total_amount=0
-        )
+        # Stocks, passage en PAID et nouveau panier validés ensemble ; la facture n'est
+        # mise en file qu'après le commit
+        with transaction.atomic():
+            verify_stock_availability(order_id)
+            update_product_stocks(order_id)
+            before = order_snapshot(order)
+            order.status = 'PAID'
+            order.invoice_status = 'PENDING'
+            order.invoice_requested_at = timezone.now()
+            order.invoice_attempts = 0
+            order.save()
+            record_order_change(order.id, before, order_snapshot(order))
+            transaction.on_commit(lambda: invoice_queue.submit(order_id))
+            
+            new_cart = Order.objects.create(
+                user=order.user,
+                status='PENDING',
+                total_amount=0
+            )
+            record_order_change(new_cart.id, None, order_snapshot(new_cart))
         
         transaction_id = f"PAYPAL-{uuid.uuid4().hex.upper()[:12]}"
         
@@ -91,6 +103,7 @@ def simulate_paypal_payment(order_id: int, paypal_email: str, approve: bool = Tr
                 "id": int(order.id),
                 "status": str(order.status),
                 "invoice_file": str(order.invoice_file) if order.invoice_file else "",
+                "invoice_status": "PENDING",
                 "total_amount": float(order.total_amount),
                 "created_at": order.created_at.isoformat() if order.created_at else None
             },
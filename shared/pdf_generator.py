@@ -1,5 +1,5 @@
+from functools import lru_cache
 from io import BytesIO
-import os
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import cm
@@ -7,119 +7,245 @@ from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph,
 from reportlab.lib import colors
 from datetime import datetime
 from apps.models import Order, OrderItem
-from django.conf import settings
+from django.utils import timezone
+from shared.invoice_storage import content_hash, invoice_storage
 
-INVOICES_DIR = os.path.join(settings.BASE_DIR, 'invoices') 
-
-os.makedirs(INVOICES_DIR, exist_ok=True)
-
-def generate_invoice_pdf(order_id: int) -> BytesIO:
+def get_invoice_data(order_id: int) -> dict:
     """
-    Génère une facture PDF pour une commande
+    Données d'une facture (types simples, transmissibles à un autre processus)
+    Deux requêtes : la commande avec son client, puis ses articles avec leur produit
     """
     try:
         order = Order.objects.select_related("user").get(id=order_id)
     except Order.DoesNotExist:
         raise ValueError(f"Commande {order_id} non trouvée")
     
-    pdf_buffer = BytesIO()
-    doc = SimpleDocTemplate(pdf_buffer, pagesize=A4, topMargin=2*cm, bottomMargin=2*cm)
-    
-    story = []
-    styles = getSampleStyleSheet()
-    
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        textColor=colors.HexColor('#333333'),
-        spaceAfter=30,
-        alignment=1 
-    )
-    story.append(Paragraph("FACTURE", title_style))
-    story.append(Spacer(1, 0.5*cm))
-    
-    info_data = [
-        ["N° Facture:", f"CMD-{order.id:05d}", "Date:", datetime.now().strftime("%d/%m/%Y")],
-        ["Client:", order.user.username, "Email:", order.user.email],
-        ["Statut:", order.status, "", ""]
-    ]
-    
-    info_table = Table(info_data, colWidths=[3*cm, 4*cm, 3*cm, 4*cm])
-    info_table.setStyle(TableStyle([
-        ('FONT', (0, 0), (-1, -1), 'Helvetica', 9),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-        ('ROWBACKGROUND', (0, 0), (-1, -1), colors.white),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-    ]))
-    
-    story.append(info_table)
-    story.append(Spacer(1, 1*cm))
-    
     items = OrderItem.objects.filter(order=order).select_related("product")
     
-    items_data = [
-        ["Produit", "Quantité", "Prix Unitaire", "Montant"]
-    ]
+    return _invoice_data(order, items)
+
+
+def _invoice_data(order: Order, items) -> dict:
+    """Dict de facture d'une commande (user chargé) et de ses articles (produit chargé)"""
+    return {
+        'order_id': order.id,
+        'user_id': order.user_id,
+        'username': order.user.username,
+        'email': order.user.email,
+        'status': order.status,
+        'total_amount': float(order.total_amount),
+        'date': datetime.now().strftime("%d/%m/%Y"),
+        'items': [
+            {
+                'name': item.product.name,
+                'quantity': item.quantity,
+                'unit_price': float(item.unit_price_frozen),
+                'amount': float(item.quantity * item.unit_price_frozen)
+            }
+            for item in items
+        ]
+    }
+
+
+class InvoiceTemplate:
+    """
+    Éléments fixes de la facture, construits une seule fois par processus
+    (get_invoice_template) : styles, styles de tableaux et largeurs de colonnes,
+    qui ne sont que lus pendant le rendu. Les flowables (Paragraph, Spacer, Table)
+    gardent un état de mise en page (wrap/split) : render() les crée à chaque
+    facture, un même modèle peut donc servir à des rendus simultanés (threads).
+    """
     
-    for item in items:
-        items_data.append([
-            item.product.name,
-            str(item.quantity),
-            f"{float(item.unit_price_frozen):.2f} €",
-            f"{float(item.quantity * item.unit_price_frozen):.2f} €"
+    INFO_COL_WIDTHS = [3*cm, 4*cm, 3*cm, 4*cm]
+    ITEMS_COL_WIDTHS = [6*cm, 2*cm, 3*cm, 3*cm]
+    
+    def __init__(self):
+        styles = getSampleStyleSheet()
+        
+        self.title_style = ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=24,
+            textColor=colors.HexColor('#333333'),
+            spaceAfter=30,
+            alignment=1 
+        )
+        self.footer_style = ParagraphStyle(
+            'Footer',
+            parent=styles['Normal'],
+            fontSize=8,
+            textColor=colors.grey,
+            alignment=1
+        )
+        
+        self.info_table_style = TableStyle([
+            ('FONT', (0, 0), (-1, -1), 'Helvetica', 9),
+            ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+            ('ROWBACKGROUND', (0, 0), (-1, -1), colors.white),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ])
+        self.items_table_style = TableStyle([
+            ('FONT', (0, 0), (-1, -1), 'Helvetica', 9),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#333333')),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+            ('ROWBACKGROUND', (0, 1), (-1, -2), colors.white),
+            ('ROWBACKGROUND', (-1, -1), (-1, -1), colors.HexColor('#E8E8E8')),
+            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+            ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
+            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
         ])
     
-    items_data.append(["", "", "TOTAL:", f"{float(order.total_amount):.2f} €"])
-    
-    items_table = Table(items_data, colWidths=[6*cm, 2*cm, 3*cm, 3*cm])
-    items_table.setStyle(TableStyle([
-        ('FONT', (0, 0), (-1, -1), 'Helvetica', 9),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#333333')),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-        ('ROWBACKGROUND', (0, 1), (-1, -2), colors.white),
-        ('ROWBACKGROUND', (-1, -1), (-1, -1), colors.HexColor('#E8E8E8')),
-        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-        ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
-        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-    ]))
-    
-    story.append(items_table)
-    story.append(Spacer(1, 1*cm))
-    
-    footer_style = ParagraphStyle(
-        'Footer',
-        parent=styles['Normal'],
-        fontSize=8,
-        textColor=colors.grey,
-        alignment=1
-    )
-    story.append(Paragraph("Merci de votre confiance!", footer_style))
-    
-    doc.build(story)
+    def render(self, data: dict) -> bytes:
+        """Met en page la facture décrite par `data` (voir get_invoice_data)"""
+        pdf_buffer = BytesIO()
+        # invariant : ni date de création ni identifiant aléatoire dans le PDF, une même
+        # facture donne les mêmes octets et donc la même clé dans invoice_storage
+        doc = SimpleDocTemplate(pdf_buffer, pagesize=A4, topMargin=2*cm, bottomMargin=2*cm, invariant=1)
+        
+        info_data = [
+            ["N° Facture:", f"CMD-{data['order_id']:05d}", "Date:", data['date']],
+            ["Client:", data['username'], "Email:", data['email']],
+            ["Statut:", data['status'], "", ""]
+        ]
+        info_table = Table(info_data, colWidths=self.INFO_COL_WIDTHS)
+        info_table.setStyle(self.info_table_style)
+        
+        items_data = [["Produit", "Quantité", "Prix Unitaire", "Montant"]]
+        for item in data['items']:
+            items_data.append([
+                item['name'],
+                str(item['quantity']),
+                f"{item['unit_price']:.2f} €",
+                f"{item['amount']:.2f} €"
+            ])
+        items_data.append(["", "", "TOTAL:", f"{data['total_amount']:.2f} €"])
+        
+        items_table = Table(items_data, colWidths=self.ITEMS_COL_WIDTHS)
+        items_table.setStyle(self.items_table_style)
+        
+        doc.build([
+            Paragraph("FACTURE", self.title_style),
+            Spacer(1, 0.5*cm),
+            info_table,
+            Spacer(1, 1*cm),
+            items_table,
+            Spacer(1, 1*cm),
+            Paragraph("Merci de votre confiance!", self.footer_style)
+        ])
+        
+        return pdf_buffer.getvalue()
+
+
+@lru_cache(maxsize=None)
+def get_invoice_template() -> InvoiceTemplate:
+    """Modèle de facture du processus courant, construit au premier rendu"""
+    return InvoiceTemplate()
+
+
+def render_invoice_pdf(data: dict) -> bytes:
+    """
+    Met en page la facture (ReportLab, sans accès à la base)
+    Appelée dans les processus de shared/invoice_queue.py et shared/invoice_batch.py
+    """
+    return get_invoice_template().render(data)
+
+
+def generate_invoice_pdf(order_id: int) -> BytesIO:
+    """
+    Génère une facture PDF pour une commande
+    """
+    return BytesIO(render_invoice_pdf(get_invoice_data(order_id)))
+
+
+def store_invoice(order_id: int, pdf_bytes: bytes) -> str:
+    """
+    Stocke le PDF d'une facture (shared/invoice_storage.py) et le rattache à la commande (statut READY)
+    Retourne la clé du fichier ; l'ancien PDF de la commande est supprimé s'il n'est plus utilisé
+
+    La clé est remplacée par un UPDATE conditionnel sur l'ancienne clé, repris si une
+    autre régénération de la même commande est passée entre-temps : chaque ancienne
+    clé est libérée par celle qui l'a remplacée, aucun PDF ne reste orphelin.
+    """
+    key = invoice_storage.save(pdf_bytes)
+    
+    while True:
+        row = Order.objects.filter(id=order_id).values('invoice_file').first()
+        if row is None:
+            return key
+        previous = row['invoice_file']
+        # update() : ne pas écraser une instance de la commande en cours de modification ailleurs
+        swapped = Order.objects.filter(id=order_id, invoice_file=previous).update(
+            invoice_file=key,
+            invoice_status='READY',
+            invoice_error=None,
+            invoice_generated_at=timezone.now()
+        )
+        if swapped:
+            break
+    
+    # Même contenu libéré par une autre commande entre save() et l'update : on le réécrit
+    if not invoice_storage.exists(key):
+        invoice_storage.save(pdf_bytes)
+    
+    if previous and previous != key:
+        release_invoice_files([previous])
+    
+    return key
+
+
+def release_invoice_files(keys):
+    """
+    Supprime les PDF adressés par contenu qui ne sont plus rattachés à aucune commande
+    Les anciens fichiers à plat (invoice_user{u}_order{o}.pdf) ne sont jamais supprimés
+    """
+    keys = {key for key in keys if content_hash(key)}
+    if not keys:
+        return
     
-    pdf_buffer.seek(0)
-    return pdf_buffer
+    used = set(Order.objects.filter(invoice_file__in=keys).values_list('invoice_file', flat=True))
+    for key in keys - used:
+        invoice_storage.delete(key)
 
 
 def save_invoice_to_file(order_id: int) -> str:
     """
-    Génère et sauvegarde une facture PDF sur le disque
-    Retourne le chemin du fichier
+    Génère et stocke une facture PDF (synchrone)
+    Retourne la clé du fichier dans invoice_storage
+    Pour ne pas bloquer une requête, passer par shared.invoice_queue
     """
-    pdf_buffer = generate_invoice_pdf(order_id)
-    
-    order = Order.objects.get(id=order_id)
-    filename = f"invoice_user{order.user_id}_order{order_id}.pdf"
-    filepath = os.path.join(INVOICES_DIR, filename)
-    
-    with open(filepath, 'wb') as f:
-        f.write(pdf_buffer.getvalue())
-    
-    order.invoice_file = filename
-    order.save()
+    data = get_invoice_data(order_id)
+    return store_invoice(order_id, render_invoice_pdf(data))
+
+
+# Champs de la commande nécessaires à fresh_invoice_key
+FRESHNESS_FIELDS = ('id', 'invoice_file', 'invoice_generated_at', 'updated_at')
+
+
+def fresh_invoice_key(order: dict):
+    """
+    Clé de la facture stockée si elle est à jour, None sinon
+    `order` : dict des FRESHNESS_FIELDS d'une commande
+    """
+    key = order['invoice_file']
+    if not content_hash(key) or not order['invoice_generated_at']:
+        return None
+    if order['invoice_generated_at'] < order['updated_at'] or not invoice_storage.exists(key):
+        return None
+    return key
+
+
+def ensure_invoice(order_id: int) -> str:
+    """
+    Clé de la facture à jour dans invoice_storage
+    Le fichier existant est réutilisé tant que la commande n'a pas été modifiée depuis
+    sa génération (updated_at <= invoice_generated_at) ; sinon il est régénéré.
+    Un ancien fichier à plat est régénéré une fois dans le stockage par contenu.
+    """
+    order = Order.objects.filter(id=order_id).values(*FRESHNESS_FIELDS).first()
+    if order is None:
+        raise ValueError(f"Commande {order_id} non trouvée")
     
-    return filepath
+    return fresh_invoice_key(order) or save_invoice_to_file(order_id)
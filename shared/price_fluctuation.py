@@ -1,4 +1,5 @@
 from decimal import Decimal
+import numpy as np
 
 class PriceFluctuation:
     """
@@ -16,6 +17,7 @@ class PriceFluctuation:
     """
     
     MAX_PRICE_CHANGE = 50 
+    VOTE_PRICE_BUMP = 1.01
     
     @staticmethod
     def calculate_demand(view_count: int, purchase_count: int) -> float:
@@ -118,6 +120,67 @@ class PriceFluctuation:
             'stock': current_stock
         }
     
+    @staticmethod
+    def calculate_new_prices(
+        base_prices,
+        current_prices,
+        current_stocks,
+        base_stocks,
+        view_counts,
+        purchase_counts
+    ) -> dict:
+        """
+        Version vectorisée de calculate_new_price pour tout un catalogue
+        Même formule, appliquée en une passe sur des tableaux NumPy
+        
+        Args:
+            base_prices, current_prices: prix (séquences de float)
+            current_stocks, base_stocks: stocks (séquences d'int)
+            view_counts, purchase_counts: compteurs de demande (séquences d'int)
+        
+        Returns:
+            Dict de tableaux alignés : old_prices, new_prices (arrondis au centime),
+            price_change_percents, trends ('UP', 'DOWN', 'STABLE'), supply_ratios, demands
+        """
+        base_prices = np.asarray(base_prices, dtype=np.float64)
+        current_prices = np.asarray(current_prices, dtype=np.float64)
+        current_stocks = np.asarray(current_stocks, dtype=np.float64)
+        base_stocks = np.asarray(base_stocks, dtype=np.float64)
+        
+        demands = np.asarray(view_counts, dtype=np.float64) + np.asarray(purchase_counts, dtype=np.float64) * 3
+        
+        neutral = (demands == 0) | (base_stocks == 0)
+        safe_base_stocks = np.where(base_stocks == 0, 1, base_stocks)
+        supply_ratios = np.where(
+            neutral,
+            1.0,
+            (current_stocks / safe_base_stocks) * 100 / np.maximum(demands, 1)
+        )
+        
+        price_change_percents = np.where(
+            supply_ratios < 1,
+            np.minimum((1 - supply_ratios) * 100, PriceFluctuation.MAX_PRICE_CHANGE),
+            np.maximum(-(supply_ratios - 1) * 30, -PriceFluctuation.MAX_PRICE_CHANGE)
+        )
+        
+        new_prices = current_prices * (1 + price_change_percents / 100)
+        new_prices = np.clip(new_prices, base_prices * 0.1, base_prices * 2.0)
+        
+        trends = np.where(
+            price_change_percents > 5,
+            'UP',
+            np.where(price_change_percents < -5, 'DOWN', 'STABLE')
+        )
+        
+        return {
+            'old_prices': current_prices,
+            'new_prices': np.round(new_prices, 2),
+            'price_change_percents': price_change_percents,
+            'trends': trends,
+            'supply_ratios': supply_ratios,
+            'demands': demands.astype(np.int64)
+        }
+    
     @staticmethod
     def get_trend_indicator(price_change_percent: float) -> dict:
         """
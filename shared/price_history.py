@@ -0,0 +1,122 @@
+from datetime import timedelta
+from decimal import Decimal
+from django.db.models import Case, DecimalField, F, Value, When
+from django.db.models.functions import Greatest, Least
+from django.utils import timezone
+from apps.models import PriceCandle, PricePoint
+
+RESOLUTIONS = ('minute', 'hour', 'day')
+
+# Fenêtre par défaut d'une requête d'historique, selon la résolution
+DEFAULT_SPANS = {
+    'minute': timedelta(hours=6),
+    'hour': timedelta(days=7),
+    'day': timedelta(days=365),
+}
+
+
+def bucket_start(moment, resolution: str):
+    """Début de l'intervalle (heure locale) contenant `moment`"""
+    local = timezone.localtime(moment)
+    if resolution == 'minute':
+        return local.replace(second=0, microsecond=0)
+    if resolution == 'hour':
+        return local.replace(minute=0, second=0, microsecond=0)
+    if resolution == 'day':
+        return local.replace(hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f"Résolution inconnue : {resolution}")
+
+
+def record_price_changes(results: dict, recorded_at=None):
+    """
+    Ajoute les nouveaux prix à l'historique et met à jour les bougies OHLC
+
+    Args:
+        results: {product_id: {'old_price': ..., 'new_price': ...}} (sortie de reprice_products)
+        recorded_at: horodatage du recalcul (maintenant par défaut)
+
+    Coût : un INSERT pour les points bruts, puis par résolution deux requêtes sans
+    lecture préalable : un INSERT qui ignore les bougies déjà ouvertes, puis un UPDATE
+    qui applique les nouveaux prix en SQL (high = GREATEST(high, prix)...). Deux
+    workers qui recalculent en même temps ajoutent chacun leur échantillon au lieu
+    d'écraser celui de l'autre. Les bougies ne sont jamais recalculées à partir des
+    points bruts.
+    """
+    if not results:
+        return
+
+    recorded_at = recorded_at or timezone.now()
+    prices = {
+        product_id: (Decimal(f"{r['old_price']:.2f}"), Decimal(f"{r['new_price']:.2f}"))
+        for product_id, r in results.items()
+    }
+
+    PricePoint.objects.bulk_create([
+        PricePoint(product_id=product_id, price=new_price, recorded_at=recorded_at)
+        for product_id, (_, new_price) in prices.items()
+    ])
+
+    price_field = DecimalField(max_digits=10, decimal_places=2)
+    new_price = Case(
+        *(When(product_id=product_id, then=Value(price, output_field=price_field))
+          for product_id, (_, price) in prices.items()),
+        output_field=price_field
+    )
+
+    for resolution in RESOLUTIONS:
+        start = bucket_start(recorded_at, resolution)
+
+        # Ouverture des bougies absentes : le prix valait old_price jusqu'à ce recalcul.
+        # Une bougie déjà ouverte (par un recalcul précédent ou un autre worker) est gardée.
+        PriceCandle.objects.bulk_create([
+            PriceCandle(
+                product_id=product_id,
+                resolution=resolution,
+                bucket_start=start,
+                open=old_price,
+                high=old_price,
+                low=old_price,
+                close=old_price,
+                samples=0
+            )
+            for product_id, (old_price, _) in prices.items()
+        ], ignore_conflicts=True)
+
+        PriceCandle.objects.filter(
+            resolution=resolution,
+            bucket_start=start,
+            product_id__in=list(prices)
+        ).update(
+            high=Greatest(F('high'), new_price),
+            low=Least(F('low'), new_price),
+            close=new_price,
+            samples=F('samples') + 1
+        )
+
+
+def get_price_candles(product_id: int, resolution: str = 'hour', start=None, end=None) -> list:
+    """Bougies OHLC pré-agrégées d'un produit sur [start, end]"""
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Résolution invalide : {resolution} (minute, hour, day)")
+
+    end = end or timezone.now()
+    start = start or end - DEFAULT_SPANS[resolution]
+
+    candles = PriceCandle.objects.filter(
+        product_id=product_id,
+        resolution=resolution,
+        bucket_start__gte=bucket_start(start, resolution),
+        bucket_start__lte=end
+    ).order_by('bucket_start').values_list('bucket_start', 'open', 'high', 'low', 'close', 'samples')
+
+    return [
+        {
+            'time': timezone.localtime(bucket).isoformat(),
+            'open': float(open_price),
+            'high': float(high),
+            'low': float(low),
+            'close': float(close),
+            'samples': samples
+        }
+        for bucket, open_price, high, low, close, samples in candles
+    ]
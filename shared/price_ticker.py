@@ -0,0 +1,142 @@
+import asyncio
+import itertools
+import json
+from fastapi import WebSocket, WebSocketDisconnect
+from django.db import close_old_connections
+from django.utils import timezone
+from apps.models import Product
+from shared.price_fluctuation import PriceFluctuation
+from shared.security import verify_jwt_token
+from shared.websocket import ConnectionManager, POLICY_VIOLATION_CLOSE_CODE, manager
+
+PRICE_CHANNEL = "prices"
+
+# Salon de tous les prix, et salon d'un produit
+ALL_PRICES_ROOM = "prices"
+MAX_WATCHED_PRODUCTS = 100
+
+# Rôles autorisés, comme pour les routes REST des prix
+PRICE_ROLES = ("USER", "EDITOR", "ADMIN")
+
+_ticker_ids = itertools.count(1)
+
+
+def price_room(product_id: int) -> str:
+    return f"price:{product_id}"
+
+
+class PriceTicker(ConnectionManager):
+    """
+    Connexions du flux des prix
+
+    Un seul message par tick transite par le broker ({"type": "prices", ...} pour le
+    salon `prices`) ; chaque worker en tire lui-même le message {"type": "price", ...}
+    de chaque salon price:<id> qui a des abonnés chez lui.
+    """
+
+    def _dispatch(self, envelope: dict):
+        message = envelope["message"]
+        if envelope.get("room") != ALL_PRICES_ROOM or message.get("type") != "prices":
+            return super()._dispatch(envelope)
+
+        self._send_to_room(ALL_PRICES_ROOM, json.dumps(message))
+        for update in message["updates"]:
+            room = price_room(update["product_id"])
+            if room in self.rooms:
+                self._send_to_room(room, json.dumps({"type": "price", **update}))
+
+
+# Même broker que le chat (un seul abonnement par worker) ; un client en retard n'a
+# besoin que des derniers prix : les plus anciens sont jetés
+price_ticker = PriceTicker(broker=manager.broker, channel=PRICE_CHANNEL, overflow_policy="drop_oldest")
+
+
+def _price_update(product_id: int, result: dict, timestamp: str) -> dict:
+    return {
+        "product_id": product_id,
+        "price": round(result["new_price"], 2),
+        "previous_price": round(result["old_price"], 2),
+        "price_change_percent": round(result["price_change_percent"], 2),
+        "trend": result["indicator"]["trend"],
+        "stock": result["stock"],
+        "timestamp": timestamp
+    }
+
+
+async def publish_price_updates(results: dict):
+    """
+    Écouteur du RepricingScheduler : pousse les prix recalculés pendant un tick
+    Une seule publication avec tout le lot, répartie par PriceTicker entre le salon
+    `prices` et les salons `price:<id>` ; chaque produit apparaît au plus une fois par tick
+    """
+    timestamp = timezone.localtime().isoformat()
+    updates = [_price_update(product_id, result, timestamp) for product_id, result in results.items()]
+
+    await price_ticker.broadcast({"type": "prices", "updates": updates}, room=ALL_PRICES_ROOM)
+
+
+def _current_prices(product_ids: list) -> list:
+    try:
+        rows = Product.objects.filter(id__in=product_ids).values_list(
+            'id', 'current_price', 'previous_price', 'price_change_percentage', 'stock', 'last_price_update'
+        )
+        return [
+            {
+                "product_id": product_id,
+                "price": float(price),
+                "previous_price": float(previous),
+                "price_change_percent": round(change, 2),
+                "trend": PriceFluctuation.get_trend_indicator(change)["trend"],
+                "stock": stock,
+                "timestamp": timezone.localtime(updated_at).isoformat()
+            }
+            for product_id, price, previous, change, stock, updated_at in rows
+        ]
+    finally:
+        close_old_connections()
+
+
+def _parse_ids(ids: str) -> list:
+    product_ids = list(dict.fromkeys(int(i) for i in ids.split(",") if i.strip()))
+    if len(product_ids) > MAX_WATCHED_PRODUCTS:
+        raise ValueError(f"{MAX_WATCHED_PRODUCTS} produits maximum")
+    return product_ids
+
+
+async def price_ticker_endpoint(websocket: WebSocket, ids: str = None, token: str = None):
+    """
+    Flux des prix en direct, réservé aux utilisateurs connectés (`token` : JWT)
+
+    Sans `ids`, le client reçoit à chaque tick de recalcul un message
+    {"type": "prices", "updates": [...]} avec tous les produits dont le prix a changé.
+    Avec `ids=1,2,3`, il reçoit d'abord l'état courant de ces produits
+    ({"type": "snapshot", ...}) puis un message {"type": "price", ...} par produit
+    modifié. Les messages envoyés par le client sont ignorés.
+    """
+    user = verify_jwt_token(token) if token else None
+    if not user or user.get("role") not in PRICE_ROLES:
+        await websocket.close(code=POLICY_VIOLATION_CLOSE_CODE, reason="Token invalide ou manquant")
+        return
+
+    try:
+        product_ids = _parse_ids(ids) if ids else None
+    except ValueError as e:
+        await websocket.close(code=POLICY_VIOLATION_CLOSE_CODE, reason=str(e))
+        return
+
+    client_id = next(_ticker_ids)
+    await price_ticker.connect(websocket, client_id, "ticker")
+
+    if product_ids is None:
+        price_ticker.subscribe(client_id, ALL_PRICES_ROOM)
+    else:
+        for product_id in product_ids:
+            price_ticker.subscribe(client_id, price_room(product_id))
+        snapshot = await asyncio.to_thread(_current_prices, product_ids)
+        await price_ticker.send_personal_message({"type": "snapshot", "prices": snapshot}, client_id)
+
+    try:
+        while True:
+            await websocket.receive_text()
+    except (WebSocketDisconnect, RuntimeError):
+        price_ticker.disconnect(client_id, websocket)
@@ -0,0 +1,199 @@
+import asyncio
+import json
+import os
+
+
+async def _dispatch(handlers: list, channel: str, payload: str):
+    """Remet un message à chaque handler ; l'erreur de l'un n'empêche pas les autres"""
+    for handler in list(handlers):
+        try:
+            await handler(channel, payload)
+        except Exception as e:
+            print(f"⚠️ Erreur diffusion pub/sub ({channel}): {str(e)}")
+
+
+class LocalBroker:
+    """
+    Broker en mémoire, limité au worker courant (mode par défaut)
+
+    publish() dépose le message dans une file bornée et rend la main ; une tâche
+    de fond le remet aux handlers. Quand la file est pleine, publish() attend
+    (contre-pression sur l'émetteur plutôt que mémoire illimitée).
+    """
+
+    def __init__(self, max_pending: int = 10000):
+        self.max_pending = max_pending
+        self._queue = None
+        self._task = None
+        self._handlers = []
+
+    async def start(self, handler):
+        """
+        handler : coroutine (channel, payload) appelée pour chaque message publié
+        Plusieurs gestionnaires de connexions peuvent partager le broker : chacun
+        s'enregistre ici et filtre ses canaux
+        """
+        if handler not in self._handlers:
+            self._handlers.append(handler)
+        if self._task is None:
+            self._queue = asyncio.Queue(self.max_pending)
+            self._task = asyncio.get_running_loop().create_task(self._pump())
+
+    async def _pump(self):
+        while True:
+            channel, payload = await self._queue.get()
+            await _dispatch(self._handlers, channel, payload)
+            # Laisse les tâches d'écriture des clients vider leur file entre deux messages
+            await asyncio.sleep(0)
+
+    async def publish(self, channel: str, payload: str):
+        await self._queue.put((channel, payload))
+
+    async def stop(self, handler=None):
+        """Désenregistre `handler` ; le broker s'arrête avec le dernier (ou sans handler)"""
+        if handler in self._handlers:
+            self._handlers.remove(handler)
+            if self._handlers:
+                return
+        self._handlers.clear()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+class UnixSocketBroker:
+    """
+    Broker inter-workers sur une socket Unix (tous les workers sur la même machine)
+
+    Le premier worker qui obtient le verrou `<path>.lock` (flock, libéré
+    automatiquement à la mort du processus) ouvre la socket et relaie chaque ligne
+    reçue à tous les workers connectés, émetteur compris. Chaque worker, hub inclus,
+    s'y connecte comme client : un message publié revient donc par le même chemin
+    sur tous les workers. Si le hub disparaît, les autres se reconnectent et l'un
+    d'eux reprend le verrou.
+
+    Un worker dont le tampon d'envoi dépasse PEER_BUFFER_LIMIT est déconnecté du hub
+    (il se reconnecte ensuite) pour ne pas faire grossir la mémoire du hub.
+    Tant que la socket est injoignable, les messages sont distribués localement.
+
+    Format : une ligne JSON {"c": channel, "p": payload} par message.
+    """
+
+    RECONNECT_DELAY = 0.5
+    PEER_BUFFER_LIMIT = 4 * 1024 * 1024
+    LINE_LIMIT = 1024 * 1024
+
+    def __init__(self, path: str):
+        self.path = path
+        self._handlers = []
+        self._task = None
+        self._server = None
+        self._lock_fd = None
+        self._peers = set()
+        self._writer = None
+
+    async def start(self, handler):
+        """Enregistre un handler (voir LocalBroker.start) ; une seule connexion par worker"""
+        if handler not in self._handlers:
+            self._handlers.append(handler)
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def _try_become_hub(self) -> bool:
+        import fcntl
+
+        fd = os.open(f"{self.path}.lock", os.O_CREAT | os.O_RDWR, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        return True
+
+    async def _start_hub(self):
+        # Socket laissée par un hub mort : le verrou garantit qu'aucun autre ne l'utilise
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._serve_peer, path=self.path, limit=self.LINE_LIMIT)
+
+    async def _serve_peer(self, reader, writer):
+        self._peers.add(writer)
+        try:
+            while line := await reader.readline():
+                for peer in list(self._peers):
+                    if peer.transport.get_write_buffer_size() > self.PEER_BUFFER_LIMIT:
+                        self._peers.discard(peer)
+                        peer.close()
+                    else:
+                        peer.write(line)
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            self._peers.discard(writer)
+            writer.close()
+
+    async def _run(self):
+        while True:
+            try:
+                if self._server is None and self._try_become_hub():
+                    await self._start_hub()
+                reader, self._writer = await asyncio.open_unix_connection(self.path, limit=self.LINE_LIMIT)
+                while line := await reader.readline():
+                    message = json.loads(line)
+                    await _dispatch(self._handlers, message['c'], message['p'])
+                    await asyncio.sleep(0)
+            except (OSError, ValueError, asyncio.IncompleteReadError) as e:
+                print(f"⚠️ Broker pub/sub injoignable ({self.path}): {str(e)}")
+            finally:
+                if self._writer is not None:
+                    self._writer.close()
+                    self._writer = None
+            await asyncio.sleep(self.RECONNECT_DELAY)
+
+    async def publish(self, channel: str, payload: str):
+        writer = self._writer
+        if writer is None or writer.is_closing():
+            await _dispatch(self._handlers, channel, payload)
+            return
+        writer.write(json.dumps({'c': channel, 'p': payload}).encode() + b'\n')
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+    async def stop(self, handler=None):
+        """Désenregistre `handler` ; le broker s'arrête avec le dernier (ou sans handler)"""
+        if handler in self._handlers:
+            self._handlers.remove(handler)
+            if self._handlers:
+                return
+        self._handlers.clear()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._server:
+            self._server.close()
+            for peer in list(self._peers):
+                peer.close()
+            self._server = None
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+
+def create_broker(kind: str, socket_path: str = None):
+    """Broker selon Env.CHAT_BROKER : 'local' (un worker) ou 'unix' (workers d'une même machine)"""
+    if kind == 'local':
+        return LocalBroker()
+    if kind == 'unix':
+        return UnixSocketBroker(socket_path)
+    raise ValueError(f"Broker pub/sub inconnu : {kind} (local, unix)")
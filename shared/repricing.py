@@ -0,0 +1,180 @@
+import asyncio
+import threading
+from collections import Counter
+from decimal import Decimal
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from apps.models import Product
+from shared.env import Env
+from shared.price_fluctuation import PriceFluctuation
+from shared.price_history import record_price_changes
+
+PRICING_FIELDS = (
+    'id', 'base_price', 'current_price', 'stock', 'base_stock', 'view_count', 'purchase_count'
+)
+
+
+def reprice_products(product_ids=None, vote_bumps: dict = None) -> dict:
+    """
+    Recalcule le prix d'un lot de produits (tout le catalogue si product_ids est None)
+    Calcul vectorisé (PriceFluctuation.calculate_new_prices) puis un seul bulk_update
+
+    Args:
+        product_ids: IDs des produits à recalculer
+        vote_bumps: {product_id: nombre de nouveaux votes}, chaque vote majore le prix
+            de PriceFluctuation.VOTE_PRICE_BUMP avant le calcul offre/demande
+
+    Chaque recalcul est ajouté à l'historique des prix (voir shared.price_history)
+
+    Retourne un dict {product_id: résultat} au format de PriceFluctuation.calculate_new_price
+    """
+    query = Product.objects.all()
+    if product_ids is not None:
+        query = query.filter(id__in=list(product_ids))
+
+    rows = list(query.order_by('id').values_list(*PRICING_FIELDS))
+    if not rows:
+        return {}
+
+    ids, base_prices, current_prices, stocks, base_stocks, view_counts, purchase_counts = zip(*rows)
+    vote_bumps = vote_bumps or {}
+
+    batch = PriceFluctuation.calculate_new_prices(
+        base_prices=[float(p) for p in base_prices],
+        current_prices=[
+            float(p) * PriceFluctuation.VOTE_PRICE_BUMP ** vote_bumps.get(product_id, 0)
+            for product_id, p in zip(ids, current_prices)
+        ],
+        current_stocks=stocks,
+        base_stocks=base_stocks,
+        view_counts=view_counts,
+        purchase_counts=purchase_counts
+    )
+
+    now = timezone.now()
+    updated = []
+    results = {}
+    for i, product_id in enumerate(ids):
+        old_price = float(current_prices[i])
+        new_price = float(batch['new_prices'][i])
+        change = float(batch['price_change_percents'][i])
+
+        updated.append(Product(
+            id=product_id,
+            previous_price=Decimal(f"{old_price:.2f}"),
+            current_price=Decimal(f"{new_price:.2f}"),
+            price_change_percentage=change,
+            last_price_update=now
+        ))
+        results[product_id] = {
+            'old_price': old_price,
+            'new_price': new_price,
+            'price_change_percent': change,
+            'indicator': PriceFluctuation.get_trend_indicator(change),
+            'supply_ratio': float(batch['supply_ratios'][i]),
+            'demand': int(batch['demands'][i]),
+            'stock': stocks[i]
+        }
+
+    with transaction.atomic():
+        Product.objects.bulk_update(
+            updated,
+            ['previous_price', 'current_price', 'price_change_percentage', 'last_price_update']
+        )
+        record_price_changes(results, recorded_at=now)
+
+    return results
+
+
+class RepricingScheduler:
+    """
+    Recalcul périodique des prix hors du chemin des requêtes
+
+    Les endpoints signalent seulement les produits dont la demande a changé
+    (mark_dirty, record_vote) ; une tâche asyncio démarrée dans le lifespan de l'app
+    recalcule ces produits toutes les `interval` secondes en un seul lot.
+    Un produit sans nouveau signal n'est pas recalculé.
+
+    Après chaque tick, les écouteurs (add_listener) reçoivent les résultats du lot :
+    au plus une mise à jour par produit et par tick.
+    """
+
+    def __init__(self, interval: float = Env.REPRICING_INTERVAL):
+        self.interval = interval
+        self._dirty = set()
+        self._vote_bumps = Counter()
+        self._lock = threading.Lock()
+        self._task = None
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """callback : coroutine appelée avec {product_id: résultat} après chaque tick non vide"""
+        if callback not in self._listeners:
+            self._listeners.append(callback)
+
+    def mark_dirty(self, product_ids):
+        """Signale des produits dont la demande a changé"""
+        with self._lock:
+            self._dirty.update(product_ids)
+
+    def record_vote(self, product_id: int):
+        """Signale un nouveau vote : majoration de prix appliquée au prochain tick"""
+        with self._lock:
+            self._vote_bumps[product_id] += 1
+            self._dirty.add(product_id)
+
+    def run_once(self) -> dict:
+        """Recalcule les produits signalés depuis le dernier tick"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            vote_bumps, self._vote_bumps = self._vote_bumps, Counter()
+
+        if not dirty:
+            return {}
+
+        try:
+            return reprice_products(dirty, vote_bumps=vote_bumps)
+        except Exception:
+            with self._lock:
+                self._dirty.update(dirty)
+                self._vote_bumps.update(vote_bumps)
+            raise
+        finally:
+            close_old_connections()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                results = await asyncio.to_thread(self.run_once)
+            except Exception as e:
+                print(f"⚠️ Erreur recalcul des prix: {str(e)}")
+                continue
+            if results:
+                await self._notify(results)
+
+    async def _notify(self, results: dict):
+        for callback in self._listeners:
+            try:
+                await callback(results)
+            except Exception as e:
+                print(f"⚠️ Erreur diffusion des prix: {str(e)}")
+
+    def start(self):
+        """Démarre la tâche périodique (à appeler depuis la boucle asyncio)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Arrête la tâche et recalcule les derniers produits signalés"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.to_thread(self.run_once)
+
+
+repricing_scheduler = RepricingScheduler()
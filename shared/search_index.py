@@ -0,0 +1,283 @@
+import heapq
+import math
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from collections import Counter
+from django.db.models import Count, Max, Q
+from apps.models import Product
+from shared.env import Env
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+LIGATURES = str.maketrans({'œ': 'oe', 'æ': 'ae', 'ß': 'ss'})
+
+STOPWORDS = {
+    'a', 'au', 'aux', 'avec', 'ce', 'ces', 'd', 'dans', 'de', 'des', 'du', 'en', 'et',
+    'l', 'la', 'le', 'les', 'ou', 'par', 'pour', 'sur', 'un', 'une',
+}
+
+
+def fold(text: str) -> str:
+    """Minuscules sans accents ni ligatures : 'Éléctrique Œuvre' -> 'electrique oeuvre'"""
+    text = (text or '').lower().translate(LIGATURES)
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def tokenize(text: str) -> list:
+    return [token for token in TOKEN_RE.findall(fold(text)) if token not in STOPWORDS]
+
+
+class ProductSearchIndex:
+    """
+    Index inversé en mémoire sur le nom et la description des produits
+
+    - Pliage des accents et ligatures (recherche 'electrique' == 'éléctrique')
+    - Correspondance par préfixe ('vap' trouve 'vapeur'), moins bien notée qu'un mot exact
+    - Tous les mots de la recherche doivent être présents (ET logique)
+    - Classement BM25, le nom pèse NAME_WEIGHT fois plus que la description
+
+    L'index est construit depuis la base au premier usage puis tenu à jour par
+    api/crud/product.py (create/update/delete) dans le worker qui a traité la requête.
+    Avant chaque recherche, les autres workers comparent un repère lu en base
+    (nombre de produits, plus grand id, dernier Product.updated_at) à celui de leur
+    copie : s'il a bougé, seuls les produits créés ou modifiés depuis sont relus, et
+    les ids sont relus pour retirer les produits supprimés.
+
+    L'index est de plus reconstruit toutes les Env.SEARCH_INDEX_REFRESH secondes
+    (rattrape une écriture hors save(), ou validée après un repère plus récent) :
+    dans un thread de fond, sur un nouvel index qui remplace l'ancien d'un bloc,
+    pendant que les recherches continuent sur l'ancien. Les modifications reçues
+    pendant la reconstruction sont rejouées sur le nouvel index.
+    """
+
+    NAME_WEIGHT = 3.0
+    DESCRIPTION_WEIGHT = 1.0
+    PREFIX_PENALTY = 0.6
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, refresh_interval: float = Env.SEARCH_INDEX_REFRESH):
+        self.refresh_interval = refresh_interval
+        self._postings = {}
+        self._doc_lengths = {}
+        self._doc_terms = {}
+        self._vocabulary = []
+        self._vocabulary_stale = False
+        self._total_length = 0.0
+        self._loaded_at = None
+        self._watermark = None
+        self._pending = None
+        self._lock = threading.RLock()
+        self._rebuild_lock = threading.Lock()
+
+    def _weighted_terms(self, name: str, description: str) -> Counter:
+        terms = Counter()
+        for token in tokenize(name):
+            terms[token] += self.NAME_WEIGHT
+        for token in tokenize(description):
+            terms[token] += self.DESCRIPTION_WEIGHT
+        return terms
+
+    def _remove(self, product_id: int):
+        length = self._doc_lengths.pop(product_id, None)
+        if length is None:
+            return
+        self._total_length -= length
+        for term in self._doc_terms.pop(product_id):
+            del self._postings[term][product_id]
+            if not self._postings[term]:
+                del self._postings[term]
+                self._vocabulary_stale = True
+
+    def _add(self, product_id: int, name: str, description: str):
+        terms = self._weighted_terms(name, description)
+        for term, weight in terms.items():
+            if term not in self._postings:
+                self._postings[term] = {}
+                self._vocabulary_stale = True
+            self._postings[term][product_id] = weight
+        length = sum(terms.values())
+        self._doc_terms[product_id] = list(terms)
+        self._doc_lengths[product_id] = length
+        self._total_length += length
+
+    def rebuild(self):
+        """Reconstruit l'index complet depuis la base"""
+        with self._rebuild_lock:
+            self._rebuild()
+
+    def _rebuild(self):
+        """Construction hors verrou de recherche, puis échange (appelant : _rebuild_lock pris)"""
+        with self._lock:
+            self._pending = []
+
+        # Lu avant les produits : une modification faite pendant la lecture sera relue par _sync
+        watermark = self._read_watermark()
+        fresh = ProductSearchIndex(self.refresh_interval)
+        for product_id, name, description in Product.objects.values_list(
+            'id', 'name', 'description'
+        ).iterator():
+            fresh._add(product_id, name, description)
+
+        with self._lock:
+            for product_id, name, description in self._pending:
+                fresh._remove(product_id)
+                if name is not None:
+                    fresh._add(product_id, name, description)
+            self._pending = None
+            self._postings = fresh._postings
+            self._doc_lengths = fresh._doc_lengths
+            self._doc_terms = fresh._doc_terms
+            self._total_length = fresh._total_length
+            self._vocabulary = sorted(fresh._postings)
+            self._vocabulary_stale = False
+            self._watermark = watermark
+            self._loaded_at = time.monotonic()
+
+    @staticmethod
+    def _read_watermark() -> tuple:
+        stats = Product.objects.aggregate(count=Count('id'), last_id=Max('id'), last_update=Max('updated_at'))
+        return stats['count'], stats['last_id'] or 0, stats['last_update']
+
+    def _sync(self):
+        """Relit les produits créés, modifiés ou supprimés (par un autre worker) depuis le dernier repère"""
+        watermark = self._read_watermark()
+        with self._lock:
+            previous = self._watermark
+        if watermark == previous:
+            return
+
+        _, last_id, last_update = previous
+        changed = Q(id__gt=last_id)
+        if last_update is not None:
+            # >= : un produit enregistré à la même date que le repère précédent n'est pas manqué
+            changed |= Q(updated_at__gte=last_update)
+        rows = list(Product.objects.filter(changed).values_list('id', 'name', 'description'))
+
+        with self._lock:
+            for product_id, name, description in rows:
+                self._record(product_id, name, description)
+                self._remove(product_id)
+                self._add(product_id, name, description)
+            indexed = len(self._doc_lengths)
+
+        if indexed != watermark[0]:
+            existing = set(Product.objects.values_list('id', flat=True))
+            with self._lock:
+                for product_id in [product_id for product_id in self._doc_lengths if product_id not in existing]:
+                    self._record(product_id)
+                    self._remove(product_id)
+
+        with self._lock:
+            self._watermark = watermark
+
+    def _background_rebuild(self):
+        from django.db import close_old_connections
+
+        try:
+            self._rebuild()
+        except Exception as e:
+            with self._lock:
+                self._pending = None
+            print(f"⚠️ Erreur reconstruction de l'index de recherche: {str(e)}")
+        finally:
+            self._rebuild_lock.release()
+            close_old_connections()
+
+    def ensure_fresh(self):
+        """
+        Premier usage : construction immédiate (les recherches concurrentes l'attendent)
+        Ensuite : relecture des produits modifiés depuis le dernier repère, et
+        reconstruction lancée en fond si l'index est périmé
+        """
+        if self._loaded_at is None:
+            with self._rebuild_lock:
+                if self._loaded_at is None:
+                    self._rebuild()
+                    return
+
+        if time.monotonic() - self._loaded_at > self.refresh_interval:
+            if self._rebuild_lock.acquire(blocking=False):
+                threading.Thread(target=self._background_rebuild, name="search-index-rebuild", daemon=True).start()
+        self._sync()
+
+    def _record(self, product_id: int, name: str = None, description: str = None):
+        """Modification à rejouer sur l'index en cours de reconstruction (name=None : suppression)"""
+        if self._pending is not None:
+            self._pending.append((product_id, name, description))
+
+    def index_product(self, product_id: int, name: str, description: str):
+        """Ajoute ou remplace un produit dans l'index"""
+        with self._lock:
+            self._record(product_id, name, description)
+            if self._loaded_at is None:
+                return
+            self._remove(product_id)
+            self._add(product_id, name, description)
+
+    def remove_product(self, product_id: int):
+        with self._lock:
+            self._record(product_id)
+            if self._loaded_at is not None:
+                self._remove(product_id)
+
+    def _expand(self, term: str) -> list:
+        """Mots de l'index commençant par `term`, avec leur pondération"""
+        if self._vocabulary_stale:
+            self._vocabulary = sorted(self._postings)
+            self._vocabulary_stale = False
+        matches = []
+        i = bisect_left(self._vocabulary, term)
+        while i < len(self._vocabulary) and self._vocabulary[i].startswith(term):
+            word = self._vocabulary[i]
+            matches.append((word, 1.0 if word == term else self.PREFIX_PENALTY))
+            i += 1
+        return matches
+
+    def search(self, query: str, limit: int = Env.SEARCH_MAX_RESULTS) -> list:
+        """
+        Retourne les `limit` meilleurs [(product_id, score)], par pertinence décroissante
+        Liste vide si aucun produit ne contient tous les mots de la recherche
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+
+        self.ensure_fresh()
+        with self._lock:
+            doc_count = len(self._doc_lengths)
+            if not doc_count:
+                return []
+            avg_length = self._total_length / doc_count
+
+            scores = None
+            for term in terms:
+                term_scores = {}
+                for word, weight in self._expand(term):
+                    docs = self._postings[word]
+                    idf = math.log(1 + (doc_count - len(docs) + 0.5) / (len(docs) + 0.5))
+                    for product_id, tf in docs.items():
+                        norm = self.K1 * (1 - self.B + self.B * self._doc_lengths[product_id] / avg_length)
+                        score = weight * idf * tf * (self.K1 + 1) / (tf + norm)
+                        if score > term_scores.get(product_id, 0):
+                            term_scores[product_id] = score
+
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {
+                        product_id: score + term_scores[product_id]
+                        for product_id, score in scores.items()
+                        if product_id in term_scores
+                    }
+                if not scores:
+                    return []
+
+        return heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], item[0]))
+
+
+product_search_index = ProductSearchIndex()
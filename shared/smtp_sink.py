@@ -0,0 +1,148 @@
+"""
+Serveur SMTP local qui garde les emails reçus en mémoire au lieu de les délivrer
+
+Pour les essais et le développement, sans compte SMTP :
+    python -m shared.smtp_sink --port 1025
+puis SMTP_SERVER=127.0.0.1 SMTP_PORT=1025 (ou EMAIL_HOST / EMAIL_PORT) et
+MAIL_STARTTLS=false : le serveur ne propose pas STARTTLS.
+
+Dans un script ou un test :
+    with SMTPSink() as sink:
+        pool = MailPool(sink.host, sink.port, starttls=False)
+        ...
+        sink.messages   # email.message.Message reçus
+"""
+import argparse
+import asyncio
+import threading
+from email import message_from_bytes, policy
+
+
+class SMTPSink:
+    """
+    Sous-ensemble de SMTP suffisant pour smtplib : EHLO/HELO, AUTH PLAIN/LOGIN
+    (tout identifiant est accepté), MAIL, RCPT, DATA, RSET, NOOP, QUIT ; pas de STARTTLS.
+    Le serveur tourne dans un thread avec sa propre boucle asyncio.
+
+    `fail_next` : nombre de prochains DATA refusés avec `fail_code` (451 = erreur
+    temporaire, 5xx = refus définitif), pour éprouver les reprises de l'expéditeur.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, verbose: bool = False):
+        self.host = host
+        self.port = port
+        self.verbose = verbose
+        self.messages = []
+        self.connections = 0
+        self.fail_next = 0
+        self.fail_code = 451
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._ready = threading.Event()
+
+    async def _reply(self, writer, line: str):
+        writer.write(f"{line}\r\n".encode())
+        await writer.drain()
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        await self._reply(writer, "220 smtp-sink ESMTP")
+        try:
+            while line := await reader.readline():
+                command, _, argument = line.decode(errors="replace").strip().partition(" ")
+                command = command.upper()
+
+                if command == "EHLO":
+                    writer.write(b"250-smtp-sink\r\n250-AUTH PLAIN LOGIN\r\n")
+                    await self._reply(writer, "250 8BITMIME")
+                elif command == "HELO":
+                    await self._reply(writer, "250 smtp-sink")
+                elif command == "AUTH":
+                    if argument.upper().startswith("LOGIN"):
+                        await self._reply(writer, "334 VXNlcm5hbWU6")
+                        await reader.readline()
+                        await self._reply(writer, "334 UGFzc3dvcmQ6")
+                        await reader.readline()
+                    await self._reply(writer, "235 Authentication successful")
+                elif command in ("MAIL", "RCPT", "RSET", "NOOP"):
+                    await self._reply(writer, "250 OK")
+                elif command == "DATA":
+                    await self._reply(writer, "354 End data with <CR><LF>.<CR><LF>")
+                    lines = []
+                    while (data := await reader.readline()) not in (b".\r\n", b".\n", b""):
+                        lines.append(data[1:] if data.startswith(b"..") else data)
+                    if self.fail_next > 0:
+                        self.fail_next -= 1
+                        await self._reply(writer, f"{self.fail_code} Rejected by smtp-sink")
+                        continue
+                    message = message_from_bytes(b"".join(lines), policy=policy.default)
+                    self.messages.append(message)
+                    if self.verbose:
+                        print(f"📧 {message['From']} -> {message['To']} : {message['Subject']}")
+                    await self._reply(writer, "250 OK: queued")
+                elif command == "QUIT":
+                    await self._reply(writer, "221 Bye")
+                    break
+                else:
+                    await self._reply(writer, "502 Command not implemented")
+        except (ConnectionError, asyncio.CancelledError):
+            # Arrêt du serveur : connexion en cours abandonnée
+            pass
+        finally:
+            writer.close()
+
+    async def _serve(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        async with self._server:
+            await self._server.serve_forever()
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._loop.run_until_complete(self._serve())
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._loop.close()
+
+    def start(self) -> "SMTPSink":
+        """Démarre le serveur ; avec port=0, le port choisi est dans self.port"""
+        self._thread = threading.Thread(target=self._run, name="smtp-sink", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def _cancel_all(self):
+        self._server.close()
+        for task in asyncio.all_tasks(self._loop):
+            task.cancel()
+
+    def stop(self):
+        if self._loop and self._server:
+            self._loop.call_soon_threadsafe(self._cancel_all)
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self) -> "SMTPSink":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1025)
+    args = parser.parse_args()
+
+    sink = SMTPSink(args.host, args.port, verbose=True).start()
+    print(f"Serveur SMTP local sur {sink.host}:{sink.port} (Ctrl+C pour arrêter)")
+    try:
+        sink._thread.join()
+    except KeyboardInterrupt:
+        sink.stop()
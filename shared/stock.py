@@ -0,0 +1,84 @@
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from apps.models import Product
+
+
+class InsufficientStockError(ValueError):
+    """
+    Levée quand une décrémentation conditionnelle ne touche pas toutes les lignes
+    `shortages` liste les produits en défaut : {product_id, name, requested, available}
+    """
+
+    def __init__(self, shortages: list):
+        self.shortages = shortages
+        details = ", ".join(
+            f"'{s['name']}' (demandé {s['requested']}, en stock {s['available']})"
+            for s in shortages
+        )
+        super().__init__(f"Stock insuffisant pour {details}")
+
+
+def _per_product(quantities: dict):
+    return Case(
+        *[When(id=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+        output_field=IntegerField()
+    )
+
+
+def decrement_stocks(quantities: dict, count_purchase: bool = True) -> int:
+    """
+    Décrémente atomiquement le stock de plusieurs produits en une seule requête
+
+    UPDATE product SET stock = stock - q, purchase_count = purchase_count + q
+    WHERE id IN (...) AND stock >= q
+
+    Tout ou rien : si une ligne n'est pas mise à jour (stock insuffisant),
+    la transaction est annulée et InsufficientStockError est levée.
+    Lève Product.DoesNotExist si un produit n'existe pas.
+
+    Args:
+        quantities: {product_id: quantité}
+        count_purchase: incrémente aussi purchase_count
+    """
+    quantities = {product_id: quantity for product_id, quantity in quantities.items() if quantity > 0}
+    if not quantities:
+        return 0
+
+    per_product = _per_product(quantities)
+    updates = {'stock': F('stock') - per_product}
+    if count_purchase:
+        updates['purchase_count'] = F('purchase_count') + per_product
+
+    with transaction.atomic():
+        updated = Product.objects.filter(
+            id__in=list(quantities),
+            stock__gte=per_product
+        ).update(**updates)
+
+        if updated == len(quantities):
+            return updated
+
+        transaction.set_rollback(True)
+
+    existing = {
+        p['id']: p
+        for p in Product.objects.filter(id__in=list(quantities)).values('id', 'name', 'stock')
+    }
+    missing = [product_id for product_id in quantities if product_id not in existing]
+    if missing:
+        raise Product.DoesNotExist(f"Produit(s) introuvable(s) : {missing}")
+
+    shortages = [
+        {
+            'product_id': product_id,
+            'name': existing[product_id]['name'],
+            'requested': quantity,
+            'available': existing[product_id]['stock']
+        }
+        for product_id, quantity in quantities.items()
+    ]
+    # Le stock a pu être réapprovisionné entre l'UPDATE et la relecture :
+    # on ne garde que les produits réellement en défaut s'il y en a
+    raise InsufficientStockError(
+        [s for s in shortages if s['available'] < s['requested']] or shortages
+    )
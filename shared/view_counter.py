@@ -0,0 +1,107 @@
+import atexit
+import threading
+from collections import Counter, defaultdict
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from apps.models import Product
+from shared.env import Env
+from shared.repricing import repricing_scheduler
+
+
+class ViewCounter:
+    """
+    Compteur de consultations en écriture différée (write-behind)
+
+    Les consultations sont cumulées en mémoire et écrites par lots :
+    - record() incrémente un compteur local et rend la main immédiatement
+    - flush() applique les incréments agrégés (UPDATE ... SET view_count = view_count + n)
+      et signale les produits concernés au RepricingScheduler
+    - un thread de fond appelle flush() toutes les `flush_interval` secondes
+    - stop() fait un dernier flush pour ne perdre aucune consultation à l'arrêt
+
+    Chaque worker possède son propre compteur : les incréments étant relatifs (F()),
+    plusieurs processus peuvent flusher en parallèle sans perte.
+    """
+
+    def __init__(self, flush_interval: float = Env.VIEW_COUNTER_FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self._pending = Counter()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._atexit_registered = False
+
+    def record(self, product_id: int, count: int = 1) -> int:
+        """Ajoute `count` consultations en attente, retourne le total en attente du produit"""
+        with self._lock:
+            self._pending[product_id] += count
+            return self._pending[product_id]
+
+    def pending(self, product_id: int) -> int:
+        with self._lock:
+            return self._pending.get(product_id, 0)
+
+    def flush(self) -> dict:
+        """
+        Écrit les consultations en attente et signale les produits à recalculer
+        Retourne les incréments appliqués {product_id: n}
+        En cas d'erreur, les incréments sont remis en attente pour le prochain flush
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, Counter()
+
+            if not pending:
+                return {}
+
+            # Un seul UPDATE par valeur d'incrément distincte
+            ids_by_increment = defaultdict(list)
+            for product_id, count in pending.items():
+                ids_by_increment[count].append(product_id)
+
+            try:
+                with transaction.atomic():
+                    for count, product_ids in ids_by_increment.items():
+                        Product.objects.filter(id__in=product_ids).update(
+                            view_count=F('view_count') + count
+                        )
+            except Exception:
+                with self._lock:
+                    self._pending.update(pending)
+                raise
+
+            repricing_scheduler.mark_dirty(pending.keys())
+
+            return dict(pending)
+
+    def _run(self):
+        while not self._stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"⚠️ Erreur flush compteur de consultations: {str(e)}")
+            finally:
+                close_old_connections()
+
+    def start(self):
+        """Démarre le thread de flush périodique"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="view-counter-flush", daemon=True)
+        self._thread.start()
+        if not self._atexit_registered:
+            atexit.register(self.stop)
+            self._atexit_registered = True
+
+    def stop(self):
+        """Arrête le thread et flush les consultations restantes"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+
+view_counter = ViewCounter()
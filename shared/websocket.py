@@ -1,93 +1,464 @@
 from fastapi import WebSocket, WebSocketDisconnect
-from typing import List, Dict
+from typing import List, Dict, Set
+import asyncio
 import json
+import re
 from datetime import datetime
+from shared.env import Env
+from shared.pubsub import create_broker
+from shared.chat_history import chat_history
+from shared.security import verify_jwt_token
+
+BROADCAST_CHANNEL = "chat"
+
+# Salons : général, discussion par produit, support par commande, canal du staff
+DEFAULT_ROOM = "general"
+STAFF_ROOM = "staff"
+STAFF_ROLES = ("ADMIN", "EDITOR")
+ROOM_RE = re.compile(r"^(general|staff|product:\d+|order:\d+)$")
+
+# Code de fermeture d'un client évincé ou refusé (RFC 6455 : 1008 Policy Violation)
+POLICY_VIOLATION_CLOSE_CODE = 1008
+
+# Que faire quand la file d'un client est pleine
+OVERFLOW_POLICIES = (
+    "disconnect",   # fermer la connexion du client
+    "drop_oldest",  # jeter le plus ancien message en attente pour faire de la place
+    "drop_newest"   # jeter le nouveau message
+)
+
+
+class ClientConnection:
+    """Connexion WebSocket avec sa file d'envoi bornée, vidée par sa propre tâche d'écriture"""
+
+    def __init__(self, websocket: WebSocket, client_id: int, username: str, queue_size: int):
+        self.websocket = websocket
+        self.client_id = client_id
+        self.username = username
+        self.queue = asyncio.Queue(queue_size)
+        self.writer_task = None
+        self.rooms: Set[str] = set()
+        self.connected_at = datetime.now()
+        self.sent = 0
+        self.dropped = 0
+        self.max_depth = 0
+
+    def stats(self) -> Dict:
+        return {
+            "id": self.client_id,
+            "username": self.username,
+            "queue_depth": self.queue.qsize(),
+            "max_queue_depth": self.max_depth,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "rooms": sorted(self.rooms),
+            "connected_at": self.connected_at.isoformat()
+        }
+
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[int, Dict] = {}
+    """
+    Connexions WebSocket du worker et diffusion via un broker pub/sub
+
+    broadcast() publie le message sur le broker (voir shared/pubsub.py) et rend la main :
+    son coût pour l'émetteur ne dépend pas du nombre de clients. Chaque worker abonné
+    le dépose dans la file bornée (WS_SEND_QUEUE_SIZE) de chacun de ses clients ; une
+    tâche par client l'envoie. Un client lent ne retarde ni l'émetteur ni les autres.
+
+    File pleine : selon WS_OVERFLOW_POLICY, le client est déconnecté ou un message
+    est jeté (voir OVERFLOW_POLICIES). Un envoi qui dépasse WS_SEND_TIMEOUT secondes
+    déconnecte toujours le client. get_metrics() expose la profondeur des files.
+
+    Salons : `rooms` indexe chaque salon vers l'ensemble de ses abonnés sur ce worker ;
+    un message de salon ne parcourt que ces abonnés (coût proportionnel à la taille du
+    salon, pas au nombre total de connexions).
+
+    Historique : un message diffusé avec record=True est ajouté au tampon `history`
+    du salon par chaque worker à sa réception, et écrit sur disque par le seul
+    worker émetteur (voir shared/chat_history.py).
+    """
+
+    def __init__(self, broker=None, queue_size: int = Env.WS_SEND_QUEUE_SIZE,
+                 send_timeout: float = Env.WS_SEND_TIMEOUT,
+                 overflow_policy: str = Env.WS_OVERFLOW_POLICY,
+                 channel: str = BROADCAST_CHANNEL, history=None):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Politique de débordement inconnue : {overflow_policy} ({', '.join(OVERFLOW_POLICIES)})")
+        self.active_connections: Dict[int, ClientConnection] = {}
+        self.rooms: Dict[str, Set[int]] = {}
         self.connection_count = 0
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self.overflow_policy = overflow_policy
+        self.channel = channel
+        self.history = history
+        self.broker = broker or create_broker(Env.CHAT_BROKER, Env.CHAT_BROKER_SOCKET)
+        self.counters = {"published": 0, "enqueued": 0, "sent": 0, "dropped": 0, "evicted": 0}
+        self._started = False
+
+    async def start(self):
+        """Abonne ce worker au broker (lifespan de l'app, ou au premier envoi)"""
+        if not self._started:
+            self._started = True
+            await self.broker.start(self._on_message)
+
+    async def stop(self):
+        if self._started:
+            await self.broker.stop(self._on_message)
+            self._started = False
+        for connection in list(self.active_connections.values()):
+            self._remove(connection)
 
     async def connect(self, websocket: WebSocket, client_id: int, username: str) -> int:
         await websocket.accept()
-        self.active_connections[client_id] = {
-            "websocket": websocket,
-            "username": username
-        }
+        await self.start()
+
+        previous = self.active_connections.get(client_id)
+        if previous:
+            self._evict(previous, "Nouvelle connexion pour ce client")
+
+        connection = ClientConnection(websocket, client_id, username, self.queue_size)
+        connection.writer_task = asyncio.get_running_loop().create_task(self._writer(connection))
+        self.active_connections[client_id] = connection
         self.connection_count += 1
         return client_id
 
-    def disconnect(self, client_id: int):
-        if client_id in self.active_connections:
-            del self.active_connections[client_id]
-            self.connection_count -= 1
-
-    async def broadcast(self, message: dict, exclude_client_id: int = None):
-        """Broadcast a JSON message to all connected clients, optionally excluding one"""
-        disconnected_clients = []
-        message_json = json.dumps(message)
-        
-        for client_id, connection_data in self.active_connections.items():
+    def _remove(self, connection: ClientConnection) -> bool:
+        if self.active_connections.get(connection.client_id) is not connection:
+            return False
+        del self.active_connections[connection.client_id]
+        self.connection_count -= 1
+        for room in connection.rooms:
+            self._discard_member(room, connection.client_id)
+        if connection.writer_task and connection.writer_task is not asyncio.current_task():
+            connection.writer_task.cancel()
+        return True
+
+    def disconnect(self, client_id: int, websocket: WebSocket = None):
+        """
+        Retire un client ; avec `websocket`, seulement si c'est encore sa connexion active
+        (un client reconnecté entre-temps n'est pas retiré)
+        """
+        connection = self.active_connections.get(client_id)
+        if connection and (websocket is None or connection.websocket is websocket):
+            self._remove(connection)
+
+    def _discard_member(self, room: str, client_id: int):
+        members = self.rooms.get(room)
+        if members is not None:
+            members.discard(client_id)
+            if not members:
+                del self.rooms[room]
+
+    def subscribe(self, client_id: int, room: str) -> bool:
+        """Abonne un client connecté à un salon (les droits sont vérifiés par l'appelant)"""
+        connection = self.active_connections.get(client_id)
+        if not connection:
+            return False
+        connection.rooms.add(room)
+        self.rooms.setdefault(room, set()).add(client_id)
+        return True
+
+    def unsubscribe(self, client_id: int, room: str):
+        connection = self.active_connections.get(client_id)
+        if connection and room in connection.rooms:
+            connection.rooms.discard(room)
+            self._discard_member(room, client_id)
+
+    def _evict(self, connection: ClientConnection, reason: str):
+        """Retire un client et ferme sa socket, sa boucle de réception se termine alors"""
+        if self._remove(connection):
+            self.counters["evicted"] += 1
+            asyncio.get_running_loop().create_task(self._close(connection.websocket, reason))
+
+    async def _close(self, websocket: WebSocket, reason: str):
+        try:
+            await websocket.close(code=POLICY_VIOLATION_CLOSE_CODE, reason=reason)
+        except (RuntimeError, ConnectionError):
+            pass
+
+    async def _writer(self, connection: ClientConnection):
+        while True:
+            message_json = await connection.queue.get()
+            try:
+                await asyncio.wait_for(connection.websocket.send_text(message_json), self.send_timeout)
+            except asyncio.TimeoutError:
+                self._evict(connection, "Client trop lent")
+                return
+            except Exception:
+                # Socket fermée pendant l'envoi (l'exception dépend du serveur ASGI) : client perdu
+                self._remove(connection)
+                return
+            connection.sent += 1
+            self.counters["sent"] += 1
+
+    def _enqueue(self, connection: ClientConnection, message_json: str) -> bool:
+        """Dépose un message dans la file du client, False s'il a été jeté ou le client évincé"""
+        if connection.queue.full():
+            if self.overflow_policy == "disconnect":
+                self._evict(connection, "Client trop lent")
+                return False
+            connection.dropped += 1
+            self.counters["dropped"] += 1
+            if self.overflow_policy == "drop_newest":
+                return False
+            connection.queue.get_nowait()
+
+        connection.queue.put_nowait(message_json)
+        connection.max_depth = max(connection.max_depth, connection.queue.qsize())
+        self.counters["enqueued"] += 1
+        return True
+
+    async def _on_message(self, channel: str, payload: str):
+        """Message reçu du broker : distribution aux clients de ce worker"""
+        if channel != self.channel:
+            return
+        self._dispatch(json.loads(payload))
+
+    def _dispatch(self, envelope: dict):
+        """Distribution d'un message du broker aux clients de ce worker"""
+        message_json = json.dumps(envelope["message"])
+
+        target = envelope.get("to")
+        if target is not None:
+            connection = self.active_connections.get(target)
+            if connection:
+                self._enqueue(connection, message_json)
+            return
+
+        exclude_client_id = envelope.get("exclude")
+        room = envelope.get("room")
+        if room is not None and envelope.get("record") and self.history is not None:
+            self.history.append(room, envelope["message"])
+        self._send_to_room(room, message_json, exclude_client_id)
+
+    def _send_to_room(self, room: str, message_json: str, exclude_client_id: int = None):
+        """Dépose un message dans la file des abonnés du salon (de tous les clients si room=None)"""
+        if room is None:
+            recipients = list(self.active_connections)
+        else:
+            recipients = list(self.rooms.get(room, ()))
+
+        for client_id in recipients:
             if exclude_client_id is not None and client_id == exclude_client_id:
                 continue
-            try:
-                await connection_data["websocket"].send_text(message_json)
-            except:
-                disconnected_clients.append(client_id)
-        
-        for client_id in disconnected_clients:
-            self.disconnect(client_id)
-    
+            connection = self.active_connections.get(client_id)
+            if connection:
+                self._enqueue(connection, message_json)
+
+    async def broadcast(self, message: dict, exclude_client_id: int = None, room: str = None,
+                        record: bool = False):
+        """
+        Broadcast a JSON message to all connected clients (all workers), optionally excluding one
+        Avec `room`, seuls les abonnés du salon le reçoivent ; avec record=True, le message
+        est gardé dans l'historique du salon
+        """
+        await self.start()
+        self.counters["published"] += 1
+        record = record and room is not None and self.history is not None
+        if record:
+            await self.history.persist(room, message)
+        await self.broker.publish(self.channel, json.dumps({
+            "message": message,
+            "exclude": exclude_client_id,
+            "room": room,
+            "record": record
+        }))
+
     async def send_personal_message(self, message: dict, client_id: int):
-        if client_id in self.active_connections:
-            try:
-                await self.active_connections[client_id]["websocket"].send_text(json.dumps(message))
-                return True
-            except:
-                self.disconnect(client_id)
+        """
+        Envoie un message à un seul client
+        Retourne True s'il est connecté à ce worker ; sinon le message est transmis
+        aux autres workers via le broker et False est retourné
+        """
+        connection = self.active_connections.get(client_id)
+        if connection:
+            return self._enqueue(connection, json.dumps(message))
+
+        await self.start()
+        await self.broker.publish(self.channel, json.dumps({"message": message, "to": client_id}))
         return False
-    
+
     def get_connected_users(self) -> List[Dict]:
         return [
-            {"id": client_id, "username": data["username"]}
-            for client_id, data in self.active_connections.items()
+            {"id": client_id, "username": connection.username}
+            for client_id, connection in self.active_connections.items()
         ]
-    
+
+    def get_connected_clients(self) -> List[int]:
+        return list(self.active_connections)
+
     def get_connection_count(self) -> int:
         return self.connection_count
 
-manager = ConnectionManager()
+    def get_rooms(self) -> Dict[str, int]:
+        """Nombre d'abonnés de chaque salon sur ce worker"""
+        return {room: len(members) for room, members in sorted(self.rooms.items())}
 
-async def chat_websocket_endpoint(websocket: WebSocket, client_id: int, username: str):
-    await manager.connect(websocket, client_id, username)
-    
-    # Notify others that user joined
-    await manager.broadcast({
-        "type": "user_joined",
+    def get_metrics(self) -> Dict:
+        """Compteurs du worker et profondeur des files d'envoi (clients les plus en retard d'abord)"""
+        clients = sorted(
+            (connection.stats() for connection in self.active_connections.values()),
+            key=lambda client: -client["queue_depth"]
+        )
+        depths = [client["queue_depth"] for client in clients]
+        return {
+            **self.counters,
+            "connections": self.connection_count,
+            "queue_capacity": self.queue_size,
+            "overflow_policy": self.overflow_policy,
+            "queued_messages": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "clients": clients
+        }
+
+manager = ConnectionManager(history=chat_history)
+
+
+def _owns_order(user_id: int, order_id: int) -> bool:
+    from apps.models import Order
+    return Order.objects.filter(id=order_id, user_id=user_id).exists()
+
+
+async def can_join_room(room: str, user: dict = None) -> bool:
+    """
+    Droits d'accès à un salon :
+    - general et product:<id> : tout le monde
+    - staff : rôles ADMIN et EDITOR
+    - order:<id> : le client de la commande et le staff
+    `user` est le payload du JWT (None si non authentifié)
+    """
+    if not ROOM_RE.match(room):
+        return False
+    if room == DEFAULT_ROOM or room.startswith("product:"):
+        return True
+    if not user:
+        return False
+    if user.get("role") in STAFF_ROLES:
+        return True
+    if room.startswith("order:"):
+        return await asyncio.to_thread(_owns_order, user["id"], int(room.split(":")[1]))
+    return False
+
+
+def _notification(kind: str, client_id: int, username: str, room: str, message: str) -> dict:
+    return {
+        "type": kind,
+        "room": room,
         "user_id": client_id,
         "username": username,
         "timestamp": datetime.now().isoformat(),
-        "message": f"{username} a rejoint le chat"
-    })
-    
+        "message": message
+    }
+
+
+async def chat_websocket_endpoint(websocket: WebSocket, client_id: int = None, username: str = None,
+                                  rooms: str = None, token: str = None,
+                                  history: int = Env.CHAT_HISTORY_REPLAY, since: datetime = None):
+    """
+    Session de chat d'un client
+
+    `rooms` : salons rejoints à la connexion, séparés par des virgules (general par défaut)
+    `token` : JWT ; s'il est valide, son id/username remplacent client_id/username et
+    ouvrent l'accès aux salons staff et order:<id>
+    `history` : nombre de messages rejoués par salon rejoint ({"type": "history", ...})
+    `since` : reprise après une déconnexion, seuls les messages postérieurs sont rejoués
+
+    Messages reçus du client :
+    - texte brut : message dans le salon general
+    - {"action": "join" | "leave", "room": "product:3"}
+    - {"action": "message", "room": "product:3", "message": "..."}
+    """
+    user = verify_jwt_token(token) if token else None
+    if user:
+        client_id, username = user["id"], user["username"]
+    if client_id is None or not username:
+        await websocket.close(code=POLICY_VIOLATION_CLOSE_CODE, reason="client_id et username (ou token) requis")
+        return
+
+    await manager.connect(websocket, client_id, username)
+
+    joined = set()
+
+    async def join(room: str, since: datetime = None) -> bool:
+        if room in joined:
+            return True
+        if not await can_join_room(room, user):
+            return False
+        await manager.history.load(room)
+        # Lecture de l'historique et abonnement sans point d'attente entre les deux :
+        # aucun message ne peut manquer ni apparaître deux fois
+        replay = manager.history.recent(room, limit=history, since=since)
+        if not manager.subscribe(client_id, room):
+            return False
+        joined.add(room)
+        if replay:
+            await manager.send_personal_message({"type": "history", "room": room, "messages": replay}, client_id)
+        # Notify others that user joined
+        await manager.broadcast(
+            _notification("user_joined", client_id, username, room, f"{username} a rejoint {room}"),
+            room=room
+        )
+        return True
+
+    async def leave(room: str):
+        if room in joined:
+            joined.discard(room)
+            manager.unsubscribe(client_id, room)
+            await manager.broadcast(
+                _notification("user_left", client_id, username, room, f"{username} a quitté {room}"),
+                room=room
+            )
+
+    for room in (rooms or DEFAULT_ROOM).split(","):
+        room = room.strip()
+        if room and not await join(room, since):
+            await manager.send_personal_message({"type": "error", "room": room, "message": "Salon inaccessible"}, client_id)
+
     try:
         while True:
             data = await websocket.receive_text()
-            
-            # Broadcast the message to all clients
-            await manager.broadcast({
-                "type": "message",
-                "user_id": client_id,
-                "username": username,
-                "message": data,
-                "timestamp": datetime.now().isoformat()
-            })
-    except WebSocketDisconnect:
-        manager.disconnect(client_id)
-        await manager.broadcast({
-            "type": "user_left",
-            "user_id": client_id,
-            "username": username,
-            "timestamp": datetime.now().isoformat(),
-            "message": f"{username} a quitté le chat"
-        })
\ No newline at end of file
+
+            try:
+                command = json.loads(data)
+            except ValueError:
+                command = None
+            if not isinstance(command, dict) or "action" not in command:
+                command = {"action": "message", "room": DEFAULT_ROOM, "message": data}
+
+            action = command.get("action")
+            room = str(command.get("room") or DEFAULT_ROOM)
+
+            if action == "join":
+                ok = await join(room)
+                await manager.send_personal_message(
+                    {"type": "joined" if ok else "error", "room": room, "message": None if ok else "Salon inaccessible"},
+                    client_id
+                )
+            elif action == "leave":
+                await leave(room)
+                await manager.send_personal_message({"type": "left", "room": room}, client_id)
+            elif action == "message" and room in joined:
+                # Broadcast the message to the room subscribers
+                await manager.broadcast({
+                    "type": "message",
+                    "room": room,
+                    "user_id": client_id,
+                    "username": username,
+                    "message": str(command.get("message", "")),
+                    "timestamp": datetime.now().isoformat()
+                }, room=room, record=True)
+            else:
+                await manager.send_personal_message(
+                    {"type": "error", "room": room, "message": "Action inconnue ou salon non rejoint"},
+                    client_id
+                )
+    except (WebSocketDisconnect, RuntimeError):
+        # RuntimeError : socket déjà fermée par le serveur (client évincé)
+        manager.disconnect(client_id, websocket)
+        if client_id not in manager.active_connections:
+            for room in joined:
+                await manager.broadcast(
+                    _notification("user_left", client_id, username, room, f"{username} a quitté le chat"),
+                    room=room
+                )